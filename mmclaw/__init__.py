@@ -1,5 +1,5 @@
-from .kernel import MMClaw
+from .kernel import MMClaw, AsyncMMClaw
 from .config import ConfigManager
 from .memory import BaseMemory, FileMemory
 
-__all__ = ["MMClaw", "ConfigManager", "BaseMemory", "FileMemory"]
+__all__ = ["MMClaw", "AsyncMMClaw", "ConfigManager", "BaseMemory", "FileMemory"]
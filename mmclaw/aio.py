@@ -0,0 +1,329 @@
+"""Asyncio primitives for the optional async runtime (``"runtime": "async"``).
+
+Everything here is standard library only: a small streaming HTTP/1.1 client
+with keep-alive pooling, an async shell executor built on
+``asyncio.create_subprocess_shell``, and an adapter that lets the existing
+thread-based connectors be driven from coroutines.
+"""
+import asyncio
+import functools
+import http.client
+import io
+import locale
+import ssl
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+_EXECUTOR = None
+_EXECUTOR_WORKERS = 16
+
+
+def _executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=_EXECUTOR_WORKERS, thread_name_prefix="mmclaw-aio")
+    return _EXECUTOR
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the shared, bounded executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), functools.partial(func, *args, **kwargs))
+
+
+# ----------------------------------------------------------------------
+# HTTP client
+# ----------------------------------------------------------------------
+
+class ConnectTimeout(asyncio.TimeoutError):
+    """The TCP/TLS handshake did not finish within ``connect_timeout``."""
+
+
+def _seconds(timeout):
+    # Timeouts may be callables so a caller can shrink them as a deadline approaches
+    return timeout() if callable(timeout) else timeout
+
+
+class AsyncHTTPResponse(object):
+    def __init__(self, client, key, reader, writer, status, reason, headers, method):
+        self._client = client
+        self._key = key
+        self._reader = reader
+        self._writer = writer
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._method = method
+        self._done = False
+        self._reusable = headers.get("Connection", "").lower() != "close"
+        self._chunked = headers.get("Transfer-Encoding", "").lower() == "chunked"
+        length = headers.get("Content-Length")
+        self._remaining = int(length) if length is not None and not self._chunked else None
+        if method == "HEAD" or status in (204, 304):
+            self._remaining = 0
+            self._chunked = False
+
+    async def _read_chunked(self, timeout):
+        timeout = _seconds(timeout)
+        size_line = await asyncio.wait_for(self._reader.readline(), timeout)
+        size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+        if size == 0:
+            # Trailers end with an empty line
+            while True:
+                line = await asyncio.wait_for(self._reader.readline(), timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            return b""
+        data = await asyncio.wait_for(self._reader.readexactly(size), timeout)
+        await asyncio.wait_for(self._reader.readexactly(2), timeout)
+        return data
+
+    async def iter_chunks(self, chunk_size=16384, timeout=60):
+        """Yield body chunks as they arrive; ``timeout`` (seconds, or a callable returning them) bounds each read."""
+        if self._done:
+            return
+        try:
+            while True:
+                if self._chunked:
+                    data = await self._read_chunked(timeout)
+                elif self._remaining is not None:
+                    if self._remaining <= 0:
+                        data = b""
+                    else:
+                        data = await asyncio.wait_for(self._reader.read(min(chunk_size, self._remaining)),
+                                                      _seconds(timeout))
+                        if not data:
+                            raise ConnectionError("connection closed before end of body")
+                        self._remaining -= len(data)
+                else:
+                    data = await asyncio.wait_for(self._reader.read(chunk_size), _seconds(timeout))
+                    self._reusable = False
+                if not data:
+                    break
+                yield data
+        except BaseException:
+            self._reusable = False
+            self.close()
+            raise
+        self._done = True
+        self._release()
+
+    async def iter_lines(self, timeout=60):
+        """Yield raw ``bytes`` lines (newline included), like iterating a urllib response."""
+        pending = b""
+        async for chunk in self.iter_chunks(timeout=timeout):
+            pending += chunk
+            start = 0
+            while True:
+                idx = pending.find(b"\n", start)
+                if idx == -1:
+                    break
+                yield pending[start:idx + 1]
+                start = idx + 1
+            pending = pending[start:]
+        if pending:
+            yield pending
+
+    async def read(self, timeout=60):
+        parts = []
+        async for chunk in self.iter_chunks(timeout=timeout):
+            parts.append(chunk)
+        return b"".join(parts)
+
+    def _release(self):
+        if self._reusable and self._writer is not None:
+            self._client._put_idle(self._key, self._reader, self._writer)
+        else:
+            self.close()
+        self._writer = None
+
+    def close(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+
+
+class AsyncHTTPClient(object):
+    """Minimal streaming HTTP/1.1 client with per-host keep-alive pooling.
+
+    Non-2xx responses raise ``urllib.error.HTTPError`` with the body attached,
+    so provider error handling is shared between the sync and async paths.
+    Environment proxies are not honoured.
+    """
+    MAX_IDLE_PER_HOST = 8
+
+    def __init__(self):
+        self._idle = {}
+        self._ssl_context = ssl.create_default_context()
+
+    def _put_idle(self, key, reader, writer):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.MAX_IDLE_PER_HOST and not writer.is_closing():
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _connect(self, scheme, host, port, timeout):
+        key = (scheme, host, port)
+        idle = self._idle.get(key) or []
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return key, reader, writer, True
+            writer.close()
+        ssl_ctx = self._ssl_context if scheme == "https" else None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=ssl_ctx, server_hostname=host if ssl_ctx else None, limit=2 ** 20),
+                timeout,
+            )
+        except asyncio.TimeoutError as e:
+            raise ConnectTimeout(f"connect to {host}:{port} timed out after {timeout:g}s") from e
+        return key, reader, writer, False
+
+    async def request(self, method, url, headers=None, body=None, timeout=60, connect_timeout=None):
+        """Send a request and return once the headers are in.
+
+        ``timeout`` (seconds, or a callable returning them) bounds each read;
+        ``connect_timeout`` the handshake of a new connection (default ``timeout``).
+        """
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "http"
+        host = parts.hostname
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+
+        head = {"Host": parts.netloc, "Accept-Encoding": "identity", "Connection": "keep-alive"}
+        head.update(headers or {})
+        if body is not None:
+            head["Content-Length"] = str(len(body))
+        raw = "".join(f"{k}: {v}\r\n" for k, v in head.items())
+        request_bytes = f"{method} {target} HTTP/1.1\r\n{raw}\r\n".encode("latin-1") + (body or b"")
+
+        for attempt in range(2):
+            key, reader, writer, reused = await self._connect(
+                scheme, host, port, connect_timeout if connect_timeout is not None else _seconds(timeout))
+            try:
+                writer.write(request_bytes)
+                await writer.drain()
+                status_line = await asyncio.wait_for(reader.readline(), _seconds(timeout))
+                if not status_line:
+                    raise ConnectionError("server closed connection")
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # A pooled socket may have been closed by the server; retry once on a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                # Timed out, cancelled, ...: the connection is mid-request and cannot be reused
+                writer.close()
+                raise
+
+        try:
+            version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+            status = int(status)
+            header_msg = http.client.HTTPMessage()
+            while True:
+                line = await asyncio.wait_for(reader.readline(), _seconds(timeout))
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                header_msg[name.strip()] = value.strip()
+        except BaseException:
+            writer.close()
+            raise
+
+        response = AsyncHTTPResponse(self, key, reader, writer, status, reason, header_msg, method)
+        if status >= 400:
+            error_body = await response.read(timeout=timeout)
+            raise urllib.error.HTTPError(url, status, reason, header_msg, io.BytesIO(error_body))
+        return response
+
+
+_CLIENT = None
+
+
+def http_client():
+    """Process-wide client; must be used from the runtime's event loop."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = AsyncHTTPClient()
+    return _CLIENT
+
+
+# ----------------------------------------------------------------------
+# Tools
+# ----------------------------------------------------------------------
+
+async def shell_execute(command, timeout):
+    """Async counterpart of ``ShellTool.execute``; killing happens on cancel or timeout."""
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except Exception as e:
+        return f"Error executing command: {str(e)}"
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return f"Error executing command: timed out after {timeout}s"
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+    output = stdout if proc.returncode == 0 else stderr
+    try:
+        output = output.decode('utf-8')
+    except UnicodeDecodeError:
+        output = output.decode(locale.getpreferredencoding(False), errors='replace')
+    return f"Return Code {proc.returncode}:\n{output}"
+
+
+# ----------------------------------------------------------------------
+# Connectors
+# ----------------------------------------------------------------------
+
+class AsyncConnectorAdapter(object):
+    """Exposes a connector through coroutine hooks.
+
+    Connectors may implement ``send_async`` / ``send_file_async`` /
+    ``start_typing_async`` / ``stop_typing_async`` natively (they receive the
+    ``conversation_id`` keyword); otherwise the blocking method runs on the
+    shared executor, with ``conversation_id`` passed only for chats other than
+    the primary one (``None``), which come from connectors that route them.
+    """
+
+    def __init__(self, connector):
+        self.connector = connector
+
+    async def _call(self, name, *args, conversation_id=None):
+        native = getattr(self.connector, f"{name}_async", None)
+        if native is not None:
+            return await native(*args, conversation_id=conversation_id)
+        kwargs = {} if conversation_id is None else {"conversation_id": conversation_id}
+        return await run_blocking(getattr(self.connector, name), *args, **kwargs)
+
+    async def send(self, message, conversation_id=None):
+        return await self._call("send", message, conversation_id=conversation_id)
+
+    async def send_file(self, path, conversation_id=None):
+        return await self._call("send_file", path, conversation_id=conversation_id)
+
+    async def start_typing(self, conversation_id=None):
+        return await self._call("start_typing", conversation_id=conversation_id)
+
+    async def stop_typing(self, conversation_id=None):
+        return await self._call("stop_typing", conversation_id=conversation_id)
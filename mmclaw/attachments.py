@@ -0,0 +1,221 @@
+"""Streaming ingestion of inbound attachments.
+
+Connectors used to hold a whole upload in memory (``bot.download_file``,
+``r.content``, one base64 string) and often a decrypted copy too, so a 200 MB
+video cost several times its size in RSS. Every download now goes through
+here: chunks are written to a temp file as they arrive, decrypted on the
+way where the platform encrypts (WeChat's CDN uses AES-128-ECB, which
+decrypts block by block), hashed on the fly, and cut off as soon as they
+pass the size limit. Connectors hand the resulting path to ``file_saver``,
+which moves it into the session's files. The WhatsApp bridge streams media
+to disk itself and only sends the path, which ``adopt`` wraps.
+``EncryptedFileReader`` does the reverse for uploads to an encrypting CDN.
+
+    "attachments": {
+        "max_mb": 200,        # documents, videos, ...
+        "image_max_mb": 20    # images, which are read back into memory for the model
+    }
+"""
+import hashlib
+import os
+import tempfile
+import time
+import urllib.request
+
+
+CHUNK = 256 * 1024
+MAX_BYTES = 200 * 1024 * 1024
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+
+_LIMITS = {"file": MAX_BYTES, "image": IMAGE_MAX_BYTES}
+
+
+class AttachmentTooLarge(ValueError):
+    def __init__(self, name, limit):
+        super().__init__(f"{name} is larger than the {limit / (1024 * 1024):g} MB attachment limit")
+        self.limit = limit
+
+
+def configure(config):
+    options = config.get("attachments") or {}
+    if options.get("max_mb"):
+        _LIMITS["file"] = int(float(options["max_mb"]) * 1024 * 1024)
+    if options.get("image_max_mb"):
+        _LIMITS["image"] = int(float(options["image_max_mb"]) * 1024 * 1024)
+
+
+def limit_for(kind="file"):
+    return _LIMITS.get(kind, _LIMITS["file"])
+
+
+class Attachment(object):
+    """A downloaded file in a temp path; ``read()`` or hand ``path`` to ``file_saver``."""
+
+    def __init__(self, name, path, size, sha256):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def read(self):
+        """Load the contents and remove the temp file (for images)."""
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        finally:
+            self.discard()
+
+    def discard(self):
+        discard(self.path)
+
+
+class AesEcbStream(object):
+    """Incremental AES-ECB decryption with PKCS#7 unpadding."""
+
+    def __init__(self, key):
+        from cryptography.hazmat.primitives import padding as crypto_padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self._decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+        self._unpadder = crypto_padding.PKCS7(128).unpadder()
+
+    def update(self, data):
+        return self._unpadder.update(self._decryptor.update(data))
+
+    def finalize(self):
+        return self._unpadder.update(self._decryptor.finalize()) + self._unpadder.finalize()
+
+
+class EncryptedFileReader(object):
+    """Read-only file object yielding ``path`` AES-ECB encrypted with PKCS#7 padding.
+
+    Has a length, so ``requests`` sends it with a Content-Length and streams
+    it instead of loading the ciphertext; ``on_progress(sent, total)`` is
+    called as the body is read.
+    """
+
+    def __init__(self, path, key, on_progress=None):
+        from cryptography.hazmat.primitives import padding as crypto_padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self._encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+        self._padder = crypto_padding.PKCS7(128).padder()
+        self._file = open(path, "rb")
+        self._buffer = b""
+        self._pos = 0
+        self._done = False
+        self.length = (os.path.getsize(path) // 16 + 1) * 16
+        self.sent = 0
+        self.on_progress = on_progress
+
+    def __len__(self):
+        return self.length
+
+    def _fill(self):
+        chunk = self._file.read(CHUNK)
+        if chunk:
+            self._buffer = self._encryptor.update(self._padder.update(chunk))
+        else:
+            self._buffer = self._encryptor.update(self._padder.finalize()) + self._encryptor.finalize()
+            self._done = True
+        self._pos = 0
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            return b"".join(iter(lambda: self.read(CHUNK), b""))
+        while self._pos >= len(self._buffer):
+            if self._done:
+                return b""
+            self._fill()
+        data = self._buffer[self._pos:self._pos + n]
+        self._pos += len(data)
+        self.sent += len(data)
+        if self.on_progress:
+            self.on_progress(self.sent, self.length)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def from_chunks(chunks, name="file", kind="file", decrypt=None, expected_size=None):
+    """Write an iterable of byte chunks to a temp file; returns an ``Attachment``."""
+    limit = limit_for(kind)
+    if expected_size and expected_size > limit:
+        raise AttachmentTooLarge(name, limit)
+    started = time.monotonic()
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="mmclaw-", suffix=f"-{os.path.basename(name)}")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            def write(data):
+                nonlocal size
+                if not data:
+                    return
+                size += len(data)
+                if size > limit:
+                    raise AttachmentTooLarge(name, limit)
+                digest.update(data)
+                out.write(data)
+
+            for chunk in chunks:
+                write(decrypt.update(chunk) if decrypt else chunk)
+            if decrypt:
+                write(decrypt.finalize())
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    attachment = Attachment(name, path, size, digest.hexdigest())
+    print(f"[*] Attachment: {name} ({size / (1024 * 1024):.1f} MB, sha256 {attachment.sha256[:12]}) "
+          f"in {time.monotonic() - started:.1f}s")
+    return attachment
+
+
+def download(url, name="file", kind="file", decrypt=None, headers=None, timeout=60):
+    """Stream ``url`` to a temp file, refusing early when Content-Length is over the limit."""
+    req = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        expected = int(response.headers.get("Content-Length") or 0)
+        if decrypt:
+            expected = max(0, expected - 16)  # at most one block of padding
+        return from_chunks(iter(lambda: response.read(CHUNK), b""), name, kind,
+                           decrypt=decrypt, expected_size=expected)
+
+
+def from_fileobj(fileobj, name="file", kind="file"):
+    return from_chunks(iter(lambda: fileobj.read(CHUNK), b""), name, kind)
+
+
+def discard(path):
+    """Remove a temp file that will not be handed on; missing files are fine."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def adopt(path, name="file", kind="file", size=None, sha256=None):
+    """An ``Attachment`` for a file another process already wrote (the WhatsApp bridge)."""
+    if size is None:
+        size = os.path.getsize(path)
+    limit = limit_for(kind)
+    if size > limit:
+        discard(path)
+        raise AttachmentTooLarge(name, limit)
+    return Attachment(name, path, size, sha256)
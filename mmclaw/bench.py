@@ -0,0 +1,313 @@
+"""End-to-end kernel benchmark against the local mock LLM server.
+
+    mmclaw bench [scenario ...] [--engine openai|codex|vertex_ai] [--runtime thread|async]
+                 [--ttft 0] [--tps 0] [--output results.json] [--compare previous.json]
+
+Each scenario drives a fresh ``MMClaw`` (temporary workspace, fake connector)
+through a fixed workload and reports turn latency, CPU time, traced Python
+allocations and RSS. The mock server runs in a subprocess so its own work is
+not counted. Results are written as JSON so runs on different commits can be
+compared with ``--compare``.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+
+
+SCENARIOS = {
+    # name: (description, mock script)
+    "plain": ("Short text-only turns on a fresh session", [{"text": "Sure, done."}]),
+    "long_history": ("Text turns on top of a history at the token limit", [{"text": "Sure, done."}]),
+    "multi_tool": ("Turns with two rounds of parallel tool calls", [
+        {"tool_calls": [{"name": "file_read", "args": {"path": "{bench_file}"}}] * 3},
+        {"tool_calls": [{"name": "file_read", "args": {"path": "{bench_file}"}}] * 2},
+        {"text": "Read everything."},
+    ]),
+    "heartbeat_storm": ("Chat turns while a burst of heartbeat jobs runs", [
+        {"tool_calls": [{"name": "file_read", "args": {"path": "{bench_file}"}}]},
+        {"text": "HEARTBEAT_OK"},
+    ]),
+}
+
+
+class BenchConnector(object):
+    """Connector that counts chat replies (``reply_text``) and finished jobs."""
+
+    def __init__(self, reply_text):
+        self.file_saver = None
+        self.reply_text = reply_text
+        self.sent = 0
+        self.replies = 0
+        self.finished = 0
+        self._cond = threading.Condition()
+
+    def listen(self, callback, stop_on_auth=False):
+        pass
+
+    def start_typing(self):
+        pass
+
+    def stop_typing(self):
+        with self._cond:
+            self.finished += 1
+            self._cond.notify_all()
+
+    def send(self, message):
+        with self._cond:
+            self.sent += 1
+            if message == self.reply_text:
+                self.replies += 1
+                self._cond.notify_all()
+
+    def send_file(self, path):
+        self.sent += 1
+
+    def wait(self, counter, count, timeout=120):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while getattr(self, counter) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"only {getattr(self, counter)}/{count} {counter}")
+                self._cond.wait(remaining)
+
+
+class MockServerProcess(object):
+    def __init__(self, script, ttft, tps, error_rate):
+        self.script_file = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        json.dump(script, self.script_file)
+        self.script_file.close()
+        cmd = [sys.executable, "-m", "mmclaw.mock_server", "--port", "0", "--script", self.script_file.name,
+               "--ttft", str(ttft), "--tps", str(tps), "--error-rate", str(error_rate)]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(Path(__file__).parent.parent),
+                                                                         os.environ.get("PYTHONPATH")])))
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, env=env)
+        line = self.proc.stdout.readline().strip()
+        if not line.startswith("listening on "):
+            self.stop()
+            raise RuntimeError(f"mock server failed to start: {line!r}")
+        self.url = line[len("listening on "):]
+
+    def stats(self):
+        with urllib.request.urlopen(f"{self.url}/_stats", timeout=10) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        os.unlink(self.script_file.name)
+
+
+def _engine_config(engine, url):
+    if engine == "codex":
+        return {"model": "bench", "api_key": "bench", "backend_url": url}
+    if engine == "vertex_ai":
+        return {"model": "bench", "api_key": "bench", "base_url": f"{url}/v1/publishers/google"}
+    return {"model": "bench", "api_key": "bench", "base_url": f"{url}/v1"}
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _max_rss_mb():
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 1024
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _fill_script(script, bench_file):
+    return json.loads(json.dumps(script).replace("{bench_file}", bench_file.replace("\\", "\\\\")))
+
+
+def run_scenario(name, args):
+    from .config import ConfigManager, SkillManager, set_workspace
+    from .kernel import AsyncMMClaw, MMClaw
+
+    workspace = Path(tempfile.mkdtemp(prefix="mmclaw-bench-"))
+    bench_file = workspace / "notes.txt"
+    bench_file.write_text("benchmark file\n" * 200, encoding="utf-8")
+    server = MockServerProcess(_fill_script(SCENARIOS[name][1], str(bench_file)), args.ttft, args.tps, args.error_rate)
+    try:
+        set_workspace(workspace)
+        SkillManager.sync_skills()
+        # Watchers would inject their own jobs into the measurement
+        for watcher in SkillManager.HOME_SKILLS_DIR.glob("*/watcher.py"):
+            watcher.unlink()
+        config = dict(ConfigManager.DEFAULT_CONFIG, engine_type=args.engine,
+                      engines={args.engine: _engine_config(args.engine, server.url)},
+                      runtime=args.runtime, debug=False)
+        ConfigManager.mode = "terminal"
+        script = SCENARIOS[name][1]
+        connector = BenchConnector(script[-1]["text"])
+        runtime_cls = AsyncMMClaw if args.runtime == "async" else MMClaw
+        app = runtime_cls(config, connector, system_prompt=ConfigManager.get_full_prompt(config=config))
+
+        if name == "long_history":
+            filler = "lorem ipsum dolor sit amet " * 25
+            for i in range(300):
+                app.memory.add("user" if i % 2 == 0 else "assistant", f"[{i}] {filler}")
+
+        latencies = []
+        if args.alloc:
+            tracemalloc.start()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        background = args.storm if name == "heartbeat_storm" else 0
+        for i in range(background):
+            # DISCOVER heartbeats run silently, so every reply the connector sees is a chat reply
+            app.heartbeat_queue.put(f"[HEARTBEAT_DISCOVER: bench-{i}]\nCheck the notes file.")
+        for turn in range(args.turns):
+            started = time.perf_counter()
+            app.chat_queue.put(f"Bench turn {turn}: please handle this.")
+            connector.wait("replies", turn + 1)
+            latencies.append(time.perf_counter() - started)
+        connector.wait("finished", args.turns + background)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        alloc_peak = None
+        if args.alloc:
+            alloc_peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        server_stats = server.stats()
+    finally:
+        server.stop()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        "description": SCENARIOS[name][0],
+        "turns": args.turns,
+        "background_jobs": background,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies),
+            "p50": 1000 * _percentile(latencies, 50),
+            "p95": 1000 * _percentile(latencies, 95),
+            "max": 1000 * max(latencies),
+        },
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "cpu_ms_per_request": 1000 * cpu / max(1, server_stats["requests"]),
+        "alloc_peak_mb": alloc_peak,
+        "rss_mb": _rss_mb(),
+        "max_rss_mb": _max_rss_mb(),
+        "requests": server_stats["requests"],
+        "request_bytes": server_stats["request_bytes"],
+        "server_errors": server_stats["errors"],
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _flatten(result, prefix=""):
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(previous, current):
+    """Print per-metric changes between two result files."""
+    print(f"\nCompared with {previous['meta'].get('commit') or 'previous run'}:")
+    for name, result in current["scenarios"].items():
+        old = previous.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        print(f"  {name}")
+        old_flat = _flatten(old)
+        for metric, value in _flatten(result).items():
+            before = old_flat.get(metric)
+            if before is None or metric in ("turns", "background_jobs"):
+                continue
+            change = f"{(value - before) / before:+.1%}" if before else "n/a"
+            print(f"    {metric:<24} {before:>12.2f} -> {value:>12.2f}  {change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mmclaw bench", description="Benchmark the MMClaw kernel against a local mock LLM.")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--engine", default="openai", choices=["openai", "codex", "vertex_ai"], help="Wire format to exercise")
+    parser.add_argument("--runtime", default="thread", choices=["thread", "async"])
+    parser.add_argument("--turns", type=int, default=20, help="Chat turns per scenario")
+    parser.add_argument("--storm", type=int, default=50, help="Heartbeat jobs in heartbeat_storm")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Mock time to first token (seconds)")
+    parser.add_argument("--tps", type=float, default=0.0, help="Mock tokens per second (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock requests that fail")
+    parser.add_argument("--no-alloc", dest="alloc", action="store_false", help="Skip tracemalloc (it slows every turn)")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Results JSON from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": args.engine,
+            "runtime": args.runtime,
+            "ttft": args.ttft,
+            "tps": args.tps,
+            "error_rate": args.error_rate,
+            "alloc_tracing": args.alloc,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        print(f"[*] Bench: {name} ...", flush=True)
+        result = run_scenario(name, args)
+        results["scenarios"][name] = result
+        latency = result["latency_ms"]
+        print(f"    turn p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  cpu {result['cpu_s']:.2f}s  "
+              f"requests {result['requests']}  upload {result['request_bytes'] / 2**20:.1f}MB  "
+              f"rss {result['rss_mb'] or 0:.0f}MB", flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[✓] Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
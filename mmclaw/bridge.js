@@ -10,6 +10,17 @@ const pino = require("pino");
 const fs = require("fs");
 const path = require("path");
 const os = require("os");
+const crypto = require("crypto");
+const { Transform } = require("stream");
+const { pipeline } = require("stream/promises");
+
+// Media is streamed to files here; only path, size and hash go over stdout
+const MEDIA_DIR = path.join(os.tmpdir(), "mmclaw-wa-media");
+const MAX_MEDIA_BYTES = parseInt(process.env.MMCLAW_WA_MAX_BYTES || "0", 10) || Infinity;
+// Files older than this were left by a bridge that exited before they were picked up
+const STALE_MEDIA_MS = 60 * 60 * 1000;
+// Media from other chats is not downloaded once the connector knows its user
+let authorizedJid = process.env.MMCLAW_WA_AUTHORIZED || null;
 
 let sock;
 let isReconnecting = false;
@@ -28,6 +39,64 @@ process.on('uncaughtException', (err) => {
     process.exit(1);
 });
 
+function toNumber(value) {
+    // protobuf lengths may be Long objects
+    if (value && typeof value.toNumber === "function") return value.toNumber();
+    return Number(value || 0);
+}
+
+function sweepMedia() {
+    let names;
+    try {
+        names = fs.readdirSync(MEDIA_DIR);
+    } catch (err) {
+        return;
+    }
+    const cutoff = Date.now() - STALE_MEDIA_MS;
+    for (const name of names) {
+        const file = path.join(MEDIA_DIR, name);
+        try {
+            if (fs.statSync(file).mtimeMs < cutoff) fs.rmSync(file, { force: true });
+        } catch (err) {}
+    }
+}
+
+async function saveMedia(msg, name, declaredSize) {
+    if (declaredSize > MAX_MEDIA_BYTES) {
+        throw new Error(`${name} is larger than the ${MAX_MEDIA_BYTES} byte limit`);
+    }
+    fs.mkdirSync(MEDIA_DIR, { recursive: true });
+    const file = path.join(MEDIA_DIR, `${Date.now()}-${crypto.randomBytes(4).toString("hex")}-${path.basename(name)}`);
+    const stream = await downloadMediaMessage(
+        msg,
+        'stream',
+        {},
+        {
+            logger: pino({ level: "silent" }),
+            reuploadRequest: sock.updateMediaMessage
+        }
+    );
+    const hash = crypto.createHash("sha256");
+    let size = 0;
+    const meter = new Transform({
+        transform(chunk, encoding, callback) {
+            size += chunk.length;
+            if (size > MAX_MEDIA_BYTES) {
+                return callback(new Error(`${name} is larger than the ${MAX_MEDIA_BYTES} byte limit`));
+            }
+            hash.update(chunk);
+            callback(null, chunk);
+        }
+    });
+    try {
+        await pipeline(stream, meter, fs.createWriteStream(file));
+    } catch (err) {
+        fs.rmSync(file, { force: true });
+        throw err;
+    }
+    return { path: file, size: size, sha256: hash.digest("hex") };
+}
+
 async function startBot() {
     if (isReconnecting) return;
     
@@ -127,22 +196,18 @@ async function startBot() {
                                     !messageContent.documentMessage.mimetype?.startsWith("image/")
                                     ? messageContent.documentMessage : null;
 
+                if ((imageMsg || documentMsg) && authorizedJid && jid !== authorizedJid) {
+                    continue;
+                }
+
                 if (imageMsg) {
                     try {
-                        const buffer = await downloadMediaMessage(
-                            msg,
-                            'buffer',
-                            {},
-                            {
-                                logger: pino({ level: "silent" }),
-                                reuploadRequest: sock.updateMediaMessage
-                            }
-                        );
+                        const media = await saveMedia(msg, imageMsg.fileName || "image.jpg", toNumber(imageMsg.fileLength));
 
                         console.log("JSON_EVENT:" + JSON.stringify({
                             type: "image",
                             from: jid,
-                            base64: buffer.toString('base64'),
+                            ...media,
                             caption: imageMsg.caption || "",
                             fromMe: msg.key.fromMe
                         }));
@@ -151,20 +216,12 @@ async function startBot() {
                     }
                 } else if (documentMsg) {
                     try {
-                        const buffer = await downloadMediaMessage(
-                            msg,
-                            'buffer',
-                            {},
-                            {
-                                logger: pino({ level: "silent" }),
-                                reuploadRequest: sock.updateMediaMessage
-                            }
-                        );
+                        const media = await saveMedia(msg, documentMsg.fileName || "file", toNumber(documentMsg.fileLength));
 
                         console.log("JSON_EVENT:" + JSON.stringify({
                             type: "file",
                             from: jid,
-                            base64: buffer.toString('base64'),
+                            ...media,
                             filename: documentMsg.fileName || "file",
                             mimetype: documentMsg.mimetype || "application/octet-stream",
                             caption: documentMsg.caption || "",
@@ -187,62 +244,90 @@ async function startBot() {
     });
 }
 
+// Every command carries an id that its ACK event echoes back, so the connector
+// can keep several in flight. Text sends to one chat still go out in order;
+// file uploads run in parallel.
+const chatQueues = new Map();
+
+function inOrder(jid, task) {
+    const next = (chatQueues.get(jid) || Promise.resolve()).then(task, task);
+    chatQueues.set(jid, next);
+    next.finally(() => {
+        if (chatQueues.get(jid) === next) chatQueues.delete(jid);
+    });
+    return next;
+}
+
+function ack(type, id, extra) {
+    console.log("JSON_EVENT:" + JSON.stringify({ type: type, id: id, ...extra }));
+}
+
+const mimeMap = {
+    '.csv': 'text/csv',
+    '.txt': 'text/plain',
+    '.pdf': 'application/pdf',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.mp4': 'video/mp4',
+    '.zip': 'application/zip'
+};
+
+async function sendFile(payload) {
+    const filePath = payload.path;
+    const fileName = path.basename(filePath);
+    console.log(`    [*] Bridge: Attempting to send file: ${filePath}`);
+    if (!fs.existsSync(filePath)) {
+        console.log(`    [!] Bridge: File not found: ${filePath}`);
+        return ack("file_error", payload.id, { filename: fileName, error: "File not found" });
+    }
+    const mimetype = mimeMap[path.extname(filePath).toLowerCase()] || 'application/octet-stream';
+    try {
+        await sock.sendMessage(payload.to, {
+            document: { url: filePath },
+            fileName: fileName,
+            mimetype: mimetype
+        });
+        console.log(`    [✓] Bridge: File sent successfully: ${fileName}`);
+        ack("file_sent", payload.id, { filename: fileName });
+    } catch (err) {
+        console.log(`    [!] Bridge: Error sending file: ${err.message}`);
+        ack("file_error", payload.id, { filename: fileName, error: err.message });
+    }
+}
+
 const readline = require("readline");
 readline.createInterface({ input: process.stdin }).on("line", async (line) => {
     if (!sock) return;
     line = line.trim();
     try {
-        if (line.startsWith("TYPING:")) {
+        if (line.startsWith("AUTHORIZE:")) {
+            authorizedJid = JSON.parse(line.slice("AUTHORIZE:".length)).to;
+        } else if (line.startsWith("TYPING:")) {
             const payload = JSON.parse(line.slice("TYPING:".length));
-            await sock.sendPresenceUpdate(payload.action, payload.to);
-        } else if (line.startsWith("SEND:")) {
-            const payload = JSON.parse(line.slice("SEND:".length));
             try {
-                await sock.sendMessage(payload.to, { text: payload.text });
-                console.log("JSON_EVENT:" + JSON.stringify({ type: "msg_sent" }));
+                await sock.sendPresenceUpdate(payload.action, payload.to);
+                ack("typing_sent", payload.id);
             } catch (err) {
-                console.log("JSON_EVENT:" + JSON.stringify({ type: "msg_error", error: err.message }));
+                ack("typing_error", payload.id, { error: err.message });
             }
-        } else if (line.startsWith("SEND_FILE:")) {
-            const payload = JSON.parse(line.slice("SEND_FILE:".length));
-            const filePath = payload.path;
-            const fileName = path.basename(filePath);
-            console.log(`    [*] Bridge: Attempting to send file: ${filePath}`);
-            if (fs.existsSync(filePath)) {
-                const ext = path.extname(filePath).toLowerCase();
-
-                const mimeMap = {
-                    '.csv': 'text/csv',
-                    '.txt': 'text/plain',
-                    '.pdf': 'application/pdf',
-                    '.png': 'image/png',
-                    '.jpg': 'image/jpeg',
-                    '.jpeg': 'image/jpeg',
-                    '.mp4': 'video/mp4',
-                    '.zip': 'application/zip'
-                };
-
-                const mimetype = mimeMap[ext] || 'application/octet-stream';
+        } else if (line.startsWith("SEND:")) {
+            const payload = JSON.parse(line.slice("SEND:".length));
+            await inOrder(payload.to, async () => {
                 try {
-                    await sock.sendMessage(payload.to, {
-                        document: { url: filePath },
-                        fileName: fileName,
-                        mimetype: mimetype
-                    });
-                    console.log(`    [✓] Bridge: File sent successfully: ${fileName}`);
-                    console.log("JSON_EVENT:" + JSON.stringify({ type: "file_sent", filename: fileName }));
+                    await sock.sendMessage(payload.to, { text: payload.text });
+                    ack("msg_sent", payload.id);
                 } catch (err) {
-                    console.log(`    [!] Bridge: Error sending file: ${err.message}`);
-                    console.log("JSON_EVENT:" + JSON.stringify({ type: "file_error", filename: fileName, error: err.message }));
+                    ack("msg_error", payload.id, { error: err.message });
                 }
-            } else {
-                console.log(`    [!] Bridge: File not found: ${filePath}`);
-                console.log("JSON_EVENT:" + JSON.stringify({ type: "file_error", filename: fileName, error: "File not found" }));
-            }
+            });
+        } else if (line.startsWith("SEND_FILE:")) {
+            await sendFile(JSON.parse(line.slice("SEND_FILE:".length)));
         }
     } catch (e) {
         console.log(`[!] Bridge stdin error: ${e.message}`);
     }
 });
 
+sweepMedia();
 startBot();
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""Cursor checkpoints for connector long-poll offsets.
+
+Connectors remember where they are in the platform's update stream (the
+WeChat ``get_updates_buf``, the last Telegram ``update_id``, recent Feishu
+event ids) so a restart does not replay or drop messages. Rewriting the
+whole ``mmclaw.json`` on every poll was needless I/O and raced with other
+config writers, so each connector gets its own small file under
+``<workspace>/checkpoints/<name>.json``:
+
+* writes are debounced (at most one every ``DEBOUNCE`` seconds) and atomic
+  (temp file + rename), and flushed at interpreter exit;
+* cursors are advanced only after the updates they cover were handled, so a
+  crash replays at most the last few seconds of updates (at-least-once);
+  ``is_seen(event_id)`` lets the connector drop the replayed ones, which it
+  records with ``mark_seen`` only after they were handled.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+
+class CheckpointStore(object):
+    DIR = Path.home() / ".mmclaw" / "checkpoints"
+    DEBOUNCE = 2.0
+    MAX_SEEN = 512
+
+    def __init__(self, name):
+        self.name = name
+        self.path = Path(self.DIR) / f"{name}.json"
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self._cursors = {}
+        self._seen = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self._cursors = state.get("cursors") or {}
+            self._seen = state.get("seen") or []
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[!] Checkpoint {name}: unreadable ({e}); starting fresh.")
+        self._seen_set = set(self._seen)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._cursors.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            if self._cursors.get(key) == value:
+                return
+            self._cursors[key] = value
+            self._touch()
+
+    def is_seen(self, event_id):
+        """True if ``event_id`` was already handled (a replay)."""
+        if event_id is None:
+            return False
+        with self._lock:
+            return str(event_id) in self._seen_set
+
+    def mark_seen(self, event_id):
+        """Record ``event_id`` as handled; call after handling, not before."""
+        if event_id is None:
+            return
+        event_id = str(event_id)
+        with self._lock:
+            if event_id in self._seen_set:
+                return
+            self._seen.append(event_id)
+            self._seen_set.add(event_id)
+            while len(self._seen) > self.MAX_SEEN:
+                self._seen_set.discard(self._seen.pop(0))
+            self._touch()
+
+    def _touch(self):
+        # self._lock is held
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.DEBOUNCE, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._write_lock:  # one writer, so an older snapshot never lands last
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                state = {"cursors": dict(self._cursors), "seen": list(self._seen)}
+                self._dirty = False
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=f".{self.name}.", suffix=".json")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(state, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+                    raise
+            except Exception as e:
+                print(f"[!] Checkpoint {self.name}: write failed: {e}")
+                with self._lock:
+                    self._dirty = True
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def checkpoint(name):
+    """The process-wide store for connector ``name``."""
+    with _STORES_LOCK:
+        store = _STORES.get(name)
+        if store is None:
+            store = _STORES[name] = CheckpointStore(name)
+        return store
+
+
+@atexit.register
+def flush_all():
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    for store in stores:
+        store.flush()
@@ -1,6 +1,8 @@
 import json
 import os
 import shutil
+import tempfile
+import threading
 from pathlib import Path
 import platform
 from .tools import ShellTool
@@ -48,6 +50,10 @@ def set_workspace(path: Path):
     WatcherManager.SKILLS_DIR = path / "skills"
     from .tools import BrowserTool
     BrowserTool.DEFAULT_DATA_DIR = str(path / "browser_data")
+    from .usage import UsageLedger
+    UsageLedger.LEDGER_FILE = path / "usage" / "usage.jsonl"
+    from .checkpoints import CheckpointStore
+    CheckpointStore.DIR = path / "checkpoints"
 
 
 class SkillManager(object):
@@ -425,10 +431,26 @@ class ConfigManager(object):
             print(f"[!] Error loading config: {e}")
             return None
 
+    _save_lock = threading.Lock()
+
     @classmethod
     def save(cls, config):
-        with open(cls.CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=4)
+        # Write a sibling temp file and rename it over the config, so a crash or a
+        # concurrent token refresh can never leave a truncated mmclaw.json behind
+        with cls._save_lock:
+            fd, tmp_path = tempfile.mkstemp(dir=str(cls.CONFIG_FILE.parent), prefix=".mmclaw.", suffix=".json")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(config, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, cls.CONFIG_FILE)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
         print(f"[*] Config saved to {cls.CONFIG_FILE}")
 
     @classmethod
@@ -7,16 +7,26 @@ import asyncio
 import telebot
 import shutil
 import random
+import secrets
 import base64
 import io
 import tempfile
-from contextlib import contextmanager
+import functools
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
+from . import attachments, http_pool
+from .checkpoints import checkpoint
 from .config import ConfigManager
-from .providers import prepare_image_content
+from .dispatcher import RateLimited
+from .providers import prepare_image_content, prepare_images_content
 
 class TerminalConnector(object):
+    # Status edits only redraw the spinner line
+    STATUS_EDIT_INTERVAL = 0.0
+
     def __init__(self):
         self._typing = False
+        self._status = None
         self._input_ready = threading.Event()
         self._input_ready.set()
         self._print_lock = threading.Lock()
@@ -39,8 +49,12 @@ class TerminalConnector(object):
             chars = ["|", "/", "-", "\\"]
             i = 0
             while self._typing:
+                label = self._status or "thinking..."
+                width = shutil.get_terminal_size().columns - 20
+                if len(label) > width > 0:
+                    label = label[:width - 1] + "…"
                 with self._print_lock:
-                    print(f"\r    ⚡ MMClaw: {chars[i % len(chars)]} thinking...", end="", flush=True)
+                    print(f"\r\033[K    ⚡ MMClaw: {chars[i % len(chars)]} {label}", end="", flush=True)
                 i += 1
                 time.sleep(0.15)
         threading.Thread(target=_animate, daemon=True).start()
@@ -61,6 +75,19 @@ class TerminalConnector(object):
         with self._print_lock:
             print(f"\r\033[K    ⚡ MMClaw: [FILE SENT] {os.path.abspath(full_path)}", flush=True)
 
+    def send_status(self, text, final=False):
+        self.edit_status(None, text, final=final)
+
+    def edit_status(self, handle, text, final=False):
+        lines = text.splitlines()
+        if not final:
+            # Header and latest step on the spinner line
+            self._status = " · ".join(lines[:1] + lines[-1:]) if len(lines) > 1 else text
+            return
+        self._status = None
+        with self._print_lock:
+            print("\r\033[K    ⚡ MMClaw: " + "\n        ".join(lines), flush=True)
+
 
 class StatelessArgConnector(object):
     """Delivers a single CLI prompt (-p), runs the full agent loop without history, then exits."""
@@ -111,9 +138,21 @@ class FeishuConnector(object):
             .build()
         self.ws_client = None
         self.stop_on_auth = False
+        self._cursor = checkpoint("feishu")
     
 
     def _handle_message(self, data) -> None:
+        # Feishu redelivers events it thinks were not received. The id is recorded
+        # only once handled, so a crash mid-handling replays the event
+        event_id = getattr(getattr(data, "header", None), "event_id", None)
+        if self._cursor.is_seen(event_id):
+            return
+        try:
+            self._process_message(data)
+        finally:
+            self._cursor.mark_seen(event_id)
+
+    def _process_message(self, data) -> None:
         from lark_oapi.api.im.v1 import GetMessageResourceRequest
         try:
             sender_id = data.event.sender.sender_id.open_id
@@ -186,8 +225,8 @@ class FeishuConnector(object):
                         print(f"[!] Feishu File Download Error: {response.code}, {response.msg}")
                         return
 
-                    file_bytes = response.file.read()
-                    file_path = self.file_saver(file_name, file_bytes)
+                    attachment = attachments.from_fileobj(response.file, file_name)
+                    file_path = self.file_saver(file_name, attachment.path)
 
                     content = f"[Uploaded file: {file_path}]"
                     print(f"📩 Feishu: [File] {file_name}")
@@ -224,34 +263,85 @@ class FeishuConnector(object):
         )
         self.ws_client.start()
 
+    # Typing is shown as messages; the dispatcher queues them in order with the reply
+    TYPING_MARKERS = ("⏳", "✅")
+
     def start_typing(self):
-        self.send("⏳")
+        self.send(self.TYPING_MARKERS[0])
 
     def stop_typing(self):
-        self.send("✅")
+        self.send(self.TYPING_MARKERS[1])
 
-    def send(self, message):
+    FEISHU_RATE_LIMIT_CODE = 99991400
+
+    def _send_chunk(self, chunk):
         from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody
         if not self.authorized_id:
             return
+        content = json.dumps({"text": f"⚡ {chunk}"})
+        request = CreateMessageRequest.builder() \
+            .receive_id_type("open_id") \
+            .request_body(CreateMessageRequestBody.builder() \
+                .receive_id(self.authorized_id) \
+                .content(content) \
+                .msg_type("text") \
+                .build()) \
+            .build()
+        self._check(self.client.im.v1.message.create(request))
 
+    def send(self, message):
         limit = 4000
         chunks = [message[i:i+limit] for i in range(0, len(message), limit)]
         for chunk in chunks:
-            content = json.dumps({"text": f"⚡ {chunk}"})
-            request = CreateMessageRequest.builder() \
-                .receive_id_type("open_id") \
-                .request_body(CreateMessageRequestBody.builder() \
-                    .receive_id(self.authorized_id) \
-                    .content(content) \
-                    .msg_type("text") \
-                    .build()) \
-                .build()
-            response = self.client.im.v1.message.create(request)
-            if not response.success():
-                print(f"[!] Feishu Send Error: {response.code}, {response.msg}")
+            try:
+                self._send_chunk(chunk)
+            except Exception as e:
+                print(f"[!] Feishu Send Error: {e}")
                 break
 
+    # Job progress is a card patched in place (only cards can be edited)
+    STATUS_EDIT_INTERVAL = 1.0
+
+    def _status_card(self, text):
+        return json.dumps({
+            "config": {"wide_screen_mode": True, "update_multi": True},
+            "elements": [{"tag": "markdown", "content": text}],
+        }, ensure_ascii=False)
+
+    def _check(self, response):
+        if not response.success():
+            if response.code == self.FEISHU_RATE_LIMIT_CODE:
+                raise RateLimited()
+            raise RuntimeError(f"{response.code}, {response.msg}")
+
+    def send_status(self, text, final=False):
+        from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody
+        if not self.authorized_id:
+            return None
+        request = CreateMessageRequest.builder() \
+            .receive_id_type("open_id") \
+            .request_body(CreateMessageRequestBody.builder() \
+                .receive_id(self.authorized_id) \
+                .content(self._status_card(text)) \
+                .msg_type("interactive") \
+                .build()) \
+            .build()
+        response = self.client.im.v1.message.create(request)
+        self._check(response)
+        return response.data.message_id
+
+    def edit_status(self, message_id, text, final=False):
+        from lark_oapi.api.im.v1 import PatchMessageRequest, PatchMessageRequestBody
+        if not message_id:
+            return
+        request = PatchMessageRequest.builder() \
+            .message_id(message_id) \
+            .request_body(PatchMessageRequestBody.builder() \
+                .content(self._status_card(text)) \
+                .build()) \
+            .build()
+        self._check(self.client.im.v1.message.patch(request))
+
     def send_file(self, path):
         from lark_oapi.api.im.v1 import CreateFileRequest, CreateFileRequestBody, CreateMessageRequest, CreateMessageRequestBody
         if not self.authorized_id: 
@@ -302,25 +392,95 @@ class FeishuConnector(object):
             self.send(f"❌ Error processing file: {str(e)}")
 
 class TelegramConnector(object):
-    def __init__(self, token, telegram_authorized_user_id):
-        self.bot = telebot.TeleBot(token)
+    """Telegram bot for one authorized user.
+
+    The private chat with that user is the primary conversation (``None``).
+    Messages the user sends in a group reach the kernel with the group's chat
+    id as ``conversation_id``, and replies and typing for it go to that group.
+    """
+    # Album photos arrive as separate messages; wait this long for the rest of the group
+    ALBUM_WAIT = 1.0
+    # Updates handled at once (telebot's own pool size); ours, so the cursor can wait for them
+    HANDLER_THREADS = 2
+
+    def __init__(self, token, telegram_authorized_user_id, webhook=None):
+        self.bot = telebot.TeleBot(token, threaded=False)
         self.telegram_authorized_user_id = int(telegram_authorized_user_id)
-        self.chat_id = None
-        self._typing = False
-
-    def start_typing(self):
-        self._typing = True
-        def _type_loop():
-            while self._typing:
+        self.webhook = webhook or {}
+        self._typing_chats = {}   # chat id -> jobs showing typing there
+        self._typing_lock = threading.Lock()
+        self._typing_thread = None
+        self._albums = {}
+        self._albums_lock = threading.Lock()
+
+    def _chat(self, conversation_id=None):
+        return self.telegram_authorized_user_id if conversation_id is None else conversation_id
+
+    def _queue_album_photo(self, message, text, callback):
+        with self._albums_lock:
+            album = self._albums.get(message.media_group_id)
+            if album is None:
+                album = self._albums[message.media_group_id] = {"file_ids": [], "text": "",
+                                                                "conversation_id": self._conversation(message)}
+                timer = threading.Timer(self.ALBUM_WAIT, self._flush_album, args=(message.media_group_id, callback))
+                timer.daemon = True
+                timer.start()
+            album["file_ids"].append(message.photo[-1].file_id)
+            album["text"] = album["text"] or text
+
+    def _flush_album(self, media_group_id, callback):
+        with self._albums_lock:
+            album = self._albums.pop(media_group_id)
+        try:
+            downloaded = [self._download(file_id, "photo.jpg", kind="image").read() for file_id in album["file_ids"]]
+            content = prepare_images_content(downloaded, album["text"] or "What is in these images?")
+            print(f"📩 Telegram: [Album x{len(downloaded)}] {album['text']} (Compressed)")
+            callback(content)
+        except Exception as e:
+            print(f"[!] Telegram Photo Error: {e}")
+            self.send(f"Error processing image: {e}", album["conversation_id"])
+
+    def _download(self, file_id, name, kind="file"):
+        """Stream a Telegram file to a temp file (``attachments.Attachment``)."""
+        file_info = self.bot.get_file(file_id)
+        limit = attachments.limit_for(kind)
+        if file_info.file_size and file_info.file_size > limit:
+            raise attachments.AttachmentTooLarge(name, limit)
+        file_url = telebot.apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}"
+        return attachments.download(file_url.format(self.bot.token, file_info.file_path), name, kind)
+
+    def start_typing(self, conversation_id=None):
+        chat = self._chat(conversation_id)
+        with self._typing_lock:
+            self._typing_chats[chat] = self._typing_chats.get(chat, 0) + 1
+            if self._typing_thread is None:
+                self._typing_thread = threading.Thread(target=self._type_loop, daemon=True)
+                self._typing_thread.start()
+
+    def stop_typing(self, conversation_id=None):
+        chat = self._chat(conversation_id)
+        with self._typing_lock:
+            jobs = self._typing_chats.pop(chat, 0) - 1
+            if jobs > 0:
+                self._typing_chats[chat] = jobs
+
+    def _type_loop(self):
+        while True:
+            with self._typing_lock:
+                chats = list(self._typing_chats)
+                if not chats:
+                    self._typing_thread = None
+                    return
+            for chat in chats:
                 try:
-                    self.bot.send_chat_action(self.chat_id, 'typing')
+                    self.bot.send_chat_action(chat, 'typing')
                 except Exception:
                     pass
-                threading.Event().wait(1)
-        threading.Thread(target=_type_loop, daemon=True).start()
+            threading.Event().wait(1)
 
-    def stop_typing(self):
-        self._typing = False
+    def _conversation(self, message):
+        """None for the private chat with the user, else the group's chat id."""
+        return None if message.chat.id == self.telegram_authorized_user_id else message.chat.id
 
     def listen(self, callback):
         print(f"\n--- MMClaw Kernel Active (Telegram Mode) ---")
@@ -329,41 +489,40 @@ class TelegramConnector(object):
         @self.bot.message_handler(func=lambda message: message.from_user.id == self.telegram_authorized_user_id,
                                   content_types=['text', 'photo', 'document'])
         def handle_message(message):
-            self.chat_id = message.chat.id
+            conversation_id = self._conversation(message)
+            deliver = callback if conversation_id is None else functools.partial(callback, conversation_id=conversation_id)
             text = message.text or message.caption or ""
 
-            if message.content_type == 'photo':
+            if message.content_type == 'photo' and message.media_group_id:
+                self._queue_album_photo(message, text, deliver)
+            elif message.content_type == 'photo':
                 try:
-                    file_id = message.photo[-1].file_id
-                    file_info = self.bot.get_file(file_id)
-                    downloaded_file = self.bot.download_file(file_info.file_path)
+                    downloaded_file = self._download(message.photo[-1].file_id, "photo.jpg", kind="image").read()
 
                     content = prepare_image_content(downloaded_file, text if text else "What is in this image?")
                     print(f"📩 Telegram: [Photo] {text} (Compressed)")
-                    callback(content)
+                    deliver(content)
                 except Exception as e:
                     print(f"[!] Telegram Photo Error: {e}")
-                    self.send(f"Error processing image: {e}")
+                    self.send(f"Error processing image: {e}", conversation_id)
             elif message.content_type == 'document':
                 try:
                     doc = message.document
-                    file_info = self.bot.get_file(doc.file_id)
-                    downloaded_file = self.bot.download_file(file_info.file_path)
-
-                    file_path = self.file_saver(doc.file_name, downloaded_file)
+                    attachment = self._download(doc.file_id, doc.file_name or "file")
+                    file_path = self.file_saver(doc.file_name, attachment.path)
 
                     content = f"[Uploaded file: {file_path}]"
                     if text:
                         content += f"\n{text}"
                     print(f"📩 Telegram: [Document] {doc.file_name}{' | ' + text if text else ''}")
-                    callback(content)
+                    deliver(content)
                 except Exception as e:
                     print(f"[!] Telegram Document Error: {e}")
-                    self.send(f"Error processing file: {e}")
+                    self.send(f"Error processing file: {e}", conversation_id)
             else:
                 if text:
                     print(f"📩 Telegram: {text}")
-                    callback(text)
+                    deliver(text)
 
         @self.bot.message_handler(func=lambda message: message.from_user.id != self.telegram_authorized_user_id,
                                   content_types=['text', 'photo', 'audio', 'video', 'document', 'sticker', 'voice'])
@@ -378,27 +537,132 @@ class TelegramConnector(object):
         except Exception as e:
             print(f"[!] Telegram: failed to register commands: {e}")
 
+        webhook = bool(self.webhook.get("enabled"))
+        self._track_update_ids(webhook)
+        if webhook and self._listen_webhook():
+            return
+        if self.webhook:
+            # A webhook left registered by an earlier run blocks getUpdates
+            try:
+                self.bot.remove_webhook()
+            except Exception as e:
+                print(f"[!] Telegram: failed to remove webhook: {e}")
         self.bot.infinity_polling()
 
-    def send(self, message):
+    def _track_update_ids(self, webhook=False):
+        """Run handlers on our pool and checkpoint update_ids only once they finished.
+
+        Polling gets updates in order, so anything at or below the cursor is a
+        replay. Webhook deliveries run in parallel and may arrive out of order,
+        so there replays are dropped by id (``is_seen``) instead. Either way the
+        cursor only passes an update once it and every earlier one in flight
+        were handled, so a restart replays rather than loses them.
+        """
+        cursor = checkpoint("telegram")
+        self.bot.last_update_id = max(self.bot.last_update_id, cursor.get("update_id", 0))
+        process = self.bot.process_new_updates
+        pool = ThreadPoolExecutor(max_workers=self.HANDLER_THREADS, thread_name_prefix="telegram")
+        lock = threading.Lock()
+        running = set()
+        finished = set()
+
+        def handle(update):
+            try:
+                process([update])
+            except Exception as e:
+                print(f"[!] Telegram: update {update.update_id} failed: {e}")
+            finally:
+                if webhook:
+                    cursor.mark_seen(update.update_id)
+                with lock:
+                    running.discard(update.update_id)
+                    finished.add(update.update_id)
+                    floor = min(running) if running else None
+                    done = [i for i in finished if floor is None or i < floor]
+                    finished.difference_update(done)
+                if done:
+                    cursor.set("update_id", max(cursor.get("update_id", 0), max(done)))
+
+        def process_new_updates(updates):
+            handled = cursor.get("update_id", 0)
+            for update in updates:
+                if (cursor.is_seen(update.update_id) if webhook else update.update_id <= handled):
+                    continue
+                with lock:
+                    if update.update_id in running:
+                        continue
+                    running.add(update.update_id)
+                pool.submit(handle, update)
+            if updates:
+                self.bot.last_update_id = max(self.bot.last_update_id, max(u.update_id for u in updates))
+        self.bot.process_new_updates = process_new_updates
+
+    def _process_update(self, update):
+        self.bot.process_new_updates([telebot.types.Update.de_json(update)])
+
+    def _listen_webhook(self):
+        """Receive updates on a local HTTP server; returns False to fall back to polling."""
+        from .webhook import WebhookReceiver
+        options = self.webhook
+        url = options.get("url")
+        secret = options.get("secret") or (secrets.token_urlsafe(32) if url else None)
+        try:
+            receiver = WebhookReceiver(
+                self._process_update, path=options.get("path", "/telegram"), secret=secret,
+                host=options.get("listen", "127.0.0.1"), port=int(options.get("port", 8443)),
+                name="telegram-webhook",
+            )
+        except OSError as e:
+            print(f"[!] Telegram webhook: cannot listen ({e}); falling back to polling.")
+            return False
+        if url:
+            try:
+                self.bot.set_webhook(url=url, secret_token=secret, allowed_updates=["message"])
+            except Exception as e:
+                print(f"[!] Telegram webhook: registration failed ({e}); falling back to polling.")
+                receiver.stop()
+                return False
+            print(f"[*] Telegram webhook registered: {url}")
+        else:
+            print("[*] Telegram webhook: no url configured, not registering with Telegram.")
+        print(f"[*] Telegram webhook listening on {receiver.url}")
+        receiver.serve_forever()
+        return True
+
+    def _send_chunk(self, chunk, conversation_id=None):
+        self.bot.send_message(self._chat(conversation_id), f"⚡ {chunk}")
+
+    def send(self, message, conversation_id=None):
         limit = 4000
         chunks = [message[i:i+limit] for i in range(0, len(message), limit)]
         for chunk in chunks:
             try:
-                self.bot.send_message(self.telegram_authorized_user_id, f"⚡ {chunk}")
+                self._send_chunk(chunk, conversation_id)
             except Exception as e:
                 print(f"[!] Telegram Send Error: {e}")
                 break
 
-    def send_file(self, path):
+    # Edits share the chat's ~1 message/s budget with sends
+    STATUS_EDIT_INTERVAL = 2.0
+
+    def send_status(self, text, final=False, conversation_id=None):
+        return self.bot.send_message(self._chat(conversation_id), text).message_id
+
+    def edit_status(self, message_id, text, final=False, conversation_id=None):
+        self.bot.edit_message_text(text, chat_id=self._chat(conversation_id), message_id=message_id)
+
+    def send_file(self, path, conversation_id=None):
         path = os.path.expanduser(path)
         try:
             with open(path, 'rb') as f:
-                self.bot.send_document(self.telegram_authorized_user_id, f)
+                self.bot.send_document(self._chat(conversation_id), f)
         except Exception as e:
-            self.send(f"Error sending file: {str(e)}")
+            self.send(f"Error sending file: {str(e)}", conversation_id)
 
 class WhatsAppConnector(object):
+    # Sends in flight to the bridge at once; each completes on the ACK carrying its id
+    MAX_IN_FLIGHT = 4
+
     def __init__(self, config=None):
         self.process = None
         self.callback = None
@@ -416,8 +680,11 @@ class WhatsAppConnector(object):
         self._typing = False
         self._stdin_lock = threading.Lock()
         self._stop_typing_event = threading.Event()
-        self._ack_event = threading.Event()
-        self._ack_error = None
+        # request id -> (Future, timeout timer) for commands awaiting their ACK
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._in_flight = threading.BoundedSemaphore(self.MAX_IN_FLIGHT)
 
     def _ensure_node(self):
         if not shutil.which("node"):
@@ -488,6 +755,11 @@ class WhatsAppConnector(object):
             return
         
         env = self._get_node_env()
+        # The bridge streams media to temp files and refuses anything over the limit
+        env["MMCLAW_WA_MAX_BYTES"] = str(attachments.limit_for("file"))
+        # Once the user is known the bridge does not download anyone else's media
+        if self.authorized_id:
+            env["MMCLAW_WA_AUTHORIZED"] = self.authorized_id
         self.process = subprocess.Popen(
             ["node", self.bridge_path],
             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None,
@@ -525,6 +797,7 @@ class WhatsAppConnector(object):
                                         self.process.terminate()
                                         os._exit(0)
                                     else:
+                                        self._write_stdin(f"AUTHORIZE:{json.dumps({'to': sender})}\n")
                                         # Dispatch to thread — output_reader must keep running to handle ACKs
                                         threading.Thread(target=self.send, args=("⚡ Verification Successful! I am now your personal agent.",), daemon=True).start()
                                     continue
@@ -544,11 +817,11 @@ class WhatsAppConnector(object):
 
                         elif event["type"] == "image":
                             sender = event["from"]
-                            b64_data = event["base64"]
                             caption = event.get("caption", "").strip()
                             from_me = event.get("fromMe", False)
 
                             if not self.authorized_id or sender != self.authorized_id:
+                                attachments.discard(event["path"])
                                 continue
 
                             # We allow from_me for images because the bot currently only sends 
@@ -556,8 +829,7 @@ class WhatsAppConnector(object):
                             # This allows users to talk to the bot from the same account.
 
                             try:
-                                # Decode base64 to bytes
-                                image_bytes = base64.b64decode(b64_data)
+                                image_bytes = attachments.adopt(event["path"], "image.jpg", "image", event.get("size")).read()
                                 content = prepare_image_content(image_bytes, caption if caption else "What is in this image?")
                                 print(f"📩 WhatsApp: [Photo] {caption} (Compressed)")
                                 self.active_recipient = sender
@@ -565,20 +837,22 @@ class WhatsAppConnector(object):
                                     threading.Thread(target=self.callback, args=(content,), daemon=True).start()
                             except Exception as e:
                                 print(f"[!] WhatsApp Image Error: {e}")
+                            finally:
+                                attachments.discard(event["path"])
 
                         elif event["type"] == "file":
                             sender = event["from"]
-                            b64_data = event["base64"]
                             filename = event.get("filename", "file")
                             caption = event.get("caption", "").strip()
                             from_me = event.get("fromMe", False)
 
                             if not self.authorized_id or sender != self.authorized_id:
+                                attachments.discard(event["path"])
                                 continue
 
                             try:
-                                file_bytes = base64.b64decode(b64_data)
-                                file_path = self.file_saver(filename, file_bytes)
+                                attachment = attachments.adopt(event["path"], filename, "file", event.get("size"), event.get("sha256"))
+                                file_path = self.file_saver(filename, attachment.path)
 
                                 content = f"[Uploaded file: {file_path}]"
                                 if caption:
@@ -589,6 +863,9 @@ class WhatsAppConnector(object):
                                     threading.Thread(target=self.callback, args=(content,), daemon=True).start()
                             except Exception as e:
                                 print(f"[!] WhatsApp Document Error: {e}")
+                            finally:
+                                # file_saver moved it on success; anything left is ours to remove
+                                attachments.discard(event["path"])
 
                         elif event["type"] == "connected":
                             if not self.authorized_id:
@@ -601,13 +878,11 @@ class WhatsAppConnector(object):
                                     self.process.terminate()
                                     return
 
-                        elif event["type"] in ("msg_sent", "file_sent"):
-                            self._ack_error = None
-                            self._ack_event.set()
+                        elif event["type"] in ("msg_sent", "file_sent", "typing_sent"):
+                            self._resolve(event.get("id"))
 
-                        elif event["type"] in ("msg_error", "file_error"):
-                            self._ack_error = event.get("error", "unknown error")
-                            self._ack_event.set()
+                        elif event["type"] in ("msg_error", "file_error", "typing_error"):
+                            self._resolve(event.get("id"), RuntimeError(f"WhatsApp send failed: {event.get('error', 'unknown error')}"))
 
                     except Exception as e:
                         print(f"[!] Bridge Parse Error: {e}")
@@ -616,6 +891,10 @@ class WhatsAppConnector(object):
 
         threading.Thread(target=output_reader, daemon=True).start()
         self.process.wait()
+        with self._pending_lock:
+            pending = list(self._pending)
+        for request_id in pending:
+            self._resolve(request_id, RuntimeError("WhatsApp bridge exited"))
 
     def _write_stdin(self, data):
         with self._stdin_lock:
@@ -625,11 +904,8 @@ class WhatsAppConnector(object):
     def _send_presence(self, action):
         recipient = self.active_recipient or self.authorized_id
         if not self.process or not recipient: return
-        try:
-            payload = {"to": recipient, "action": action}
-            self._write_stdin(f"TYPING:{json.dumps(payload)}\n")
-        except Exception:
-            pass
+        # Fire and forget; presence does not count against MAX_IN_FLIGHT
+        self._request("TYPING", {"to": recipient, "action": action}, timeout=10, bounded=False)
 
     def start_typing(self):
         self._typing = True
@@ -645,41 +921,80 @@ class WhatsAppConnector(object):
         self._stop_typing_event.set()
         self._send_presence("paused")
 
-    @contextmanager
-    def _wa_send(self, timeout=60):
-        self._ack_event.clear()
-        self._ack_error = None
-        yield
-        if not self._ack_event.wait(timeout=timeout):
-            raise TimeoutError("WhatsApp send timed out")
-        if self._ack_error:
-            raise RuntimeError(f"WhatsApp send failed: {self._ack_error}")
+    def _request(self, command, payload, timeout=60, bounded=True):
+        """Write one bridge command tagged with a request id; returns a Future for its ACK."""
+        if bounded:
+            self._in_flight.acquire()
+        request_id = next(self._request_ids)
+        future = Future()
+        if bounded:
+            future.add_done_callback(lambda _: self._in_flight.release())
+        timer = threading.Timer(timeout, self._resolve,
+                                args=(request_id, TimeoutError(f"WhatsApp {command} timed out")))
+        timer.daemon = True
+        with self._pending_lock:
+            self._pending[request_id] = (future, timer)
+        try:
+            self._write_stdin(f"{command}:{json.dumps(dict(payload, id=request_id))}\n")
+        except Exception as e:
+            self._resolve(request_id, e)
+        else:
+            timer.start()
+        return future
+
+    def _resolve(self, request_id, error=None):
+        with self._pending_lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return  # already timed out, or an ACK for a command sent without an id
+        future, timer = entry
+        timer.cancel()
+        if error is None:
+            future.set_result(True)
+        else:
+            future.set_exception(error)
+
+    def _submit_chunk(self, chunk):
+        if not self.process or not (self.active_recipient or self.authorized_id): return None
+        recipient = self.active_recipient or self.authorized_id
+        self.last_sent_text = chunk
+        return self._request("SEND", {"to": recipient, "text": f"⚡ {chunk}"})
+
+    def _send_chunk(self, chunk):
+        future = self._submit_chunk(chunk)
+        if future is not None:
+            future.result()
 
     def send(self, message):
-        if not self.process or not (self.active_recipient or self.authorized_id): return
-        recipient = self.active_recipient or self.authorized_id
+        # All chunks are written at once; the bridge keeps them in order
         limit = 4000
         chunks = [message[i:i+limit] for i in range(0, len(message), limit)]
-        for chunk in chunks:
-            self.last_sent_text = chunk
-            payload = {"to": recipient, "text": f"⚡ {chunk}"}
+        futures = [self._submit_chunk(chunk) for chunk in chunks]
+        for future in futures:
+            if future is None:
+                continue
             try:
-                with self._wa_send():
-                    self._write_stdin(f"SEND:{json.dumps(payload)}\n")
+                future.result()
             except Exception as e:
                 print(f"[!] WhatsApp send error: {e}")
                 break
 
-    def send_file(self, path):
-        if not self.process or not (self.active_recipient or self.authorized_id): return
+    def _submit_file(self, path):
+        if not self.process or not (self.active_recipient or self.authorized_id): return None
         recipient = self.active_recipient or self.authorized_id
         full_path = os.path.abspath(os.path.expanduser(path))
-        payload = {"to": recipient, "path": full_path}
-        try:
-            with self._wa_send(timeout=120):
-                self._write_stdin(f"SEND_FILE:{json.dumps(payload)}\n")
-        except Exception as e:
-            print(f"[!] WhatsApp send_file error: {e}")
+        return self._request("SEND_FILE", {"to": recipient, "path": full_path}, timeout=120)
+
+    def send_file(self, path):
+        # Returns once the command is written, so a batch of files uploads in parallel
+        future = self._submit_file(path)
+        if future is None:
+            return
+
+        def _report(done):
+            if done.exception() is not None:
+                print(f"[!] WhatsApp send_file error: {done.exception()}")
+        future.add_done_callback(_report)
 
 class WeChatConnector(object):
     """WeChat (Weixin iLink Bot) connector via QR login + long-poll getUpdates."""
@@ -688,6 +1003,8 @@ class WeChatConnector(object):
     CDN_BASE_URL = "https://novac2c.cdn.weixin.qq.com/c2c"
     BOT_TYPE = "3"
     LONG_POLL_TIMEOUT_S = 38   # slightly longer than server's 35 s hold
+    TYPING_INTERVAL = 4        # the indicator lapses unless refreshed
+    TYPING_TICKET_TTL = 600    # refetched sooner if sendtyping refuses it
     MAX_CONSECUTIVE_FAILURES = 3
     CHANNEL_VERSION = "1.0.3"
     # UploadMediaType
@@ -706,11 +1023,17 @@ class WeChatConnector(object):
         self.token = self.wc_config.get("token")
         self.base_url = self.wc_config.get("base_url", self.DEFAULT_BASE_URL).rstrip("/")
         self.authorized_id = self.wc_config.get("authorized_id")
-        self._get_updates_buf = self.wc_config.get("get_updates_buf", "")
+        self._cursor = checkpoint("wechat")
+        # Older versions kept the buffer in mmclaw.json
+        self._get_updates_buf = self._cursor.get("get_updates_buf") or self.wc_config.get("get_updates_buf", "")
         self.callback = None
-        self._typing = False
         self._stop_event = threading.Event()
         self._context_tokens = {}   # from_user_id -> context_token (in-memory)
+        self._typing_cond = threading.Condition()
+        self._typing_tickets = {}   # user_id -> (typing_ticket, fetched at)
+        self._typing_due = {}       # user_id -> next "typing" refresh (monotonic)
+        self._typing_stops = []     # user_ids owed a "stopped" status
+        self._typing_thread = None
         self.file_saver = None
 
     # ------------------------------------------------------------------
@@ -733,9 +1056,8 @@ class WeChatConnector(object):
         return headers
 
     def _api_post(self, endpoint, body_dict, timeout=15):
-        import requests
         url = f"{self.base_url}/{endpoint}"
-        resp = requests.post(url, json=body_dict, headers=self._build_headers(), timeout=timeout)
+        resp = http_pool.session("wechat").post(url, json=body_dict, headers=self._build_headers(), timeout=timeout)
         resp.raise_for_status()
         return resp.json()
 
@@ -758,7 +1080,7 @@ class WeChatConnector(object):
         qr_url_endpoint = f"{base}/ilink/bot/get_bot_qrcode?bot_type={self.BOT_TYPE}"
 
         def _fetch_qr():
-            r = req.get(qr_url_endpoint, timeout=15)
+            r = http_pool.session("wechat").get(qr_url_endpoint, timeout=15)
             r.raise_for_status()
             d = r.json()
             return d["qrcode"], d["qrcode_img_content"]
@@ -790,8 +1112,8 @@ class WeChatConnector(object):
             try:
                 from urllib.parse import quote as _quote
                 status_url = f"{base}/ilink/bot/get_qrcode_status?qrcode={_quote(qrcode)}"
-                r = req.get(status_url, headers={"iLink-App-ClientVersion": "1"},
-                            timeout=self.LONG_POLL_TIMEOUT_S)
+                r = http_pool.session("wechat").get(status_url, headers={"iLink-App-ClientVersion": "1"},
+                                                    timeout=self.LONG_POLL_TIMEOUT_S)
                 r.raise_for_status()
                 d = r.json()
                 status = d.get("status", "wait")
@@ -856,24 +1178,13 @@ class WeChatConnector(object):
         raise ValueError(f"aes_key must decode to 16 raw bytes or 32-char hex string, "
                          f"got {len(decoded)} bytes")
 
-    @staticmethod
-    def _decrypt_aes_ecb(ciphertext, key):
-        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-        from cryptography.hazmat.primitives import padding as crypto_padding
-        dec = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
-        padded = dec.update(ciphertext) + dec.finalize()
-        unpadder = crypto_padding.PKCS7(128).unpadder()
-        return unpadder.update(padded) + unpadder.finalize()
-
-    def _download_and_decrypt_cdn(self, encrypt_query_param, aes_key_b64):
-        import requests as req
+    def _download_and_decrypt_cdn(self, encrypt_query_param, aes_key_b64, name="file", kind="file"):
+        """Stream and decrypt a CDN object to a temp file (``attachments.Attachment``)."""
         from urllib.parse import quote
         cdn_base = self.wc_config.get("cdn_base_url", self.CDN_BASE_URL)
         url = f"{cdn_base}/download?encrypted_query_param={quote(encrypt_query_param)}"
-        r = req.get(url, timeout=60)
-        r.raise_for_status()
         key = self._parse_aes_key(aes_key_b64)
-        return self._decrypt_aes_ecb(r.content, key)
+        return attachments.download(url, name, kind, decrypt=attachments.AesEcbStream(key))
 
     # ------------------------------------------------------------------
     # Inbound message handling
@@ -922,7 +1233,7 @@ class WeChatConnector(object):
                 if eqp and aes_key and self.callback:
                     def _send_image(eqp=eqp, aes_key=aes_key):
                         try:
-                            image_bytes = self._download_and_decrypt_cdn(eqp, aes_key)
+                            image_bytes = self._download_and_decrypt_cdn(eqp, aes_key, "image.jpg", kind="image").read()
                             content = prepare_image_content(image_bytes, "这张图片里有什么？")
                             self.callback(content)
                         except Exception as e:
@@ -943,8 +1254,8 @@ class WeChatConnector(object):
                 if eqp and aes_key and self.file_saver and self.callback:
                     def _send_file(file_name=file_name, eqp=eqp, aes_key=aes_key):
                         try:
-                            file_bytes = self._download_and_decrypt_cdn(eqp, aes_key)
-                            file_path = self.file_saver(file_name, file_bytes)
+                            attachment = self._download_and_decrypt_cdn(eqp, aes_key, file_name)
+                            file_path = self.file_saver(file_name, attachment.path)
                             self.callback(f"[Uploaded file: {file_path}]")
                         except Exception as e:
                             print(f"[!] WeChat file download error: {e}")
@@ -1008,14 +1319,17 @@ class WeChatConnector(object):
                     server_timeout_ms = data.get("longpolling_timeout_ms", 0)
                     if server_timeout_ms and server_timeout_ms > 0:
                         next_timeout_s = server_timeout_ms / 1000
+                    for msg in data.get("msgs", []):
+                        message_id = msg.get("message_id")
+                        if not self._cursor.is_seen(message_id):
+                            self._handle_message(msg)
+                            self._cursor.mark_seen(message_id)
+
+                    # Advance only after handling: a crash replays these (deduped above) rather than losing them
                     new_buf = data.get("get_updates_buf", "")
                     if new_buf and new_buf != self._get_updates_buf:
                         self._get_updates_buf = new_buf
-                        self.wc_config["get_updates_buf"] = new_buf
-                        self._save_wc_config()
-
-                    for msg in data.get("msgs", []):
-                        self._handle_message(msg)
+                        self._cursor.set("get_updates_buf", new_buf)
 
                 except Exception as e:
                     # requests.Timeout is also caught here — that's normal for long-poll
@@ -1032,87 +1346,114 @@ class WeChatConnector(object):
         threading.Thread(target=_poll_loop, daemon=True).start()
         self._stop_event.wait()
 
-    def start_typing(self):
-        self._typing = True
-        user_id = self.authorized_id
-        if not user_id:
-            return
-
-        def _type_loop():
-            ticket = None
-            while self._typing:
-                try:
-                    if not ticket:
-                        cfg_data = self._api_post(
-                            "ilink/bot/getconfig",
-                            {"ilink_user_id": user_id,
-                             "context_token": self._context_tokens.get(user_id, ""),
-                             "base_info": {"channel_version": self.CHANNEL_VERSION}},
-                            timeout=10,
-                        )
-                        ticket = cfg_data.get("typing_ticket")
-                    if ticket:
-                        self._api_post(
-                            "ilink/bot/sendtyping",
-                            {"ilink_user_id": user_id, "typing_ticket": ticket,
-                             "status": 1,
-                             "base_info": {"channel_version": self.CHANNEL_VERSION}},
-                            timeout=10,
-                        )
-                except Exception:
-                    ticket = None
-                self._stop_event.wait(4)
-
-        threading.Thread(target=_type_loop, daemon=True).start()
+    # ------------------------------------------------------------------
+    # Typing indicator: one scheduler thread for every active chat
+    # ------------------------------------------------------------------
 
-    def stop_typing(self):
-        self._typing = False
-        user_id = self.authorized_id
-        if not user_id or not self.token:
-            return
-        try:
-            cfg_data = self._api_post(
-                "ilink/bot/getconfig",
-                {"ilink_user_id": user_id,
-                 "context_token": self._context_tokens.get(user_id, ""),
-                 "base_info": {"channel_version": self.CHANNEL_VERSION}},
-                timeout=10,
-            )
-            ticket = cfg_data.get("typing_ticket")
+    def _typing_ticket(self, user_id, refresh=False):
+        """Cached ``typing_ticket`` for ``user_id``; fetched from getconfig when missing, stale or refused."""
+        with self._typing_cond:
+            cached = self._typing_tickets.get(user_id)
+        if cached and not refresh and time.monotonic() - cached[1] < self.TYPING_TICKET_TTL:
+            return cached[0]
+        cfg_data = self._api_post(
+            "ilink/bot/getconfig",
+            {"ilink_user_id": user_id,
+             "context_token": self._context_tokens.get(user_id, ""),
+             "base_info": {"channel_version": self.CHANNEL_VERSION}},
+            timeout=10,
+        )
+        ticket = cfg_data.get("typing_ticket")
+        with self._typing_cond:
             if ticket:
-                self._api_post(
+                self._typing_tickets[user_id] = (ticket, time.monotonic())
+            else:
+                self._typing_tickets.pop(user_id, None)
+        return ticket
+
+    def _send_typing(self, user_id, status):
+        """status 1 = typing, 2 = stopped; retries once with a fresh ticket."""
+        for refresh in (False, True):
+            try:
+                ticket = self._typing_ticket(user_id, refresh=refresh)
+                if not ticket:
+                    return
+                data = self._api_post(
                     "ilink/bot/sendtyping",
                     {"ilink_user_id": user_id, "typing_ticket": ticket,
-                     "status": 2,
+                     "status": status,
                      "base_info": {"channel_version": self.CHANNEL_VERSION}},
                     timeout=10,
                 )
-        except Exception:
-            pass
+                if data.get("ret", 0) == 0:
+                    return
+            except Exception:
+                pass
+
+    def _typing_loop(self):
+        while not self._stop_event.is_set():
+            with self._typing_cond:
+                now = time.monotonic()
+                due = [user for user, at in self._typing_due.items() if at <= now]
+                for user in due:
+                    self._typing_due[user] = now + self.TYPING_INTERVAL
+                stops, self._typing_stops = self._typing_stops, []
+                if not due and not stops:
+                    wait = min(self._typing_due.values(), default=now + 60) - now
+                    self._typing_cond.wait(max(0.0, wait))
+                    continue
+            for user in stops:
+                self._send_typing(user, 2)
+            for user in due:
+                self._send_typing(user, 1)
 
-    def send(self, message):
+    def start_typing(self):
+        user_id = self.authorized_id
+        if not user_id or not self.token:
+            return
+        with self._typing_cond:
+            self._typing_due[user_id] = 0.0
+            if user_id in self._typing_stops:
+                self._typing_stops.remove(user_id)
+            if self._typing_thread is None:
+                self._typing_thread = threading.Thread(target=self._typing_loop, daemon=True, name="mmclaw-wechat-typing")
+                self._typing_thread.start()
+            self._typing_cond.notify()
+
+    def stop_typing(self):
+        # Queued for the scheduler thread; the kernel never waits on it
+        user_id = self.authorized_id
+        with self._typing_cond:
+            if self._typing_due.pop(user_id, None) is not None:
+                self._typing_stops.append(user_id)
+                self._typing_cond.notify()
+
+    def _send_chunk(self, chunk):
         if not self.authorized_id or not self.token:
             return
         import uuid
+        msg_obj = {
+            "from_user_id": "",
+            "to_user_id": self.authorized_id,
+            "client_id": str(uuid.uuid4()),
+            "message_type": 2,   # BOT
+            "message_state": 2,  # FINISH
+            "item_list": [{"type": 1, "text_item": {"text": f"⚡ {chunk}"}}],
+        }
+        context_token = self._context_tokens.get(self.authorized_id)
+        if context_token:
+            msg_obj["context_token"] = context_token
+        self._api_post(
+            "ilink/bot/sendmessage",
+            {"msg": msg_obj, "base_info": {"channel_version": self.CHANNEL_VERSION}},
+            timeout=15,
+        )
+
+    def send(self, message):
         limit = 4000
         for chunk in [message[i:i+limit] for i in range(0, len(message), limit)]:
             try:
-                msg_obj = {
-                    "from_user_id": "",
-                    "to_user_id": self.authorized_id,
-                    "client_id": str(uuid.uuid4()),
-                    "message_type": 2,   # BOT
-                    "message_state": 2,  # FINISH
-                    "item_list": [{"type": 1, "text_item": {"text": f"⚡ {chunk}"}}],
-                }
-                context_token = self._context_tokens.get(self.authorized_id)
-                if context_token:
-                    msg_obj["context_token"] = context_token
-                self._api_post(
-                    "ilink/bot/sendmessage",
-                    {"msg": msg_obj, "base_info": {"channel_version": self.CHANNEL_VERSION}},
-                    timeout=15,
-                )
+                self._send_chunk(chunk)
             except Exception as e:
                 print(f"[!] WeChat send error: {e}")
                 break
@@ -1126,26 +1467,32 @@ class WeChatConnector(object):
         import math
         return math.ceil((plaintext_size + 1) / 16) * 16
 
-    @staticmethod
-    def _encrypt_aes_ecb(plaintext, key):
-        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-        from cryptography.hazmat.primitives import padding as crypto_padding
-        padder = crypto_padding.PKCS7(128).padder()
-        padded = padder.update(plaintext) + padder.finalize()
-        enc = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
-        return enc.update(padded) + enc.finalize()
+    # Uploads larger than this report progress in the chat
+    UPLOAD_PROGRESS_BYTES = 16 * 1024 * 1024
+
+    def _upload_progress(self, file_path, rawsize):
+        """``on_progress`` callback posting 25% milestones, and the reporter to finish (None for small files)."""
+        if rawsize < self.UPLOAD_PROGRESS_BYTES:
+            return None, None
+        from .progress import ProgressReporter
+        name = os.path.basename(file_path)
+        progress = ProgressReporter(self, self.config)
+        progress.step(f"📤 Uploading {name} ({rawsize / (1024 * 1024):.0f} MB)...")
+        reported = [0]
+
+        def on_progress(sent, total):
+            percent = sent * 100 // total // 25 * 25
+            if percent > reported[0]:
+                reported[0] = percent
+                progress.step(f"📤 {name}: {percent}%")
+        return on_progress, progress
 
     def _upload_to_cdn(self, file_path, to_user_id, media_type):
-        """Encrypt file and upload to WeChat CDN. Returns upload info dict."""
-        import hashlib
-        import requests as req
+        """Encrypt file and upload to WeChat CDN, streaming from disk. Returns upload info dict."""
         from urllib.parse import quote
 
-        with open(file_path, "rb") as f:
-            plaintext = f.read()
-
-        rawsize = len(plaintext)
-        rawfilemd5 = hashlib.md5(plaintext).hexdigest()
+        rawsize = os.path.getsize(file_path)
+        rawfilemd5 = attachments.file_md5(file_path)
         aeskey = os.urandom(16)
         filekey = os.urandom(16).hex()
         filesize = self._aes_ecb_padded_size(rawsize)
@@ -1166,29 +1513,37 @@ class WeChatConnector(object):
         if not upload_param:
             raise RuntimeError(f"getuploadurl returned no upload_param: {upload_resp}")
 
-        ciphertext = self._encrypt_aes_ecb(plaintext, aeskey)
         cdn_base = self.wc_config.get("cdn_base_url", self.CDN_BASE_URL)
         cdn_url = (f"{cdn_base}/upload"
                    f"?encrypted_query_param={quote(upload_param)}"
                    f"&filekey={quote(filekey)}")
 
+        on_progress, progress = self._upload_progress(file_path, rawsize)
         download_param = None
-        for attempt in range(1, 4):
-            r = req.post(cdn_url, data=ciphertext,
-                         headers={"Content-Type": "application/octet-stream"},
-                         timeout=120)
-            if 400 <= r.status_code < 500:
-                raise RuntimeError(f"CDN upload client error {r.status_code}: "
-                                   f"{r.headers.get('x-error-message', r.text)}")
-            if r.status_code != 200:
-                if attempt < 3:
-                    continue
-                raise RuntimeError(f"CDN upload failed after 3 attempts: {r.status_code}")
-            download_param = r.headers.get("x-encrypted-param")
-            if download_param:
-                break
-            if attempt == 3:
-                raise RuntimeError("CDN upload response missing x-encrypted-param header")
+        outcome = "failed"
+        try:
+            for attempt in range(1, 4):
+                # A fresh reader per attempt: the body is encrypted as it is sent
+                with attachments.EncryptedFileReader(file_path, aeskey, on_progress) as body:
+                    r = http_pool.session("wechat").post(cdn_url, data=body,
+                                 headers={"Content-Type": "application/octet-stream"},
+                                 timeout=120)
+                if 400 <= r.status_code < 500:
+                    raise RuntimeError(f"CDN upload client error {r.status_code}: "
+                                       f"{r.headers.get('x-error-message', r.text)}")
+                if r.status_code != 200:
+                    if attempt < 3:
+                        continue
+                    raise RuntimeError(f"CDN upload failed after 3 attempts: {r.status_code}")
+                download_param = r.headers.get("x-encrypted-param")
+                if download_param:
+                    break
+                if attempt == 3:
+                    raise RuntimeError("CDN upload response missing x-encrypted-param header")
+            outcome = "done"
+        finally:
+            if progress is not None:
+                progress.finish(outcome)
 
         return {
             "download_encrypted_query_param": download_param,
@@ -1339,11 +1694,14 @@ class QQBotConnector(object):
         connector._client = MMClawBot(intents=intents, bot_log=False)
         connector._client.run(appid=self.app_id, secret=self.app_secret)
 
+    # Typing is shown as messages; the dispatcher queues them in order with the reply
+    TYPING_MARKERS = ("⏳", "✅")
+
     def start_typing(self):
-        self.send("⏳")
+        self.send(self.TYPING_MARKERS[0])
 
     def stop_typing(self):
-        self.send("✅")
+        self.send(self.TYPING_MARKERS[1])
 
     async def _send_async(self, text):
         if not self._last_message or not self._api:
@@ -1362,15 +1720,17 @@ class QQBotConnector(object):
         except Exception as e:
             print(f"[!] QQ Bot Reply Error: {e}")
 
-    def send(self, message):
+    def _send_chunk(self, chunk):
         if not self._loop or not self._last_message:
             return
+        asyncio.run_coroutine_threadsafe(self._send_async(f"⚡ {chunk}"), self._loop).result(timeout=30)
+
+    def send(self, message):
         limit = 4000
         chunks = [message[i:i+limit] for i in range(0, len(message), limit)]
         for chunk in chunks:
-            future = asyncio.run_coroutine_threadsafe(self._send_async(f"⚡ {chunk}"), self._loop)
             try:
-                future.result(timeout=30)
+                self._send_chunk(chunk)
             except Exception as e:
                 print(f"[!] QQ Bot Send Error: {e}")
                 break
@@ -0,0 +1,341 @@
+"""Outbound message dispatcher.
+
+``connector.send`` talks to the platform API on the caller's thread, so a
+burst of tool notifications stalls the agent loop on network I/O and can
+trip platform rate limits (Telegram allows about one message per second per
+chat). ``OutboundDispatcher`` wraps a connector: ``send``/``send_file``
+enqueue and return a ``SendHandle`` at once, and a background thread drains
+the queue under a token bucket per platform. While it waits for a token,
+adjacent text messages are coalesced into one (up to the 4000-char platform
+chunk), and 429 responses pause the bucket for the time the platform asks.
+
+Configured under ``config["dispatcher"]``::
+
+    "dispatcher": {
+        "enabled": true,
+        "rates": {"telegram": [1.0, 2]}   # messages per second, burst
+    }
+
+Connectors opt in by implementing ``_send_chunk(text)``, which sends one
+chunk and raises on failure; the rest (terminal, -p mode) are called inline.
+Connectors whose sends are acknowledged asynchronously (the WhatsApp bridge)
+also implement ``_submit_chunk(text)`` / ``_submit_file(path)`` returning a
+Future, so several sends are in flight at once and a handle resolves only
+when its acknowledgement arrives.
+Status-message edits (``send_status``/``edit_status``) take tokens from the
+same bucket. ``stop_typing`` waits for the queue to drain, so the typing
+indicator lasts until the reply is out; connectors that signal typing with
+messages (``TYPING_MARKERS``, e.g. ⏳/✅) have those queued behind the reply.
+Connectors that serve several chats (Telegram groups) take a
+``conversation_id`` keyword; items keep it and are only merged within a chat.
+"""
+import threading
+import time
+import urllib.error
+from collections import deque
+
+
+CHUNK = 4000
+MAX_RATE_LIMIT_RETRIES = 3
+
+# platform -> (messages per second, burst)
+DEFAULT_RATES = {
+    "telegram": (1.0, 2),
+    "wechat": (1.0, 2),
+    "whatsapp": (1.0, 2),
+    "feishu": (5.0, 5),
+    "qqbot": (1.0, 1),
+}
+
+
+def target_kwargs(conversation_id):
+    """Keyword arguments routing a connector call to ``conversation_id`` (none for the primary chat)."""
+    return {} if conversation_id is None else {"conversation_id": conversation_id}
+
+
+class RateLimited(Exception):
+    """Raised by ``_send_chunk`` when the platform refuses a send for being too fast."""
+
+    def __init__(self, retry_after=None):
+        super().__init__(f"rate limited{f', retry after {retry_after:g}s' if retry_after else ''}")
+        self.retry_after = retry_after
+
+
+def rate_limit_delay(error):
+    """Seconds to back off if ``error`` is a platform rate limit, else None."""
+    if isinstance(error, RateLimited):
+        return error.retry_after or 1.0
+    if getattr(error, "error_code", None) == 429:
+        # telebot's ApiTelegramException
+        parameters = (getattr(error, "result_json", None) or {}).get("parameters") or {}
+        return float(parameters.get("retry_after") or 1.0)
+    if isinstance(error, urllib.error.HTTPError) and error.code == 429:
+        from .providers.retry import server_delay
+        return server_delay(error) or 1.0
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        # requests.HTTPError (WeChat)
+        try:
+            return float(response.headers.get("Retry-After") or 1.0)
+        except ValueError:
+            return 1.0
+    return None
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is)."""
+        now = self._refill()
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class SendHandle(object):
+    """Returned by ``send``; ``wait()`` blocks until the message went out (True) or was dropped (False)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.error = None
+
+    def _resolve(self, error=None):
+        self.error = error
+        self._event.set()
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout) and self.error is None
+
+
+class _Item(object):
+    __slots__ = ("kind", "payload", "handles", "target", "attempts")
+
+    def __init__(self, kind, payload, handles, target=None):
+        self.kind = kind          # "text", "file" or "marker" (a typing marker, never merged)
+        self.payload = payload
+        self.handles = handles    # resolved once this item is delivered
+        self.target = target      # conversation_id, None for the primary chat
+        self.attempts = 0
+
+
+class OutboundDispatcher(object):
+    def __init__(self, connector, config=None):
+        self.connector = connector
+        options = (config or {}).get("dispatcher") or {}
+        self.platform = type(connector).__name__.lower().replace("connector", "")
+        rate = (options.get("rates") or {}).get(self.platform, DEFAULT_RATES.get(self.platform))
+        self.inline = (not options.get("enabled", True) or rate is None
+                       or not hasattr(connector, "_send_chunk"))
+        self.bucket = None if self.inline else TokenBucket(*rate)
+        self.stats = {"queued": 0, "sent": 0, "coalesced": 0, "rate_limited": 0, "dropped": 0}
+        self._queue = deque()
+        self._bucket_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._in_flight = 0
+        self._thread = None
+
+    def __getattr__(self, name):
+        # listen(), file_saver, ... go straight to the connector
+        attr = getattr(self.connector, name)
+        if name in ("send_status", "edit_status") and not self.inline:
+            return self._paced(attr)
+        return attr
+
+    def _acquire(self):
+        """Block until the bucket has a token, then take it."""
+        while True:
+            with self._bucket_lock:
+                delay = self.bucket.delay()
+                if delay <= 0:
+                    self.bucket.take()
+                    return
+            time.sleep(delay)
+
+    def _paced(self, func):
+        def call(*args, **kwargs):
+            self._acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                if delay is not None:
+                    with self._bucket_lock:
+                        self.bucket.pause(delay)
+                raise
+        return call
+
+    def start_typing(self, conversation_id=None):
+        markers = getattr(self.connector, "TYPING_MARKERS", None)
+        if markers and not self.inline:
+            self._enqueue([_Item("marker", markers[0], [], conversation_id)])
+        else:
+            self.connector.start_typing(**target_kwargs(conversation_id))
+
+    def stop_typing(self, conversation_id=None):
+        markers = getattr(self.connector, "TYPING_MARKERS", None)
+        if markers and not self.inline:
+            self._enqueue([_Item("marker", markers[1], [], conversation_id)])
+            return
+        if not self.inline:
+            self.flush()
+        self.connector.stop_typing(**target_kwargs(conversation_id))
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, items):
+        with self._cond:
+            self._queue.extend(items)
+            self.stats["queued"] += len(items)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=f"mmclaw-send-{self.platform}")
+                self._thread.start()
+            self._cond.notify_all()
+
+    def send(self, message, conversation_id=None):
+        handle = SendHandle()
+        if self.inline:
+            self.connector.send(message, **target_kwargs(conversation_id))
+            handle._resolve()
+            return handle
+        message = str(message)
+        chunks = [message[i:i + CHUNK] for i in range(0, len(message), CHUNK)] or [""]
+        self._enqueue([_Item("text", chunk, [handle] if i == len(chunks) - 1 else [], conversation_id)
+                       for i, chunk in enumerate(chunks)])
+        return handle
+
+    def send_file(self, path, conversation_id=None):
+        handle = SendHandle()
+        if self.inline:
+            self.connector.send_file(path, **target_kwargs(conversation_id))
+            handle._resolve()
+            return handle
+        self._enqueue([_Item("file", path, [handle], conversation_id)])
+        return handle
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been delivered or dropped."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ------------------------------------------------------------------
+    # Sender thread
+    # ------------------------------------------------------------------
+
+    def _next(self):
+        """Pop the next item, merging adjacent small text messages into it."""
+        item = self._queue.popleft()
+        while (item.kind == "text" and self._queue and self._queue[0].kind == "text"
+               and self._queue[0].target == item.target
+               and len(item.payload) + 2 + len(self._queue[0].payload) <= CHUNK):
+            following = self._queue.popleft()
+            item = _Item("text", f"{item.payload}\n\n{following.payload}", item.handles + following.handles, item.target)
+            self.stats["coalesced"] += 1
+        return item
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._busy = False
+                    self._cond.notify_all()
+                    self._cond.wait()
+                self._busy = True
+            # Messages keep arriving while we wait for a token; they are merged below
+            self._acquire()
+            with self._cond:
+                item = self._next()
+            self._deliver(item)
+
+    def _deliver(self, item):
+        try:
+            future = self._submit(item)
+        except Exception as e:
+            self._failed(item, e)
+            return
+        if future is None:
+            self._delivered(item)
+            return
+        # Pipelined: the next item goes out while this one awaits its acknowledgement
+        with self._cond:
+            self._in_flight += 1
+        future.add_done_callback(lambda done: self._completed(item, done))
+
+    def _submit(self, item):
+        """Send ``item``; returns a Future for connectors that acknowledge asynchronously, else None."""
+        target = target_kwargs(item.target)
+        if item.kind == "file":
+            submit = getattr(self.connector, "_submit_file", None)
+            if submit is not None:
+                return submit(item.payload, **target)
+            self.connector.send_file(item.payload, **target)
+            return None
+        submit = getattr(self.connector, "_submit_chunk", None)
+        if submit is not None:
+            return submit(item.payload, **target)
+        self.connector._send_chunk(item.payload, **target)
+        return None
+
+    def _completed(self, item, future):
+        error = future.exception()
+        if error is None:
+            self._delivered(item)
+        else:
+            self._failed(item, error)
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _delivered(self, item):
+        self.stats["sent"] += 1
+        for handle in item.handles:
+            handle._resolve()
+
+    def _failed(self, item, error):
+        delay = rate_limit_delay(error)
+        item.attempts += 1
+        if delay is not None and item.attempts <= MAX_RATE_LIMIT_RETRIES:
+            print(f"[!] {self.platform}: rate limited, pausing sends for {delay:.1f}s")
+            self.stats["rate_limited"] += 1
+            with self._bucket_lock:
+                self.bucket.pause(delay)
+            with self._cond:
+                self._queue.appendleft(item)
+                self._cond.notify_all()
+            return
+        print(f"[!] {self.platform} send error: {error}")
+        self.stats["dropped"] += 1
+        for handle in item.handles:
+            handle._resolve(error)
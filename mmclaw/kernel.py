@@ -1,3 +1,4 @@
+import asyncio
 import threading
 import traceback
 import queue
@@ -5,16 +6,23 @@ import json
 import re
 
 JSON_PARSE_RETRIES = 1
+import os
 import time
 import subprocess
 import random
 from datetime import datetime, timezone
 from pathlib import Path
-from .providers import Engine
+from . import aio, attachments
+from .aio import AsyncConnectorAdapter
+from .providers import Engine, vision
+from .providers.router import normalize_history
 from .tools import ShellTool, AsyncShellTool, FileTool, TimerTool, SessionTool, UpgradeTool, BrowserTool
 from .tool_schemas import get_native_tool_schemas
 from .config import _find_file_icase
+from .dispatcher import OutboundDispatcher, target_kwargs
+from .progress import ProgressReporter
 from .memory import FileMemory, StatelessMemory
+from .usage import UsageLedger, skill_for
 from .watcher import WatcherManager
 
 
@@ -302,12 +310,69 @@ class CronManager:
         return "\n".join(lines)
 
 
+class JobCascade(object):
+    """Engine choice for one job: start on the job class's engine, escalate once if allowed.
+
+    Escalation happens when the model answers with ``MARKER`` (low confidence)
+    or when the tool loop reaches ``after_steps`` model calls. After escalating
+    to another vendor the history is normalized as the router does, since tool
+    call ids and thought signatures from the first engine may be rejected.
+    """
+    MARKER = "[ESCALATE]"
+    PROMPT = (
+        "If this task is beyond what you can do reliably, reply with exactly "
+        "[ESCALATE] and nothing else; a stronger model will take over."
+    )
+
+    def __init__(self, engine, strong=None, after_steps=None, label=""):
+        self.engine = engine
+        self.strong = strong if strong is not engine else None
+        self.after_steps = after_steps
+        self.label = label
+        self.steps = 0
+        self.translate = None   # after a cross-vendor escalation: normalize for Gemini (True) or not (False)
+
+    @staticmethod
+    def _vendor(engine):
+        # The provider's own type: a profile engine or a router ("router" normalizes by itself)
+        return getattr(getattr(engine, "provider", None), "engine_type", None) or engine.engine_type
+
+    def _escalate(self, reason):
+        print(f"[*] Escalating {self.label} job to {self.strong.engine_type} ({reason})")
+        vendor = self._vendor(self.strong)
+        if vendor not in (self._vendor(self.engine), "router"):
+            self.translate = vendor == "vertex_ai"
+        self.engine = self.strong
+        self.strong = None
+
+    def prepare(self, messages):
+        """Called before every model call; returns the messages to send."""
+        if self.strong is not None and self.after_steps and self.steps >= self.after_steps:
+            self._escalate(f"{self.steps} steps")
+        if self.translate is not None:
+            messages = normalize_history(messages, gemini=self.translate)
+        if self.strong is None or not messages or messages[0].get("role") != "system":
+            return messages
+        system = dict(messages[0], content=f"{messages[0].get('content', '')}\n\n{self.PROMPT}")
+        return [system] + messages[1:]
+
+    def should_retry(self, response_msg):
+        """Called after every model call; True means drop the response and ask the strong engine."""
+        self.steps += 1
+        if self.strong is not None and self.MARKER in (response_msg.get("content") or ""):
+            self._escalate("low confidence")
+            return True
+        return False
+
+
 class MMClaw(object):
     def __init__(self, config, connector, system_prompt, use_stateless_arg_connector=False, stateless_use_global_memory=False):
         self.config = config
         if "tool_calling_mode" not in self.config:
             self.config["tool_calling_mode"] = "native"
         self.engine = Engine(config)
+        attachments.configure(config)
+        self._profile_engines = {}
         if self.config.get("tool_calling_mode") == "native" and not self.engine.supports_native_tools:
             print(f"[!] Native tool calling is not implemented for {self.config.get('engine_type')}; falling back to JSON tool protocol.")
             self.config["tool_calling_mode"] = "json"
@@ -315,18 +380,20 @@ class MMClaw(object):
             print(f"[*] Tool calling mode: native ({self.config.get('engine_type')})")
         else:
             print("[*] Tool calling mode: JSON protocol")
+        # After the mode is settled: previews are only sent when image_full is offered
+        vision.configure(config)
         self.connector = connector
         self.memory = StatelessMemory(system_prompt, use_global_memory=stateless_use_global_memory) if use_stateless_arg_connector else FileMemory(system_prompt)
         self.connector.file_saver = self.memory.save_file
+        # Sends go through a rate-limited background queue so the agent loop never waits on the platform
+        self.connector = OutboundDispatcher(connector, config)
         self.chat_queue = queue.Queue()
         self.heartbeat_queue = queue.Queue()
         self.cron_queue = queue.Queue()
         self.debug = config.get("debug", False)
         self.use_stateless_arg_connector = use_stateless_arg_connector
 
-        threading.Thread(target=self._worker, args=(self.chat_queue, "chat"), daemon=True).start()
-        threading.Thread(target=self._worker, args=(self.heartbeat_queue, "heartbeat"), daemon=True).start()
-        threading.Thread(target=self._worker, args=(self.cron_queue, "cron"), daemon=True).start()
+        self._start_workers()
 
         if not use_stateless_arg_connector:
             self.heartbeat = HeartbeatManager(self.heartbeat_queue, self.connector)
@@ -343,6 +410,57 @@ class MMClaw(object):
         self._current_proc = None
         self._proc_lock    = threading.Lock()
 
+    def _start_workers(self):
+        threading.Thread(target=self._worker, args=(self.chat_queue, "chat"), daemon=True).start()
+        threading.Thread(target=self._worker, args=(self.heartbeat_queue, "heartbeat"), daemon=True).start()
+        threading.Thread(target=self._worker, args=(self.cron_queue, "cron"), daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Job profiles
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _job_class(mode, user_text):
+        if mode == "chat" and isinstance(user_text, str) and user_text.startswith("[WATCHER:"):
+            return "watcher"
+        return mode
+
+    def _engine_for(self, job_class):
+        """Engine configured for ``job_class`` in ``job_profiles`` (defaults to the main engine)."""
+        profile = (self.config.get("job_profiles") or {}).get(job_class)
+        if not profile:
+            return self.engine
+        engine = self._profile_engines.get(job_class)
+        if engine is None:
+            try:
+                engine = Engine(self.config, profile=profile)
+            except Exception as e:
+                print(f"[!] Job profile '{job_class}' is invalid ({e}); using the main engine.")
+                engine = self.engine
+            if engine.supports_native_tools != self.engine.supports_native_tools:
+                print(f"[!] Job profile '{job_class}' uses a different tool calling mode; using the main engine.")
+                engine = self.engine
+            self._profile_engines[job_class] = engine
+        return engine
+
+    def _record_usage(self, response_msg, job_class, user_text, engine, memory=None):
+        """Move the normalized usage off the response (it is not history) into the ledger."""
+        usage = response_msg.pop("usage", None)
+        if not usage:
+            return
+        usage.setdefault("engine", engine.engine_type)
+        usage.setdefault("model", ((self.config.get("engines") or {}).get(engine.engine_type) or {}).get("model"))
+        session_dir = getattr(memory or self.memory, "session_dir", None)
+        session = os.path.basename(session_dir) if session_dir else "stateless"
+        UsageLedger.record(usage, session, job_class, skill_for(user_text))
+
+    def _cascade_for(self, job_class):
+        profile = (self.config.get("job_profiles") or {}).get(job_class) or {}
+        strong = None
+        if profile.get("escalate_to"):
+            strong = self._engine_for(profile["escalate_to"])
+        return JobCascade(self._engine_for(job_class), strong, profile.get("escalate_after_steps"), label=job_class)
+
     # ------------------------------------------------------------------
     # /stop support
     # ------------------------------------------------------------------
@@ -363,15 +481,16 @@ class MMClaw(object):
         if self._stop_event.is_set():
             raise StopRequested()
 
-    def _ask_with_stop(self, messages, tools=None):
+    def _ask_with_stop(self, messages, tools=None, engine=None):
         """Run engine.ask() in a daemon thread, interruptible by the stop event."""
+        engine = engine or self.engine
         result_box = [None]
         error_box  = [None]
         done       = threading.Event()
 
         def _ask():
             try:
-                result_box[0] = self.engine.ask(messages, tools=tools)
+                result_box[0] = engine.ask(messages, tools=tools)
             except Exception as e:
                 error_box[0] = e
             finally:
@@ -471,45 +590,57 @@ class MMClaw(object):
             else:
                 self.memory.add_message(message)
 
-    def _execute_tool_call(self, name, args, silent_tools, is_background):
+    def _full_image_messages(self, tool_calls):
+        """User messages carrying the originals asked for with image_full (tool results are text only)."""
+        messages = []
+        for call in tool_calls:
+            if call.get("name") == "image_full":
+                content = vision.full_resolution((call.get("args") or {}).get("image_id", ""))
+                if content is not None:
+                    messages.append({"role": "user", "content": content})
+        return messages
+
+    def _execute_tool_call(self, name, args, silent_tools, is_background, progress=None, conversation_id=None):
+        step = progress.step if progress is not None else self.connector.send
+        target = target_kwargs(conversation_id)
         result = ""
         session_reset = False
 
         if name == "shell_execute":
-            if not silent_tools:self.connector.send(f"🐚 Shell: `{args.get('command')}`")
+            if not silent_tools:step(f"🐚 Shell: `{args.get('command')}`")
             if is_background:
                 result = ShellTool.execute(args.get("command"))
             else:
                 result = self._shell_execute_with_stop(args.get("command"))
         elif name == "shell_async":
-            if not silent_tools:self.connector.send(f"🚀 Async Shell: `{args.get('command')}`")
+            if not silent_tools:step(f"🚀 Async Shell: `{args.get('command')}`")
             result = AsyncShellTool.execute(args.get("command"))
         elif name == "file_read":
-            if not silent_tools:self.connector.send(f"📖 Read: `{args.get('path')}`")
+            if not silent_tools:step(f"📖 Read: `{args.get('path')}`")
             result = FileTool.read(args.get("path"))
         elif name == "file_write":
-            if not silent_tools:self.connector.send(f"💾 Write: `{args.get('path')}`")
+            if not silent_tools:step(f"💾 Write: `{args.get('path')}`")
             result = FileTool.write(args.get("path"), args.get("content"))
         elif name == "file_upload":
-            if not silent_tools:self.connector.send(f"📤 Upload: `{args.get('path')}`")
-            self.connector.send_file(args.get("path"))
+            if not silent_tools:step(f"📤 Upload: `{args.get('path')}`")
+            self.connector.send_file(args.get("path"), **target)
             result = f"File {args.get('path')} sent."
         elif name == "wait":
-            if not silent_tools:self.connector.send(f"⏳ Waiting {args.get('seconds')}s...")
+            if not silent_tools:step(f"⏳ Waiting {args.get('seconds')}s...")
             if is_background:
                 result = TimerTool.wait(args.get("seconds"))
             else:
                 result = self._wait_with_stop(args.get("seconds"))
         elif name == "reset_session":
             self.memory.reset()
-            if not silent_tools:self.connector.send("✨ Session reset! Starting fresh.")
+            if not silent_tools:step("✨ Session reset! Starting fresh.")
             result = "Success: Session history cleared."
             session_reset = True
         elif name == "memory_add":
-            if not silent_tools:self.connector.send(f"🧠 Memorize: `{args.get('memory', '')}`")
+            if not silent_tools:step(f"🧠 Memorize: `{args.get('memory', '')}`")
             result = self.memory.global_memory_add(args.get("memory", ""))
         elif name == "memory_list":
-            if not silent_tools:self.connector.send("🧠 Listing global memories...")
+            if not silent_tools:step("🧠 Listing global memories...")
             result = self.memory.global_memory_list()
         elif name == "memory_delete":
             indices = args.get("indices", args.get("index", -1))
@@ -517,34 +648,34 @@ class MMClaw(object):
                 indices = [int(i) for i in indices]
             else:
                 indices = int(indices)
-            if not silent_tools:self.connector.send(f"🧠 Delete memory {indices}")
+            if not silent_tools:step(f"🧠 Delete memory {indices}")
             result = self.memory.global_memory_delete(indices)
         elif name == "browser_start":
-            if not silent_tools:self.connector.send("🌐 Starting browser...")
+            if not silent_tools:step("🌐 Starting browser...")
             user_data_dir = self.config.get("browser", {}).get("data_dir")
             result = BrowserTool.start(user_data_dir=user_data_dir)
         elif name == "browser_stop":
-            if not silent_tools:self.connector.send("🌐 Stopping browser...")
+            if not silent_tools:step("🌐 Stopping browser...")
             result = BrowserTool.stop()
         elif name == "browser_navigate":
-            if not silent_tools:self.connector.send(f"🌐 Navigate: `{args.get('url')}`")
+            if not silent_tools:step(f"🌐 Navigate: `{args.get('url')}`")
             result = BrowserTool.navigate(args.get("url"))
         elif name == "browser_click":
-            if not silent_tools:self.connector.send(f"🌐 Click: `{args.get('selector')}`")
+            if not silent_tools:step(f"🌐 Click: `{args.get('selector')}`")
             result = BrowserTool.click(args.get("selector"))
         elif name == "browser_fill":
-            if not silent_tools:self.connector.send(f"🌐 Fill: `{args.get('selector')}`")
+            if not silent_tools:step(f"🌐 Fill: `{args.get('selector')}`")
             result = BrowserTool.fill(args.get("selector"), args.get("text", ""))
         elif name == "browser_get_text":
-            if not silent_tools:self.connector.send(f"🌐 Get text: `{args.get('selector', 'body')}`")
+            if not silent_tools:step(f"🌐 Get text: `{args.get('selector', 'body')}`")
             result = BrowserTool.get_text(args.get("selector"))
         elif name == "browser_screenshot":
-            if not silent_tools:self.connector.send("🌐 Screenshot...")
+            if not silent_tools:step("🌐 Screenshot...")
             result = BrowserTool.screenshot(args.get("path"))
             if result.startswith("OK:"):
-                if not silent_tools:self.connector.send_file(result[4:].strip())
+                if not silent_tools:self.connector.send_file(result[4:].strip(), **target)
         elif name == "cron_create":
-            if not silent_tools:self.connector.send(f"⏰ Cron create: `{args.get('name')}`")
+            if not silent_tools:step(f"⏰ Cron create: `{args.get('name')}`")
             result = self.cron.create(args.get("name"), args.get("cron"), args.get("prompt"))
         elif name == "cron_delete":
             indices = args.get("indices", args.get("index", -1))
@@ -552,11 +683,17 @@ class MMClaw(object):
                 indices = [int(i) for i in indices]
             else:
                 indices = int(indices)
-            if not silent_tools:self.connector.send(f"⏰ Cron delete: {indices}")
+            if not silent_tools:step(f"⏰ Cron delete: {indices}")
             result = self.cron.delete(indices)
         elif name == "cron_list":
-            if not silent_tools:self.connector.send("⏰ Listing cron jobs...")
+            if not silent_tools:step("⏰ Listing cron jobs...")
             result = self.cron.list_jobs()
+        elif name == "image_full":
+            if not silent_tools:step("🖼️ Viewing full-resolution image...")
+            if vision.has_original(args.get("image_id", "")):
+                result = "The full-resolution image follows in the next message."
+            else:
+                result = f"Error: image '{args.get('image_id')}' is no longer available."
         elif name == "upgrade":
             if not silent_tools:self.connector.send("⬆️ Upgrading MMClaw... (this is tricky — there's no notification when it's done. Please wait a moment, then ask me for my version number to confirm the upgrade succeeded.)")
             result = UpgradeTool.upgrade()
@@ -592,6 +729,11 @@ class MMClaw(object):
                 else:
                     self.memory.add("user", user_text)
 
+            job_class = self._job_class(mode, user_text)
+            cascade = self._cascade_for(job_class)
+            progress = ProgressReporter(self.connector, self.config)
+            outcome = "done"
+
             self.connector.start_typing()
             try:
                 json_retries_left = JSON_PARSE_RETRIES
@@ -607,16 +749,22 @@ class MMClaw(object):
                     use_local_history = is_background or self.use_stateless_arg_connector
                     ask_messages = [self.memory.get_all()[0]] + history if use_local_history else self.memory.get_all()
 
+                    ask_messages = cascade.prepare(ask_messages)
+                    engine = cascade.engine
+
                     native_enabled = (
                         self.config.get("tool_calling_mode", "native") == "native"
-                        and self.engine.supports_native_tools
+                        and engine.supports_native_tools
                     )
                     native_tools = get_native_tool_schemas(self.config) if native_enabled else None
 
                     if is_background:
-                        response_msg = self.engine.ask(ask_messages, tools=native_tools)
+                        response_msg = engine.ask(ask_messages, tools=native_tools)
                     else:
-                        response_msg = self._ask_with_stop(ask_messages, tools=native_tools)
+                        response_msg = self._ask_with_stop(ask_messages, tools=native_tools, engine=engine)
+                    self._record_usage(response_msg, job_class, user_text, engine)
+                    if cascade.should_retry(response_msg):
+                        continue
                     raw_text = response_msg.get("content", "")
 
                     if native_enabled:
@@ -624,6 +772,7 @@ class MMClaw(object):
                         self._append_model_message(response_msg, history, use_local_history)
 
                         if not tool_calls:
+                            progress.finish()
                             if raw_text and not silent_content:
                                 self.connector.send(raw_text)
                             break
@@ -641,7 +790,7 @@ class MMClaw(object):
                             if self.debug:
                                 print(f"    Args: {json.dumps(args)}")
 
-                            result, reset_requested = self._execute_tool_call(name, args, silent_tools, is_background)
+                            result, reset_requested = self._execute_tool_call(name, args, silent_tools, is_background, progress)
                             results.append(result)
                             if self.debug:
                                 print(f"\n    [Tool Output: {name}]\n    {result}\n")
@@ -652,7 +801,8 @@ class MMClaw(object):
                         if session_reset:
                             break
 
-                        result_messages = self.engine.tool_result_messages(tool_calls, results)
+                        result_messages = engine.tool_result_messages(tool_calls, results)
+                        result_messages += self._full_image_messages(tool_calls)
                         self._append_tool_result_messages(result_messages, history, use_local_history)
                         continue
 
@@ -672,10 +822,14 @@ class MMClaw(object):
                             else:
                                 self.memory.add("user", correction)
                             continue
+                        progress.finish()
                         if not silent_content:
                             self.connector.send(raw_text)
                         break
 
+                    tools = data.get("tools", [])
+                    if not tools:
+                        progress.finish()
                     if data.get("content"):
                         content = data["content"]
                         if not isinstance(content, str):
@@ -686,7 +840,6 @@ class MMClaw(object):
                         if not silent_content:
                             self.connector.send(content)
 
-                    tools = data.get("tools", [])
                     if not tools:
                         break
 
@@ -704,41 +857,41 @@ class MMClaw(object):
 
                         result = ""
                         if name == "shell_execute":
-                            if not silent_tools:self.connector.send(f"🐚 Shell: `{args.get('command')}`")
+                            if not silent_tools:progress.step(f"🐚 Shell: `{args.get('command')}`")
                             if is_background:
                                 result = ShellTool.execute(args.get("command"))
                             else:
                                 result = self._shell_execute_with_stop(args.get("command"))
                         elif name == "shell_async":
-                            if not silent_tools:self.connector.send(f"🚀 Async Shell: `{args.get('command')}`")
+                            if not silent_tools:progress.step(f"🚀 Async Shell: `{args.get('command')}`")
                             result = AsyncShellTool.execute(args.get("command"))
                         elif name == "file_read":
-                            if not silent_tools:self.connector.send(f"📖 Read: `{args.get('path')}`")
+                            if not silent_tools:progress.step(f"📖 Read: `{args.get('path')}`")
                             result = FileTool.read(args.get("path"))
                         elif name == "file_write":
-                            if not silent_tools:self.connector.send(f"💾 Write: `{args.get('path')}`")
+                            if not silent_tools:progress.step(f"💾 Write: `{args.get('path')}`")
                             result = FileTool.write(args.get("path"), args.get("content"))
                         elif name == "file_upload":
-                            if not silent_tools:self.connector.send(f"📤 Upload: `{args.get('path')}`")
+                            if not silent_tools:progress.step(f"📤 Upload: `{args.get('path')}`")
                             self.connector.send_file(args.get("path"))
                             result = f"File {args.get('path')} sent."
                         elif name == "wait":
-                            if not silent_tools:self.connector.send(f"⏳ Waiting {args.get('seconds')}s...")
+                            if not silent_tools:progress.step(f"⏳ Waiting {args.get('seconds')}s...")
                             if is_background:
                                 result = TimerTool.wait(args.get("seconds"))
                             else:
                                 result = self._wait_with_stop(args.get("seconds"))
                         elif name == "reset_session":
                             self.memory.reset()
-                            if not silent_tools:self.connector.send("✨ Session reset! Starting fresh.")
+                            if not silent_tools:progress.step("✨ Session reset! Starting fresh.")
                             result = "Success: Session history cleared."
                             session_reset = True
                             break
                         elif name == "memory_add":
-                            if not silent_tools:self.connector.send(f"🧠 Memorize: `{args.get('memory', '')}`")
+                            if not silent_tools:progress.step(f"🧠 Memorize: `{args.get('memory', '')}`")
                             result = self.memory.global_memory_add(args.get("memory", ""))
                         elif name == "memory_list":
-                            if not silent_tools:self.connector.send("🧠 Listing global memories...")
+                            if not silent_tools:progress.step("🧠 Listing global memories...")
                             result = self.memory.global_memory_list()
                         elif name == "memory_delete":
                             indices = args.get("indices", args.get("index", -1))
@@ -746,34 +899,34 @@ class MMClaw(object):
                                 indices = [int(i) for i in indices]
                             else:
                                 indices = int(indices)
-                            if not silent_tools:self.connector.send(f"🧠 Delete memory {indices}")
+                            if not silent_tools:progress.step(f"🧠 Delete memory {indices}")
                             result = self.memory.global_memory_delete(indices)
                         elif name == "browser_start":
-                            if not silent_tools:self.connector.send("🌐 Starting browser...")
+                            if not silent_tools:progress.step("🌐 Starting browser...")
                             user_data_dir = self.config.get("browser", {}).get("data_dir")
                             result = BrowserTool.start(user_data_dir=user_data_dir)
                         elif name == "browser_stop":
-                            if not silent_tools:self.connector.send("🌐 Stopping browser...")
+                            if not silent_tools:progress.step("🌐 Stopping browser...")
                             result = BrowserTool.stop()
                         elif name == "browser_navigate":
-                            if not silent_tools:self.connector.send(f"🌐 Navigate: `{args.get('url')}`")
+                            if not silent_tools:progress.step(f"🌐 Navigate: `{args.get('url')}`")
                             result = BrowserTool.navigate(args.get("url"))
                         elif name == "browser_click":
-                            if not silent_tools:self.connector.send(f"🌐 Click: `{args.get('selector')}`")
+                            if not silent_tools:progress.step(f"🌐 Click: `{args.get('selector')}`")
                             result = BrowserTool.click(args.get("selector"))
                         elif name == "browser_fill":
-                            if not silent_tools:self.connector.send(f"🌐 Fill: `{args.get('selector')}`")
+                            if not silent_tools:progress.step(f"🌐 Fill: `{args.get('selector')}`")
                             result = BrowserTool.fill(args.get("selector"), args.get("text", ""))
                         elif name == "browser_get_text":
-                            if not silent_tools:self.connector.send(f"🌐 Get text: `{args.get('selector', 'body')}`")
+                            if not silent_tools:progress.step(f"🌐 Get text: `{args.get('selector', 'body')}`")
                             result = BrowserTool.get_text(args.get("selector"))
                         elif name == "browser_screenshot":
-                            if not silent_tools:self.connector.send("🌐 Screenshot...")
+                            if not silent_tools:progress.step("🌐 Screenshot...")
                             result = BrowserTool.screenshot(args.get("path"))
                             if result.startswith("OK:"):
                                 if not silent_tools:self.connector.send_file(result[4:].strip())
                         elif name == "cron_create":
-                            if not silent_tools:self.connector.send(f"⏰ Cron create: `{args.get('name')}`")
+                            if not silent_tools:progress.step(f"⏰ Cron create: `{args.get('name')}`")
                             result = self.cron.create(args.get("name"), args.get("cron"), args.get("prompt"))
                         elif name == "cron_delete":
                             indices = args.get("indices", args.get("index", -1))
@@ -781,10 +934,10 @@ class MMClaw(object):
                                 indices = [int(i) for i in indices]
                             else:
                                 indices = int(indices)
-                            if not silent_tools:self.connector.send(f"⏰ Cron delete: {indices}")
+                            if not silent_tools:progress.step(f"⏰ Cron delete: {indices}")
                             result = self.cron.delete(indices)
                         elif name == "cron_list":
-                            if not silent_tools:self.connector.send("⏰ Listing cron jobs...")
+                            if not silent_tools:progress.step("⏰ Listing cron jobs...")
                             result = self.cron.list_jobs()
                         elif name == "upgrade":
                             if not silent_tools:self.connector.send("⬆️ Upgrading MMClaw... (this is tricky — there's no notification when it's done. Please wait a moment, then ask me for my version number to confirm the upgrade succeeded.)")
@@ -803,16 +956,21 @@ class MMClaw(object):
                         break
 
             except StopRequested:
-                pass  # Job was cancelled cleanly; no further action needed
+                outcome = "cancelled"  # Job was cancelled cleanly; no further action needed
             except Exception as e:
+                outcome = "failed"
                 print(f"[!] Worker error: {e}")
                 traceback.print_exc()
+                progress.finish(outcome)
                 self.connector.send(f"⚠️ Error: {e}")
             finally:
+                # Cancellation and session resets end here; finish() is a no-op after the answer
+                progress.finish(outcome)
                 self.connector.stop_typing()
                 q.task_done()
 
-    def handle(self, text):
+    def handle(self, text, conversation_id=None):
+        # One chat queue: messages from other chats (conversation_id) share the primary session
         if isinstance(text, list):
             self.chat_queue.put(text)
             return
@@ -832,3 +990,240 @@ class MMClaw(object):
             self.connector.listen(self.handle, stop_on_auth=stop_on_auth)
         except TypeError:
             self.connector.listen(self.handle)
+
+
+class _LoopQueue(object):
+    """queue.Queue look-alike whose put() hands items to the async runtime's loop."""
+
+    def __init__(self, runtime, conversation_id, mode):
+        self._runtime = runtime
+        self._conversation_id = conversation_id
+        self._mode = mode
+
+    def put(self, item):
+        self._runtime._loop.call_soon_threadsafe(self._runtime._enqueue, self._conversation_id, item, self._mode)
+
+
+class _Conversation(object):
+    def __init__(self, conversation_id, memory, mode):
+        self.id = conversation_id
+        self.memory = memory
+        self.mode = mode
+        self.queue = asyncio.Queue()
+        self.job = None
+
+
+class AsyncMMClaw(MMClaw):
+    """Asyncio runtime: every conversation is a task on one event loop.
+
+    Enabled with ``"runtime": "async"``. Conversation ``None`` is the connector's
+    primary chat and keeps the file-backed session; other conversation ids (chats
+    a connector routes separately, e.g. Telegram groups) get an in-memory session,
+    run concurrently, and have their replies and typing sent back to that chat.
+    Heartbeat and cron jobs report to the primary chat. Requires native tool
+    calling; otherwise the threaded workers are used.
+    """
+    MAX_CONCURRENCY = 64
+
+    def _start_workers(self):
+        self._async = self.config.get("tool_calling_mode") == "native"
+        if not self._async:
+            print("[!] Async runtime requires native tool calling; using threaded workers.")
+            return super()._start_workers()
+
+        self._loop = asyncio.new_event_loop()
+        self._conversations = {}
+        self._connector_aio = AsyncConnectorAdapter(self.connector)
+        ready = threading.Event()
+
+        def _run_loop():
+            asyncio.set_event_loop(self._loop)
+            self._slots = asyncio.Semaphore(int(self.config.get("async_max_concurrency", self.MAX_CONCURRENCY)))
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=_run_loop, daemon=True, name="mmclaw-loop").start()
+        ready.wait()
+        self.chat_queue = _LoopQueue(self, None, "chat")
+        self.heartbeat_queue = _LoopQueue(self, "__heartbeat__", "heartbeat")
+        self.cron_queue = _LoopQueue(self, "__cron__", "cron")
+        print("[*] Runtime: asyncio")
+
+    # ------------------------------------------------------------------
+    # Conversations (event loop thread only)
+    # ------------------------------------------------------------------
+
+    def _conversation(self, conversation_id, mode):
+        conv = self._conversations.get(conversation_id)
+        if conv is None:
+            if conversation_id is None or mode != "chat":
+                memory = self.memory
+            else:
+                memory = StatelessMemory(self.memory.system_prompt, use_global_memory=True)
+            conv = _Conversation(conversation_id, memory, mode)
+            self._conversations[conversation_id] = conv
+            self._loop.create_task(self._consume(conv))
+        return conv
+
+    def _enqueue(self, conversation_id, item, mode):
+        self._conversation(conversation_id, mode).queue.put_nowait(item)
+
+    def _cancel(self, conversation_id):
+        conv = self._conversations.get(conversation_id)
+        if conv is not None and conv.job is not None and not conv.job.done():
+            conv.job.cancel()
+
+    async def _consume(self, conv):
+        while True:
+            user_text = await conv.queue.get()
+            async with self._slots:
+                conv.job = self._loop.create_task(self._run_job(conv, user_text))
+                await asyncio.wait({conv.job})
+                conv.job = None
+
+    @staticmethod
+    def _chat_id(conv):
+        """The chat a conversation reports to (background jobs use the primary chat)."""
+        return conv.id if conv.mode == "chat" else None
+
+    async def _send(self, conv, message):
+        await self._connector_aio.send(message, conversation_id=self._chat_id(conv))
+
+    async def _execute_tool_call_async(self, conv, name, args, silent_tools, is_background, progress):
+        if name == "shell_execute":
+            if not silent_tools: progress.step(f"🐚 Shell: `{args.get('command')}`")
+            return await aio.shell_execute(args.get("command"), ShellTool.TIMEOUT), False
+        if name == "wait":
+            if not silent_tools: progress.step(f"⏳ Waiting {args.get('seconds')}s...")
+            try:
+                secs = float(args.get("seconds"))
+            except Exception as e:
+                return f"Timer error: {str(e)}", False
+            await asyncio.sleep(secs)
+            return f"Waited for {secs} seconds.", False
+        if name == "reset_session":
+            conv.memory.reset()
+            if not silent_tools: progress.step("✨ Session reset! Starting fresh.")
+            return "Success: Session history cleared.", True
+        # Remaining tools are quick or inherently blocking (browser, cron, memory files)
+        return await aio.run_blocking(self._execute_tool_call, name, args, silent_tools, True, progress,
+                                      self._chat_id(conv))
+
+    async def _run_job(self, conv, user_text):
+        from .config import ConfigManager
+        mode = conv.mode
+        memory = conv.memory
+        is_background = mode != "chat"
+        history = []
+
+        if mode == "heartbeat":
+            silent_tools   = True
+            silent_content = user_text.startswith("[HEARTBEAT_DISCOVER:")
+            history = [{"role": "user", "content": user_text}]
+        elif mode == "cron":
+            silent_tools   = True
+            silent_content = False
+            history = [{"role": "user", "content": user_text}]
+        else:  # chat
+            silent_tools   = isinstance(user_text, str) and user_text.startswith("[WATCHER:")
+            silent_content = False
+            if self.use_stateless_arg_connector:
+                history = [{"role": "user", "content": user_text}]
+            else:
+                memory.add("user", user_text)
+        use_local_history = is_background or self.use_stateless_arg_connector
+        job_class = self._job_class(mode, user_text)
+        cascade = self._cascade_for(job_class)
+        progress = ProgressReporter(self.connector, self.config, self._chat_id(conv))
+        outcome = "done"
+
+        await self._connector_aio.start_typing(conversation_id=self._chat_id(conv))
+        try:
+            while True:
+                memory.update_system_prompt(ConfigManager.get_full_prompt(self.config))
+                ask_messages = [memory.get_all()[0]] + history if use_local_history else memory.get_all()
+                ask_messages = cascade.prepare(ask_messages)
+                engine = cascade.engine
+                native_tools = get_native_tool_schemas(self.config)
+
+                response_msg = await engine.ask_async(ask_messages, tools=native_tools)
+                self._record_usage(response_msg, job_class, user_text, engine, memory)
+                if cascade.should_retry(response_msg):
+                    continue
+                raw_text = response_msg.get("content", "")
+                tool_calls = response_msg.get("tool_calls") or []
+                if use_local_history:
+                    history.append(response_msg)
+                else:
+                    memory.add_message(response_msg)
+
+                if not tool_calls:
+                    await aio.run_blocking(progress.finish)
+                    if raw_text and not silent_content:
+                        await self._send(conv, raw_text)
+                    break
+
+                results = []
+                session_reset = False
+                for tool_call in tool_calls:
+                    name = tool_call.get("name")
+                    args = tool_call.get("args", {}) or {}
+                    print(f"    [Native Tool Call: {name}]")
+                    if self.debug:
+                        print(f"    Args: {json.dumps(args)}")
+                    result, reset_requested = await self._execute_tool_call_async(conv, name, args, silent_tools, is_background, progress)
+                    results.append(result)
+                    if self.debug:
+                        print(f"\n    [Tool Output: {name}]\n    {result}\n")
+                    if reset_requested:
+                        session_reset = True
+                        break
+                if session_reset:
+                    break
+
+                for message in engine.tool_result_messages(tool_calls, results) + self._full_image_messages(tool_calls):
+                    if use_local_history:
+                        history.append(message)
+                    else:
+                        memory.add_message(message)
+        except asyncio.CancelledError:
+            outcome = "cancelled"  # /stop: the job task was cancelled and its subprocess killed
+        except Exception as e:
+            outcome = "failed"
+            print(f"[!] Worker error: {e}")
+            traceback.print_exc()
+            await aio.run_blocking(progress.finish, outcome)
+            await self._send(conv, f"⚠️ Error: {e}")
+        finally:
+            # Cancellation and session resets end here; finish() is a no-op after the answer
+            await aio.run_blocking(progress.finish, outcome)
+            await self._connector_aio.stop_typing(conversation_id=self._chat_id(conv))
+
+    # ------------------------------------------------------------------
+    # Connector-facing entry points (any thread)
+    # ------------------------------------------------------------------
+
+    def stop(self, conversation_id=None):
+        if not self._async:
+            return super().stop()
+        self._loop.call_soon_threadsafe(self._cancel, conversation_id)
+        self.connector.send("✋ Job cancelled.", **target_kwargs(conversation_id))
+
+    def handle(self, text, conversation_id=None):
+        if not self._async:
+            return super().handle(text, conversation_id)
+        if isinstance(text, str):
+            if text.strip() == "/stop":
+                self.stop(conversation_id)
+                return
+            if text.strip() == "/new":
+                self._loop.call_soon_threadsafe(self._reset, conversation_id)
+                self.connector.send("✨ Session reset! Starting fresh.", **target_kwargs(conversation_id))
+                return
+            if not self.use_stateless_arg_connector and random.random() < 0.15:
+                self.connector.send("💡 Tip: type /stop at any time to cancel the current job.",
+                                    **target_kwargs(conversation_id))
+        self._loop.call_soon_threadsafe(self._enqueue, conversation_id, text, "chat")
+
+    def _reset(self, conversation_id):
+        self._conversation(conversation_id, "chat").memory.reset()
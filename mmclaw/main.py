@@ -7,7 +7,7 @@ import json
 import base64
 import time
 from .config import ConfigManager
-from .kernel import MMClaw
+from .kernel import MMClaw, AsyncMMClaw
 from .connectors import TelegramConnector, TerminalConnector, WhatsAppConnector, FeishuConnector, QQBotConnector, WeChatConnector, StatelessArgConnector
 
 def _feishu_qr_setup():
@@ -719,8 +719,14 @@ def main():
         sys.stdout.reconfigure(line_buffering=True)
         sys.stderr.reconfigure(line_buffering=True)
 
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # Own argument set; runs in temporary workspaces against the local mock server
+        from .bench import main as bench_main
+        bench_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="MMClaw: Your autonomous multimodal AI agent.")
-    parser.add_argument("command", nargs="?", help="Command to run (run, config, skill)")
+    parser.add_argument("command", nargs="?", help="Command to run (run, config, skill, usage, bench)")
     parser.add_argument("subcommand", nargs="?", help="Subcommand (e.g. install)")
     parser.add_argument("skill_path", nargs="?", help="Path to skill directory")
     parser.add_argument("-w", "--workspace", help="Workspace directory (default: ~/.mmclaw)")
@@ -728,6 +734,7 @@ def main():
     parser.add_argument("--global-memory", action="store_true", help="Enable global memory in stateless (-p) mode")
     parser.add_argument("--debug", action="store_true", help="Enable debug output")
     parser.add_argument("--force", action="store_true", help="Force install, skip confirmation prompts")
+    parser.add_argument("--days", type=float, help="Only count usage from the last N days (mmclaw usage)")
     args = parser.parse_args()
 
     from .config import set_workspace
@@ -826,6 +833,15 @@ def main():
             print("            mmclaw skill install <path-to-skill-dir-or-url>")
             print("            mmclaw skill uninstall <skill-name>")
         return
+    elif args.command == "usage":
+        from .usage import UsageLedger, GROUP_KEYS
+        group_by = args.subcommand or "model"
+        if group_by not in GROUP_KEYS:
+            print(f"[❌] Unknown grouping: {group_by!r}")
+            print(f"     Usage: mmclaw usage [{'|'.join(GROUP_KEYS)}] [--days N]")
+            return
+        print(UsageLedger.report(group_by, days=args.days, pricing=(config or {}).get("usage_pricing")))
+        return
     elif args.command not in [None, "run"]:
         parser.print_help()
         return
@@ -847,7 +863,7 @@ def main():
         connectors_config = config.get("connectors", {})
         if mode == "telegram":
             tg = connectors_config.get("telegram", {})
-            connector = TelegramConnector(tg.get("token"), tg.get("authorized_user_id", 0))
+            connector = TelegramConnector(tg.get("token"), tg.get("authorized_user_id", 0), webhook=tg.get("webhook"))
         elif mode == "whatsapp": connector = WhatsAppConnector(config=config)
         elif mode == "feishu":
             fs = connectors_config.get("feishu", {})
@@ -867,7 +883,8 @@ def main():
 
     ConfigManager.mode = mode
     ConfigManager.stateless_use_global_memory = use_stateless and args.global_memory
-    app = MMClaw(config, connector, system_prompt=ConfigManager.get_full_prompt(config=config), use_stateless_arg_connector=use_stateless, stateless_use_global_memory=use_stateless and args.global_memory)
+    runtime_cls = AsyncMMClaw if config.get("runtime") == "async" else MMClaw
+    app = runtime_cls(config, connector, system_prompt=ConfigManager.get_full_prompt(config=config), use_stateless_arg_connector=use_stateless, stateless_use_global_memory=use_stateless and args.global_memory)
     app.run(stop_on_auth=(args.command == "config"))
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import os
 import json
 import glob
+import shutil
 from datetime import datetime
 
 TOTAL_HISTORY_TOKENS = 45_000
@@ -19,11 +20,22 @@ def _estimate_tokens(text):
     return chinese + (len(text) - chinese) // 4
 
 
+def _store_file(path, data):
+    """Write ``data`` (bytes, or the path of a downloaded temp file, which is moved) to ``path``."""
+    if isinstance(data, (bytes, bytearray)):
+        with open(path, "wb") as f:
+            f.write(data)
+    else:
+        shutil.move(os.fspath(data), path)
+
+
 class BaseMemory:
     """Kernel-level abstract base. Defines the session memory interface."""
     def __init__(self, system_prompt):
         self.system_prompt = system_prompt
         self.history = [{"role": "system", "content": system_prompt}]
+        self._views = {}
+        self._system_view = None
 
     def add(self, role, content):
         pass
@@ -105,6 +117,23 @@ class GlobalFileMemory(BaseMemory):
     def _get_history_note(self, dropped):
         return ""
 
+    def _view(self, msg):
+        """Return (message as sent, estimated tokens).
+
+        Unchanged messages are returned as the same dict on every call, which
+        lets providers reuse their encoded form of it (see providers.encoding).
+        """
+        content = msg.get("content", "")
+        entry = self._views.get(id(msg))
+        if entry is not None and entry[0] is msg and entry[1] is content:
+            return entry[2], entry[3]
+        view = msg
+        if isinstance(content, str) and _estimate_tokens(content) > MAX_MSG_TOKENS:
+            view = {**msg, "content": content[:MAX_MSG_TOKENS * 3] + self._get_truncation_note()}
+        tokens = _estimate_tokens(view.get("content", ""))
+        self._views[id(msg)] = (msg, content, view, tokens)
+        return view, tokens
+
     def get_all(self):
         messages = self.history[1:]
 
@@ -120,20 +149,23 @@ class GlobalFileMemory(BaseMemory):
         selected = []
         used = 0
         for msg in reversed(messages):
-            content = msg.get("content", "")
-            if isinstance(content, str) and _estimate_tokens(content) > MAX_MSG_TOKENS:
-                content = content[:MAX_MSG_TOKENS * 3] + self._get_truncation_note()
-            tokens = _estimate_tokens(content)
+            view, tokens = self._view(msg)
             if used + tokens > available:
                 break
-            selected.append({**msg, "content": content})
+            selected.append(view)
             used += tokens
         selected.reverse()
+        if len(self._views) > 2 * len(self.history):
+            live = {id(msg) for msg in messages}
+            self._views = {key: entry for key, entry in self._views.items() if key in live}
 
         dropped = len(messages) - len(selected)
         history_note = self._get_history_note(dropped)
-        system = {"role": "system", "content": self.history[0]["content"] + global_note + history_note}
-        return [system] + selected
+        content = self.history[0]["content"] + global_note + history_note
+        # Same dict while the text is unchanged, so encoder caches keep hitting
+        if self._system_view is None or self._system_view["content"] != content:
+            self._system_view = {"role": "system", "content": content}
+        return [self._system_view] + selected
 
 
 class StatelessMemory(GlobalFileMemory):
@@ -176,11 +208,10 @@ class StatelessMemory(GlobalFileMemory):
     def add_message(self, message):
         self.history.append(message)
 
-    def save_file(self, filename: str, data: bytes) -> str:
+    def save_file(self, filename: str, data) -> str:
         import tempfile
         path = os.path.join(tempfile.gettempdir(), filename)
-        with open(path, "wb") as f:
-            f.write(data)
+        _store_file(path, data)
         return path
 
     def reset(self):
@@ -229,6 +260,8 @@ class FileMemory(GlobalFileMemory):
         self.session_file = os.path.join(session_dir, "messages.jsonl")
         self.system_prompt = system_prompt
         self.history = []
+        self._views = {}
+        self._system_view = None
         with open(self.session_file, encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
@@ -272,11 +305,10 @@ class FileMemory(GlobalFileMemory):
             f"Uploaded files are in {self.files_dir}."
         )
 
-    def save_file(self, filename: str, data: bytes) -> str:
+    def save_file(self, filename: str, data) -> str:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         path = os.path.join(self.files_dir, f"{ts}_{filename}")
-        with open(path, "wb") as f:
-            f.write(data)
+        _store_file(path, data)
         return path
 
     def reset(self):
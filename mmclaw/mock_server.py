@@ -0,0 +1,330 @@
+"""Local fake LLM server for benchmarks and offline testing.
+
+Speaks three wire formats on one port:
+
+* OpenAI chat completions: ``POST .../chat/completions`` (SSE or JSON)
+* Responses API (Codex):   ``POST .../responses`` (SSE, honours ``previous_response_id``)
+* Gemini:                  ``POST .../models/<m>:streamGenerateContent`` / ``:generateContent``
+
+Replies follow a script, a list of steps applied per job: step *n* answers
+the request that already contains *n* model turns after the last user
+message, so concurrent jobs each walk the script independently. A step is
+``{"text": "..."}`` or ``{"tool_calls": [{"name": ..., "args": {...}}]}``;
+past the end of the script the server answers ``"done"``.
+
+    python -m mmclaw.mock_server --port 8765 --ttft 0.3 --tps 60 --script script.json
+
+``GET /_stats`` returns request counters.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_SCRIPT = [{"text": "ok"}]
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-stream (timeouts, hedged calls) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _tokens(text):
+    """Split text into word-sized stream chunks (whitespace kept with the word)."""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class MockLLMServer(object):
+    def __init__(self, script=None, ttft=0.0, tokens_per_sec=0.0, error_rate=0.0,
+                 error_status=503, seed=0, host="127.0.0.1", port=0):
+        self.script = script or DEFAULT_SCRIPT
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._responses = {}     # response id -> step reached (Responses API chaining)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "request_bytes": 0, "by_format": {}}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith("/_stats"):
+                    with server._lock:
+                        return self._json(200, server.stats)
+                self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    body = json.loads(raw.decode("utf-8"))
+                except ValueError:
+                    return self._json(400, {"error": "invalid JSON"})
+                server._handle(self, self.path.split("?", 1)[0], body, len(raw))
+
+            def _json(self, code, obj, headers=None):
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = _HTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name="mmclaw-mock-llm")
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ------------------------------------------------------------------
+    # Scripting
+    # ------------------------------------------------------------------
+
+    def _step_reply(self, step):
+        return self.script[step] if step < len(self.script) else {"text": "done"}
+
+    @staticmethod
+    def _chat_step(messages):
+        step = 0
+        for msg in reversed(messages):
+            role = msg.get("role")
+            if role == "assistant":
+                step += 1
+            elif role == "user" and not str(msg.get("content", "")).startswith("Tool Output ("):
+                break
+        return step
+
+    @staticmethod
+    def _responses_step(items):
+        # One model turn is a run of assistant text / function_call items
+        step = 0
+        in_turn = False
+        for item in reversed(items):
+            if item.get("type") == "function_call" or item.get("role") == "assistant":
+                if not in_turn:
+                    step += 1
+                in_turn = True
+            elif item.get("role") == "user":
+                break
+            else:
+                in_turn = False
+        return step
+
+    @staticmethod
+    def _gemini_step(contents):
+        step = 0
+        for content in reversed(contents):
+            if content.get("role") == "model":
+                step += 1
+            elif not any("functionResponse" in part for part in content.get("parts") or []):
+                break
+        return step
+
+    def _count(self, fmt, size, error=False):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["request_bytes"] += size
+            self.stats["by_format"][fmt] = self.stats["by_format"].get(fmt, 0) + 1
+            if error:
+                self.stats["errors"] += 1
+
+    def _pace(self, first):
+        if first and self.ttft:
+            time.sleep(self.ttft)
+        elif not first and self.tokens_per_sec:
+            time.sleep(1.0 / self.tokens_per_sec)
+
+    # ------------------------------------------------------------------
+    # Wire formats
+    # ------------------------------------------------------------------
+
+    def _handle(self, handler, path, body, size):
+        if path.endswith("/chat/completions"):
+            fmt = "openai"
+        elif path.endswith("/responses"):
+            fmt = "responses"
+        elif ":streamGenerateContent" in path or ":generateContent" in path:
+            fmt = "gemini"
+        else:
+            self._count("unknown", size, error=True)
+            return handler._json(404, {"error": f"unknown endpoint {path}"})
+
+        with self._lock:
+            inject = self.error_rate and self._random.random() < self.error_rate
+        if inject:
+            self._count(fmt, size, error=True)
+            return handler._json(self.error_status, {"error": {"message": "injected error"}}, {"Retry-After": "0"})
+
+        if fmt == "openai":
+            step = self._chat_step(body.get("messages") or [])
+        elif fmt == "responses":
+            items = body.get("input") or []
+            previous = body.get("previous_response_id")
+            with self._lock:
+                base = self._responses.get(previous) if previous else 0
+            if base is None:
+                self._count(fmt, size, error=True)
+                return handler._json(400, {"error": {"message": "previous_response_not_found"}})
+            step = self._responses_step(items)
+            if previous and not any(item.get("role") == "user" for item in items):
+                step += base  # the delta continues the stored job
+        else:
+            step = self._gemini_step(body.get("contents") or [])
+        self._count(fmt, size)
+
+        reply = self._step_reply(step)
+        input_tokens = size // 4
+        if fmt == "openai":
+            self._send_openai(handler, reply, body, input_tokens)
+        elif fmt == "responses":
+            response_id = f"resp_{next(self._ids)}"
+            if body.get("store"):
+                with self._lock:
+                    self._responses[response_id] = step + 1
+            self._send_responses(handler, reply, response_id, input_tokens)
+        else:
+            self._send_gemini(handler, reply, ":streamGenerateContent" in path, input_tokens)
+
+    def _open_sse(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+
+    def _event(self, handler, payload, first=False, event=None):
+        self._pace(first)
+        prefix = f"event: {event}\n" if event else ""
+        handler.wfile.write(f"{prefix}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        handler.wfile.flush()
+
+    def _chunks(self, text):
+        return _tokens(text) if self.tokens_per_sec else [text]
+
+    def _send_openai(self, handler, reply, body, input_tokens):
+        text = reply.get("text", "")
+        calls = reply.get("tool_calls") or []
+        output_tokens = len(_tokens(text)) + len(calls)
+        usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+        tool_calls = [{
+            "index": i,
+            "id": f"call_{next(self._ids)}",
+            "type": "function",
+            "function": {"name": call["name"], "arguments": json.dumps(call.get("args") or {})},
+        } for i, call in enumerate(calls)]
+        if not body.get("stream"):
+            if self.ttft:
+                time.sleep(self.ttft)
+            message = {"role": "assistant", "content": text}
+            if tool_calls:
+                message["tool_calls"] = [{k: v for k, v in c.items() if k != "index"} for c in tool_calls]
+            return handler._json(200, {"choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                                       "usage": usage})
+        self._open_sse(handler)
+        first = True
+        for chunk in self._chunks(text) if text else []:
+            self._event(handler, {"choices": [{"index": 0, "delta": {"content": chunk}}]}, first)
+            first = False
+        for call in tool_calls:
+            self._event(handler, {"choices": [{"index": 0, "delta": {"tool_calls": [call]}}]}, first)
+            first = False
+        self._event(handler, {"choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls" if calls else "stop"}]}, first)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._event(handler, {"choices": [], "usage": usage})
+        handler.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_responses(self, handler, reply, response_id, input_tokens):
+        text = reply.get("text", "")
+        calls = reply.get("tool_calls") or []
+        self._open_sse(handler)
+        self._event(handler, {"type": "response.created", "response": {"id": response_id}}, True,
+                    event="response.created")
+        for chunk in self._chunks(text) if text else []:
+            self._event(handler, {"type": "response.output_text.delta", "delta": chunk},
+                        event="response.output_text.delta")
+        for i, call in enumerate(calls):
+            item = {"type": "function_call", "id": f"fc_{next(self._ids)}", "call_id": f"call_{next(self._ids)}",
+                    "name": call["name"], "arguments": json.dumps(call.get("args") or {})}
+            self._event(handler, {"type": "response.output_item.done", "output_index": i, "item": item},
+                        event="response.output_item.done")
+        usage = {"input_tokens": input_tokens, "output_tokens": len(_tokens(text)) + len(calls)}
+        self._event(handler, {"type": "response.completed", "response": {"id": response_id, "usage": usage}},
+                    event="response.completed")
+
+    def _send_gemini(self, handler, reply, stream, input_tokens):
+        text = reply.get("text", "")
+        calls = reply.get("tool_calls") or []
+        usage = {"promptTokenCount": input_tokens, "candidatesTokenCount": len(_tokens(text)) + len(calls)}
+        call_parts = [{"functionCall": {"name": c["name"], "args": c.get("args") or {}}} for c in calls]
+        if not stream:
+            if self.ttft:
+                time.sleep(self.ttft)
+            parts = ([{"text": text}] if text else []) + call_parts
+            return handler._json(200, {"candidates": [{"content": {"role": "model", "parts": parts}}],
+                                       "usageMetadata": usage})
+        self._open_sse(handler)
+        first = True
+        for chunk in self._chunks(text) if text else []:
+            self._event(handler, {"candidates": [{"content": {"role": "model", "parts": [{"text": chunk}]}}]}, first)
+            first = False
+        last = {"candidates": [{"content": {"role": "model", "parts": call_parts}, "finishReason": "STOP"}],
+                "usageMetadata": usage}
+        self._event(handler, last, first)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local fake LLM server (OpenAI, Responses and Gemini wire formats).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--script", help="JSON file with the reply script")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Seconds before the first streamed byte")
+    parser.add_argument("--tps", type=float, default=0.0, help="Streamed tokens per second (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    script = None
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+    server = MockLLMServer(script, ttft=args.ttft, tokens_per_sec=args.tps, error_rate=args.error_rate,
+                           error_status=args.error_status, seed=args.seed, host=args.host, port=args.port)
+    # The first line is read by ``mmclaw bench`` to find the port
+    print(f"listening on {server.url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
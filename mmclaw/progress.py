@@ -0,0 +1,173 @@
+"""Per-job progress reporting.
+
+Every tool call used to post its own chat message ("📖 Read: ...", "🐚 Shell:
+..."), so a 20-step job meant 20 messages and 20 API calls. A job now owns a
+``ProgressReporter``; ``step(text)`` records a step and returns at once, and
+the reporter publishes steps in the background:
+
+* Connectors that can edit a message they sent (``send_status`` /
+  ``edit_status``: Telegram, Feishu cards, the terminal) get one status
+  message per job, edited in place at most every ``STATUS_EDIT_INTERVAL``
+  seconds, showing the last few steps under a step count.
+* Other connectors get digests: the first step is sent at once, later steps
+  are batched into one message every ``digest_interval`` seconds.
+
+``finish(outcome)`` publishes the final state ("done", "cancelled" or
+"failed"), including any steps still waiting for a digest. The kernel calls
+it before sending the final answer, so the step log never trails the reply;
+later calls are no-ops. Configured under
+``config["progress"]``::
+
+    "progress": {
+        "enabled": true,
+        "edit_interval": 2.0,     # default: the connector's STATUS_EDIT_INTERVAL
+        "digest_interval": 8.0,
+        "max_lines": 6            # steps shown in the status message
+    }
+
+``"enabled": false`` restores one message per step.
+"""
+import threading
+import time
+
+from .dispatcher import rate_limit_delay, target_kwargs
+
+
+EDIT_INTERVAL = 2.0
+DIGEST_INTERVAL = 8.0
+MAX_LINES = 6
+STEP_CHARS = 200
+
+HEADERS = {
+    "running": "⚙️ Working",
+    "done": "✅ Done",
+    "cancelled": "✋ Cancelled",
+    "failed": "⚠️ Failed",
+}
+
+
+def _plural(n, word):
+    return f"{n} {word}{'' if n == 1 else 's'}"
+
+
+class ProgressReporter(object):
+    def __init__(self, connector, config=None, conversation_id=None):
+        options = (config or {}).get("progress") or {}
+        self.connector = connector
+        self.target = target_kwargs(conversation_id)
+        self.enabled = options.get("enabled", True)
+        self.editable = hasattr(connector, "send_status") and hasattr(connector, "edit_status")
+        if self.editable:
+            interval = options.get("edit_interval")
+            if interval is None:
+                interval = getattr(connector, "STATUS_EDIT_INTERVAL", EDIT_INTERVAL)
+        else:
+            interval = options.get("digest_interval", DIGEST_INTERVAL)
+        self.interval = float(interval)
+        self.max_lines = int(options.get("max_lines", MAX_LINES))
+        self.steps = []
+        self.stats = {"steps": 0, "calls": 0}
+        self._pending = []        # steps not yet in a digest
+        self._opened = False      # status message sent
+        self._handle = None
+        self._rendered = None
+        self._next_flush = 0.0
+        self._timer = None
+        self._closed = False
+        self._finished = False
+        self._lock = threading.Lock()     # state
+        self._io_lock = threading.Lock()  # one platform call at a time
+
+    def step(self, text):
+        if not self.enabled:
+            self.connector.send(text, **self.target)
+            return
+        text = str(text)
+        if len(text) > STEP_CHARS:
+            text = text[:STEP_CHARS - 1] + "…"
+        with self._lock:
+            self.steps.append(text)
+            self._pending.append(text)
+            self.stats["steps"] += 1
+            if not self._closed:
+                self._schedule()
+
+    def finish(self, outcome="done"):
+        """Publish the final state; blocks until it is out. Only the first call counts."""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.steps:
+                return
+        self._flush(final=outcome)
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def _schedule(self):
+        # self._lock is held
+        if self._timer is not None:
+            return
+        delay = max(0.0, self._next_flush - time.monotonic())
+        self._timer = threading.Timer(delay, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush(self, final=None):
+        with self._io_lock:
+            with self._lock:
+                if final is None:
+                    if self._closed:
+                        return  # finish() publishes the rest
+                    self._timer = None
+                pending, self._pending = self._pending, []
+                steps = list(self.steps)
+                self._next_flush = time.monotonic() + self.interval
+            if self.editable:
+                self._publish(self._render(steps, final or "running"), final is not None)
+            elif pending:
+                self._digest(pending)
+
+    def _render(self, steps, state):
+        lines = [f"{HEADERS.get(state, HEADERS['done'])} · {_plural(len(steps), 'step')}"]
+        hidden = len(steps) - self.max_lines
+        if hidden > 0:
+            lines.append(f"… {_plural(hidden, 'earlier step')}")
+            steps = steps[hidden:]
+        return "\n".join(lines + steps)
+
+    def _publish(self, text, final):
+        if text == self._rendered:
+            return
+        try:
+            if not self._opened:
+                self._handle = self.connector.send_status(text, final=final, **self.target)
+                self._opened = True
+            else:
+                self.connector.edit_status(self._handle, text, final=final, **self.target)
+            self._rendered = text
+            self.stats["calls"] += 1
+        except Exception as e:
+            delay = rate_limit_delay(e)
+            if delay is not None and not final:
+                print(f"[!] Progress: rate limited, next update in {delay:.1f}s")
+                with self._lock:
+                    self._next_flush = time.monotonic() + delay
+                    self._schedule()
+                return
+            print(f"[!] Progress update failed: {e}")
+            if not self._opened:
+                # No status message to edit; report the rest of the job as digests
+                self.editable = False
+                self.interval = DIGEST_INTERVAL
+                self._digest(self.steps)
+
+    def _digest(self, lines):
+        self.connector.send("\n".join(lines), **self.target)
+        self.stats["calls"] += 1
@@ -1,7 +1,10 @@
-from .legacy import compress_image, prepare_image_content
+from .legacy import compress_image, prepare_image_content, prepare_images_content
 from .codex import CodexProvider
+from .hedge import Hedger
 from .legacy import Engine as LegacyEngine
 from .openai_compatible import OpenAICompatibleProvider
+from .responses import ResponsesProvider
+from .router import RouterProvider
 from .vertex_ai import VertexAIProvider
 
 
@@ -24,9 +27,21 @@ class LegacyProviderAdapter(object):
     def __init__(self, config):
         self._engine = LegacyEngine(config)
 
-    def ask(self, messages, tools=None, retry=1):
+    @property
+    def config(self):
+        return self._engine.config
+
+    @config.setter
+    def config(self, value):
+        self._engine.config = value
+
+    def ask(self, messages, tools=None, retry=None):
         return self._engine.ask(messages, tools=tools, retry=retry)
 
+    async def ask_async(self, messages, tools=None, retry=None):
+        from ..aio import run_blocking
+        return await run_blocking(self.ask, messages, tools=tools, retry=retry)
+
     def tool_result_messages(self, tool_calls, results):
         messages = []
         for call, result in zip(tool_calls, results):
@@ -37,31 +52,88 @@ class LegacyProviderAdapter(object):
         return messages
 
 
+# Job-profile keys that override the engine's own config entry
+PROFILE_OVERRIDES = ("model", "max_output_tokens", "reasoning_effort", "temperature", "timeouts")
+
+
+def make_provider(config, engine_type=None, overrides=None):
+    """Build the provider for ``engine_type`` (defaults to ``config["engine_type"]``)."""
+    active = config.get("engine_type")
+    engine_type = engine_type or active
+    if engine_type != active or overrides:
+        # Providers read their engine from config["engine_type"]; build on a view,
+        # but keep the real config so token refreshes are saved to the right place.
+        engines = dict(config.get("engines") or {})
+        entry = dict(engines.get(engine_type) or {})
+        for key, value in (overrides or {}).items():
+            # Dict-valued settings (``timeouts``) override key by key
+            entry[key] = dict(entry.get(key) or {}, **value) if isinstance(value, dict) else value
+        engines[engine_type] = entry
+        provider = make_provider(dict(config, engine_type=engine_type, engines=engines))
+        provider.config = config
+        return provider
+    if engine_type == "codex":
+        return CodexProvider(config)
+    if engine_type == "vertex_ai":
+        return VertexAIProvider(config)
+    if engine_type in OPENAI_COMPATIBLE_NATIVE_PROVIDERS or engine_type.startswith("openai_compatible_"):
+        if (config["engines"].get(engine_type) or {}).get("api") == "responses":
+            return ResponsesProvider(config)
+        return OpenAICompatibleProvider(config)
+    return LegacyProviderAdapter(config)
+
+
 class Engine(object):
-    def __init__(self, config):
+    def __init__(self, config, profile=None):
+        """``profile`` optionally selects another engine/model for a job class (see ``job_profiles``)."""
         self.config = config
-        self.engine_type = config["engine_type"]
-        self.provider = self._make_provider(config)
+        profile = profile or {}
+        overrides = {k: profile[k] for k in PROFILE_OVERRIDES if k in profile}
+        self.engine_type = profile.get("engine") or config["engine_type"]
+        if profile.get("engine") or overrides:
+            self.provider = make_provider(config, self.engine_type, overrides)
+        else:
+            self.provider = self._make_provider(config)
+        self.hedger = self._make_hedger(config)
+        # Start background token refresh now rather than on the first request
+        getattr(self.provider, "credentials", None)
 
     def _make_provider(self, config):
-        engine_type = config.get("engine_type")
-        if engine_type == "codex":
-            return CodexProvider(config)
-        if engine_type == "vertex_ai":
-            return VertexAIProvider(config)
-        if engine_type in OPENAI_COMPATIBLE_NATIVE_PROVIDERS or engine_type.startswith("openai_compatible_"):
-            return OpenAICompatibleProvider(config)
-        return LegacyProviderAdapter(config)
+        if (config.get("router") or {}).get("engines"):
+            return RouterProvider(config, make_provider)
+        return make_provider(config)
+
+    def _make_hedger(self, config):
+        options = config.get("hedge") or {}
+        if not options.get("enabled"):
+            return None
+        if not hasattr(self.provider, "ask_with_policy"):
+            print(f"[!] Hedging is not supported for {self.engine_type}; disabled.")
+            return None
+        secondary = None
+        if options.get("engine") and options["engine"] != self.engine_type:
+            secondary = make_provider(config, options["engine"])
+            if not hasattr(secondary, "ask_with_policy"):
+                print(f"[!] Hedge engine {options['engine']} is not supported; hedging to {self.engine_type}.")
+                secondary = None
+        return Hedger(config, self.provider, secondary)
 
     @property
     def supports_native_tools(self):
         return bool(getattr(self.provider, "supports_native_tools", False))
 
-    def ask(self, messages, tools=None, retry=1):
+    def ask(self, messages, tools=None, retry=None):
+        if self.hedger is not None:
+            return self.hedger.ask(messages, tools=tools, retry=retry)
         return self.provider.ask(messages, tools=tools, retry=retry)
 
+    async def ask_async(self, messages, tools=None, retry=None):
+        if self.hedger is not None:
+            return await self.hedger.ask_async(messages, tools=tools, retry=retry)
+        return await self.provider.ask_async(messages, tools=tools, retry=retry)
+
     def tool_result_messages(self, tool_calls, results):
         return self.provider.tool_result_messages(tool_calls, results)
 
 
-__all__ = ["Engine", "compress_image", "prepare_image_content"]
+__all__ = ["Engine", "compress_image", "prepare_image_content", "prepare_images_content"]
@@ -1,5 +1,20 @@
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from . import encoding, hedge, sse
+from .deadlines import TIMEOUTS, Deadlines
+from .retry import RetryPolicy, breaker_for
+
+
 class BaseProvider(object):
     supports_native_tools = False
+    # Providers that implement _build_request/_stream_reader/_parse_response get a
+    # native async path; the rest run their blocking ask() on the aio executor.
+    supports_async = False
+    # Per-phase limits (see deadlines.py); config "timeouts" entries override these
+    default_timeouts = {}
 
     def __init__(self, config):
         self.config = config
@@ -10,10 +25,193 @@ class BaseProvider(object):
         self.model = engine_config["model"]
         self.debug = config.get("debug", False)
         self.stream = config.get("stream", True)
+        # Optional generation controls; job profiles set these per job class
+        self.max_output_tokens = engine_config.get("max_output_tokens")
+        self.reasoning_effort = engine_config.get("reasoning_effort")
+        self.temperature = engine_config.get("temperature")
+        self.deadlines = Deadlines.from_config(config, engine_config, self.default_timeouts)
+        # Per-message JSON fragments, so each call only encodes what is new
+        self.encoder = encoding.MessageEncoder(self._convert_message)
+
+    @property
+    def breaker(self):
+        """Circuit breaker shared by every provider talking to the same endpoint."""
+        host = urllib.parse.urlsplit(self.base_url).netloc
+        return breaker_for(f"{self.engine_type}@{host}", self.config)
+
+    def retry_policy(self, stream, retry=None):
+        return RetryPolicy.from_config(self.config, streaming=stream, retry=retry)
+
+    def _headers(self):
+        return {"Content-Type": "application/json"}
+
+    def _convert_message(self, msg):
+        """Return the provider items (possibly none) one history message becomes."""
+        raise NotImplementedError
 
-    def ask(self, messages, tools=None, retry=1):
+    def _build_request(self, messages, tools=None):
+        """Return (url, payload, stream) for one call; list values may be ``self.encoder.encode(...)``."""
         raise NotImplementedError
 
+    def _stream_reader(self):
+        """An ``sse.StreamReader`` that folds this API's stream events into a message."""
+        raise NotImplementedError
+
+    def _parse_stream(self, response):
+        """Turn an SSE response (or iterable of byte chunks) into a normalized assistant message."""
+        reader = self._stream_reader()
+        for chunk in sse.iter_chunks(response):
+            if reader.feed(chunk):
+                break
+        return reader.finish().message()
+
+    def _parse_response(self, data):
+        """Turn a decoded non-streaming JSON body into a normalized assistant message."""
+        raise NotImplementedError
+
+    def _http_error_message(self, e, error_body):
+        return {"role": "assistant", "content": f"Engine Error: {e}"}
+
+    def _recover(self, e):
+        """Return True if the failed call should be replayed once (e.g. after a token refresh)."""
+        return False
+
+    async def _recover_async(self, e):
+        return False
+
+    def _error_message(self, e):
+        """Report a failed call and turn it into an assistant message for the chat."""
+        print(f"[!] Engine Error: {e}")
+        if isinstance(e, urllib.error.HTTPError):
+            error_body = ""
+            try:
+                error_body = e.read().decode("utf-8")
+            except Exception:
+                pass
+            if error_body:
+                print(f"    Response Body: {error_body}")
+            return self._http_error_message(e, error_body)
+        return {"role": "assistant", "content": f"Engine Error: {e}"}
+
+    def _log_request(self, payload):
+        if self.debug:
+            print(f"\n[LLM Request ({self.engine_type})]\n{json.dumps(encoding.plain(payload), indent=2)}\n")
+
+    def _tag_usage(self, msg):
+        # Record which engine/model produced the counts; routers and hedges hide that from callers
+        usage = msg.get("usage")
+        if usage is not None:
+            usage.setdefault("engine", self.engine_type)
+            usage.setdefault("model", self.model)
+
+    def _log_response(self, msg):
+        if self.debug:
+            print(f"\n[LLM Response ({self.engine_type})]\n{json.dumps(msg, indent=2)}\n")
+
+    # ------------------------------------------------------------------
+    # Blocking path
+    # ------------------------------------------------------------------
+
+    def _post(self, url, payload, stream):
+        req = urllib.request.Request(
+            url,
+            data=encoding.dumps(payload),
+            headers=self._headers(),
+            method="POST",
+        )
+        call = self.deadlines.start()
+        try:
+            with call.urlopen(req) as response:
+                hedge.response_opened(response)
+                body = call.wrap(response)
+                if stream:
+                    return self._parse_stream(body)
+                return self._parse_response(json.loads(body.read().decode("utf-8")))
+        except Exception as e:
+            hedge.raise_if_cancelled(e)
+            if isinstance(e, TIMEOUTS):
+                raise call.expired(e) from e
+            raise
+
+    def _send(self, url, payload, stream):
+        try:
+            return self._post(url, payload, stream)
+        except urllib.error.HTTPError as e:
+            if not self._recover(e):
+                raise
+            return self._post(url, payload, stream)
+
+    def ask_with_policy(self, messages, tools=None, retry=None):
+        """Like ask(), but raises once the retry policy gives up (HTTPError, CircuitOpenError, ...)."""
+        url, payload, stream = self._build_request(messages, tools=tools)
+        self._log_request(payload)
+        msg = self.retry_policy(stream, retry).call(
+            lambda: self._send(url, payload, stream), self.breaker, label=self.engine_type,
+        )
+        self._tag_usage(msg)
+        self._log_response(msg)
+        return msg
+
+    def ask_once(self, messages, tools=None):
+        return self.ask(messages, tools=tools, retry=0)
+
+    def ask(self, messages, tools=None, retry=None):
+        try:
+            return self.ask_with_policy(messages, tools=tools, retry=retry)
+        except Exception as e:
+            return self._error_message(e)
+
+    # ------------------------------------------------------------------
+    # Async path
+    # ------------------------------------------------------------------
+
+    async def _post_async(self, url, payload, stream):
+        call = self.deadlines.start()
+        response = await call.request_async("POST", url, headers=self._headers(), body=encoding.dumps(payload))
+        # Parse stream events as they arrive, like the blocking path, instead of buffering the body
+        reader = self._stream_reader() if stream else None
+        chunks = []
+        try:
+            async for chunk in call.iter_async(response):
+                hedge.first_byte()
+                if reader is None:
+                    chunks.append(chunk)
+                else:
+                    # Past the end event feed() ignores the tail, which is still read so the connection is pooled
+                    reader.feed(chunk)
+        finally:
+            response.close()  # no-op once the body was read to the end and pooled
+        if reader is None:
+            return self._parse_response(json.loads(b"".join(chunks).decode("utf-8")))
+        return reader.finish().message()
+
+    async def _send_async(self, url, payload, stream):
+        try:
+            return await self._post_async(url, payload, stream)
+        except urllib.error.HTTPError as e:
+            if not await self._recover_async(e):
+                raise
+            return await self._post_async(url, payload, stream)
+
+    async def ask_with_policy_async(self, messages, tools=None, retry=None):
+        url, payload, stream = self._build_request(messages, tools=tools)
+        self._log_request(payload)
+        msg = await self.retry_policy(stream, retry).call_async(
+            lambda: self._send_async(url, payload, stream), self.breaker, label=self.engine_type,
+        )
+        self._tag_usage(msg)
+        self._log_response(msg)
+        return msg
+
+    async def ask_async(self, messages, tools=None, retry=None):
+        if not self.supports_async:
+            from ..aio import run_blocking
+            return await run_blocking(self.ask, messages, tools=tools, retry=retry)
+        try:
+            return await self.ask_with_policy_async(messages, tools=tools, retry=retry)
+        except Exception as e:
+            return self._error_message(e)
+
     def tool_result_messages(self, tool_calls, results):
         messages = []
         for call, result in zip(tool_calls, results):
@@ -0,0 +1,174 @@
+"""Gemini explicit context caching for the static prompt prefix.
+
+Enabled per engine::
+
+    "vertex_ai": {
+        ...
+        "context_cache": {
+            "enabled": true,
+            "ttl": 3600,          # seconds; refreshed in the background while in use
+            "min_tokens": 1024,   # smaller prefixes are not worth (or allowed) caching
+            "url": "...",         # optional cachedContents endpoint (project-scoped Vertex)
+            "model": "..."        # optional model resource name to cache for
+        }
+    }
+
+The prefix is everything before the conversation: ``systemInstruction``,
+``tools`` and ``toolConfig``. It is keyed by its hash; a new hash is served
+uncached while its ``cachedContents`` entry is created in the background,
+and the entry for the previous hash is deleted.
+"""
+import hashlib
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+PREFIX_FIELDS = ("systemInstruction", "tools", "toolConfig")
+
+
+class ContextCache(object):
+    CREATE_BACKOFF = 600   # seconds before retrying a prefix whose cache could not be created
+
+    def __init__(self, api_key, base_url, model, options):
+        self.api_key = api_key
+        self.ttl = int(options.get("ttl", 3600))
+        self.min_tokens = int(options.get("min_tokens", 1024))
+        if "/publishers/" in base_url:
+            # Vertex: .../v1/publishers/google -> .../v1/cachedContents
+            root, _, publisher = base_url.partition("/publishers/")
+            default_url = f"{root}/cachedContents"
+            default_model = f"publishers/{publisher}/models/{model}"
+        else:
+            default_url = f"{base_url}/cachedContents"
+            default_model = f"models/{model}"
+        self.url = (options.get("url") or default_url).rstrip("/")
+        self.model = options.get("model") or default_model
+        self.active = None        # (hash, name, prefix)
+        self._prefixes = {}       # name -> prefix, for replaying requests uncached
+        self.used_at = 0.0
+        self._pending = set()
+        self._failed = {}         # hash -> monotonic time of the failure
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _request(self, method, url, body=None, params=None):
+        query = dict(params or {}, key=self.api_key)
+        req = urllib.request.Request(
+            f"{url}?{urllib.parse.urlencode(query)}",
+            data=json.dumps(body).encode("utf-8") if body is not None else None,
+            headers={"Content-Type": "application/json"},
+            method=method,
+        )
+        with urllib.request.urlopen(req, timeout=30) as response:
+            raw = response.read()
+        return json.loads(raw.decode("utf-8")) if raw else {}
+
+    def _resource_url(self, name):
+        return f"{self.url.rsplit('/cachedContents', 1)[0]}/{name}"
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def prefix_hash(prefix):
+        return hashlib.sha256(json.dumps(prefix, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def lookup(self, prefix):
+        """Name of the cache holding ``prefix``, or None (creation may start in the background)."""
+        if len(json.dumps(prefix)) // 4 < self.min_tokens:
+            return None
+        digest = self.prefix_hash(prefix)
+        with self._lock:
+            # Idle longer than the TTL means nothing kept it alive; treat it as expired
+            if self.active is not None and self.active[0] == digest and time.monotonic() - self.used_at < self.ttl:
+                self.used_at = time.monotonic()
+                return self.active[1]
+            if digest in self._pending:
+                return None
+            failed_at = self._failed.get(digest)
+            if failed_at is not None and time.monotonic() - failed_at < self.CREATE_BACKOFF:
+                return None
+            self._pending.add(digest)
+        threading.Thread(target=self._create, args=(digest, prefix), daemon=True).start()
+        return None
+
+    def prefix_for(self, name):
+        with self._lock:
+            return self._prefixes.get(name)
+
+    def invalidate(self, name):
+        """Forget ``name`` (e.g. the server says it expired); the next lookup recreates it."""
+        with self._lock:
+            if self.active is not None and self.active[1] == name:
+                self.active = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _create(self, digest, prefix):
+        try:
+            body = dict(prefix, model=self.model, ttl=f"{self.ttl}s", displayName=f"mmclaw-{digest[:12]}")
+            name = self._request("POST", self.url, body)["name"]
+        except Exception as e:
+            print(f"[!] Context cache: create failed ({e}); sending the prompt uncached.")
+            with self._lock:
+                self._pending.discard(digest)
+                self._failed[digest] = time.monotonic()
+            return
+        with self._lock:
+            self._pending.discard(digest)
+            previous = self.active
+            self.active = (digest, name, prefix)
+            self.used_at = time.monotonic()
+            self._prefixes[name] = prefix
+            for stale in list(self._prefixes)[:-8]:
+                del self._prefixes[stale]
+        print(f"[*] Context cache: created {name}")
+        if previous is not None:
+            self._delete(previous[1])
+        self.start()
+
+    def _delete(self, name):
+        try:
+            self._request("DELETE", self._resource_url(name))
+        except Exception:
+            pass  # expires on its own
+
+    def _touch(self, name):
+        try:
+            self._request("PATCH", self._resource_url(name), {"ttl": f"{self.ttl}s"}, params={"updateMask": "ttl"})
+            return True
+        except urllib.error.HTTPError as e:
+            if e.code in (403, 404):
+                self.invalidate(name)
+            print(f"[!] Context cache: TTL refresh failed ({e})")
+        except Exception as e:
+            print(f"[!] Context cache: TTL refresh failed ({e})")
+        return False
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True, name="mmclaw-context-cache")
+        self._thread.start()
+
+    def _run(self):
+        # Extend the TTL at half-life while the cache is being used; idle caches expire
+        while True:
+            time.sleep(max(1.0, self.ttl / 2))
+            with self._lock:
+                active = self.active
+                idle = time.monotonic() - self.used_at
+            if active is not None and idle < self.ttl:
+                self._touch(active[1])
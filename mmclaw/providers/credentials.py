@@ -0,0 +1,160 @@
+"""Background OAuth token refresh for the Codex and gemini-cli engines.
+
+One ``CredentialManager`` per engine watches the access token's expiry (the
+JWT ``exp`` claim for Codex, the stored ``expiry_date`` for gemini-cli) and
+refreshes it on a daemon thread ``REFRESH_MARGIN`` seconds ahead of time, so
+requests only ever read the current token. Refreshes are single-flight: a
+401 that arrives while another thread is refreshing waits for that refresh
+instead of starting a second one.
+"""
+import base64
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+
+CODEX_CLIENT_ID = "app_EMoamEEZ73f0CkXaXp7hrann"
+
+
+def jwt_expiry(token):
+    """Return the ``exp`` claim of a JWT (seconds since epoch), or None."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload.encode()).decode())["exp"])
+    except Exception:
+        return None
+
+
+def _post_form(url, fields, timeout=30):
+    req = urllib.request.Request(url, data=urllib.parse.urlencode(fields).encode(), method="POST")
+    req.add_header("Content-Type", "application/x-www-form-urlencoded")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode())
+
+
+class CredentialManager(object):
+    REFRESH_MARGIN = 300       # refresh this long before expiry
+    CHECK_INTERVAL = 60        # poll interval while the expiry is unknown or far away
+    RECENT_REFRESH = 10        # a 401 within this window of a refresh reuses it
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, config, engine_type):
+        self.config = config
+        self.engine_type = engine_type
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def for_engine(cls, config, engine_type):
+        """Process-wide manager for ``engine_type``; starts its refresh thread on first use."""
+        with cls._managers_lock:
+            manager = cls._managers.get(engine_type)
+            if manager is None:
+                manager = cls._managers[engine_type] = cls(config, engine_type)
+                manager.start()
+            return manager
+
+    @property
+    def engine_config(self):
+        return self.config["engines"][self.engine_type]
+
+    def access_token(self):
+        return self.engine_config.get("api_key", "")
+
+    def expires_at(self):
+        if self.engine_type == "gemini-cli":
+            expiry_ms = self.engine_config.get("expiry_date")
+            return expiry_ms / 1000.0 if expiry_ms else None
+        return jwt_expiry(self.access_token())
+
+    def needs_refresh(self):
+        expires_at = self.expires_at()
+        return expires_at is not None and time.time() >= expires_at - self.REFRESH_MARGIN
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def _refresh_codex(self, refresh_token):
+        token_data = _post_form("https://auth.openai.com/oauth/token", {
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": CODEX_CLIENT_ID,
+        })
+        return token_data, None
+
+    def _refresh_gemini_cli(self, refresh_token):
+        from .legacy import GEMINI_CLI_CLIENT_ID, GEMINI_CLI_CLIENT_SECRET
+        token_data = _post_form("https://oauth2.googleapis.com/token", {
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": GEMINI_CLI_CLIENT_ID,
+            "client_secret": GEMINI_CLI_CLIENT_SECRET,
+        })
+        return token_data, int((time.time() + token_data.get("expires_in", 3600)) * 1000)
+
+    def refresh(self, force=False):
+        """Refresh the token; returns True when a usable token is in place.
+
+        Without ``force`` this is a no-op unless the token is close to expiry.
+        With ``force`` (after a 401) a refresh that just finished on another
+        thread is reused.
+        """
+        with self._lock:
+            if force and time.monotonic() - self.refreshed_at < self.RECENT_REFRESH:
+                return True
+            if not force and not self.needs_refresh():
+                return True
+            refresh_token = self.engine_config.get("refresh_token")
+            if not refresh_token:
+                return False
+            label = {"codex": "Codex", "gemini-cli": "Gemini CLI"}.get(self.engine_type, self.engine_type)
+            try:
+                from ..config import ConfigManager
+                print(f"[*] {label}: Refreshing access token...")
+                if self.engine_type == "gemini-cli":
+                    token_data, expiry_date = self._refresh_gemini_cli(refresh_token)
+                else:
+                    token_data, expiry_date = self._refresh_codex(refresh_token)
+                engine_config = self.engine_config
+                engine_config["api_key"] = token_data["access_token"]
+                if expiry_date is not None:
+                    engine_config["expiry_date"] = expiry_date
+                if "refresh_token" in token_data:
+                    engine_config["refresh_token"] = token_data["refresh_token"]
+                ConfigManager.save(self.config)
+                self.refreshed_at = time.monotonic()
+                print(f"[✓] {label}: Token refreshed.")
+                return True
+            except Exception as e:
+                print(f"[!] {label} Refresh Error: {e}")
+                return False
+
+    # ------------------------------------------------------------------
+    # Background thread
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is not None or not self.engine_config.get("refresh_token"):
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"mmclaw-credentials-{self.engine_type}")
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            expires_at = self.expires_at()
+            if expires_at is None:
+                time.sleep(self.CHECK_INTERVAL)
+                continue
+            wait = expires_at - self.REFRESH_MARGIN - time.time()
+            if wait > 0:
+                time.sleep(min(wait, self.CHECK_INTERVAL))
+                continue
+            if not self.refresh() or self.needs_refresh():
+                # Failed, or the new token is itself short-lived; don't spin
+                time.sleep(self.CHECK_INTERVAL)
@@ -0,0 +1,215 @@
+"""Per-phase deadlines for LLM calls.
+
+A single socket timeout bounds each read, so a stream trickling one byte a
+minute never times out while a model that thinks for two minutes before its
+first token is killed. Calls instead get four separate limits::
+
+    "timeouts": {
+        "connect": 10,        # TCP + TLS handshake
+        "first_token": 90,    # request sent -> first body byte (headers count too)
+        "stall": 60,          # longest gap between two body chunks
+        "total": 600          # whole call, however steadily it streams
+    }
+
+Set at the top level of the config, in an engine entry, or in a job profile
+(``job_profiles.<class>.timeouts``); missing keys fall back to the level
+below, then to the provider's defaults. When one fires the call raises
+``StreamTimeout``, a ``TimeoutError`` naming the phase, which the retry
+policy treats as retryable and the circuit breaker as an outage.
+"""
+import asyncio
+import http.client
+import socket
+import time
+import urllib.error
+import urllib.request
+
+
+PHASES = ("connect", "first_token", "stall", "total")
+# socket.timeout only became an alias of TimeoutError in Python 3.10
+TIMEOUTS = (socket.timeout, TimeoutError)
+
+
+class StreamTimeout(TimeoutError):
+    def __init__(self, phase, seconds):
+        super().__init__(f"{phase.replace('_', ' ')} timeout after {seconds:g}s")
+        self.phase = phase
+        self.seconds = seconds
+
+
+class Deadlines(object):
+    def __init__(self, connect=10, first_token=90, stall=60, total=600):
+        self.connect = float(connect)
+        self.first_token = float(first_token)
+        self.stall = float(stall)
+        self.total = float(total)
+
+    @classmethod
+    def from_config(cls, config, engine_config, defaults=None):
+        options = dict(defaults or {})
+        for level in (config.get("timeouts"), engine_config.get("timeouts")):
+            options.update({k: v for k, v in (level or {}).items() if k in PHASES and v is not None})
+        return cls(**options)
+
+    def start(self):
+        return CallDeadline(self)
+
+
+class CallDeadline(object):
+    """Clock for one call: which phase it is in and how long the next read may block."""
+
+    def __init__(self, deadlines):
+        self.limits = deadlines
+        self.started = time.monotonic()
+        self.connected = False
+        self.first_byte = False
+
+    def remaining(self):
+        return self.limits.total - (time.monotonic() - self.started)
+
+    def read_timeout(self):
+        """Timeout for the next read: the phase limit, capped by what is left of the total."""
+        if self.first_byte:
+            limit = self.limits.stall
+        else:
+            # Time to first token is measured from the start of the call
+            limit = self.limits.first_token - (time.monotonic() - self.started)
+        return max(0.0, min(limit, self.remaining()))
+
+    def expired(self, error=None):
+        """The ``StreamTimeout`` for a timeout that just fired."""
+        if isinstance(error, StreamTimeout):
+            return error
+        if not self.connected:
+            return StreamTimeout("connect", self.limits.connect)
+        if self.remaining() <= 0.05:
+            return StreamTimeout("total", self.limits.total)
+        phase = "stall" if self.first_byte else "first_token"
+        return StreamTimeout(phase, getattr(self.limits, phase))
+
+    # ------------------------------------------------------------------
+    # Blocking path
+    # ------------------------------------------------------------------
+
+    def urlopen(self, req):
+        """``urllib.request.urlopen`` with the connect limit on the handshake only."""
+        opener = urllib.request.build_opener(_HTTPHandler(self), _HTTPSHandler(self))
+        try:
+            return opener.open(req, timeout=min(self.limits.connect, self.remaining()))
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TIMEOUTS):
+                raise self.expired(e.reason) from e
+            raise
+        except TIMEOUTS as e:
+            raise self.expired(e) from e
+
+    def wrap(self, response):
+        return _DeadlineResponse(response, self)
+
+    def _connected(self, sock):
+        self.connected = True
+        sock.settimeout(self.read_timeout())
+
+    # ------------------------------------------------------------------
+    # Async path
+    # ------------------------------------------------------------------
+
+    async def request_async(self, method, url, headers=None, body=None):
+        from ..aio import ConnectTimeout, http_client
+        try:
+            response = await http_client().request(
+                method, url, headers=headers, body=body,
+                timeout=self.read_timeout, connect_timeout=min(self.limits.connect, self.remaining()),
+            )
+        except ConnectTimeout as e:
+            raise StreamTimeout("connect", self.limits.connect) from e
+        except asyncio.TimeoutError as e:
+            self.connected = True
+            raise self.expired(e) from e
+        self.connected = True
+        return response
+
+    async def iter_async(self, response):
+        """Body chunks of ``response`` as they arrive, each read bounded by the current phase."""
+        try:
+            async for chunk in response.iter_chunks(timeout=self.read_timeout):
+                self.first_byte = True
+                yield chunk
+        except asyncio.TimeoutError as e:
+            raise self.expired(e) from e
+
+
+class _DeadlineResponse(object):
+    """Response wrapper that re-arms the socket timeout before every read."""
+
+    def __init__(self, response, deadline):
+        self._response = response
+        self._deadline = deadline
+        try:
+            self._sock = response.fp.raw._sock
+        except AttributeError:
+            self._sock = None
+
+    def _arm(self):
+        timeout = self._deadline.read_timeout()
+        if timeout <= 0:
+            raise self._deadline.expired()
+        if self._sock is not None:
+            self._sock.settimeout(timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def read1(self, n=-1):
+        self._arm()
+        try:
+            data = self._response.read1(n)
+        except TIMEOUTS as e:
+            raise self._deadline.expired(e) from e
+        self._deadline.first_byte = True
+        return data
+
+    def read(self):
+        chunks = []
+        while True:
+            chunk = self.read1(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read1(65536)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _connection_class(base, deadline):
+    class Connection(base):
+        def connect(self):
+            try:
+                super().connect()
+            except TIMEOUTS as e:
+                raise deadline.expired(e) from e
+            deadline._connected(self.sock)
+    return Connection
+
+
+class _HTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, deadline):
+        super().__init__()
+        self._deadline = deadline
+
+    def http_open(self, req):
+        return self.do_open(_connection_class(http.client.HTTPConnection, self._deadline), req)
+
+
+class _HTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, deadline):
+        super().__init__()
+        self._deadline = deadline
+
+    def https_open(self, req):
+        return self.do_open(_connection_class(http.client.HTTPSConnection, self._deadline), req,
+                            context=self._context)
@@ -0,0 +1,95 @@
+"""Incremental request encoding.
+
+A tool loop resends the whole history on every step, but only the last few
+messages are new. ``MessageEncoder`` keeps, per provider, the JSON bytes each
+history message converts to, so a request body is assembled by joining
+pre-encoded fragments and only new (or edited) messages are converted and
+serialized again.
+
+Cache entries are keyed by the message object and checked by identity
+(the dict itself, its ``content`` and ``tool_calls``); memory hands out the
+same dicts on every call, so unchanged messages always hit. Entries not
+used by any of the last ``KEEP_ENCODES`` requests are dropped.
+"""
+import json
+
+
+class EncodedList(object):
+    """A JSON array whose items are already encoded; see ``dumps``."""
+    __slots__ = ("fragments",)
+
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def to_bytes(self):
+        return b"[" + b", ".join(self.fragments) + b"]"
+
+    def decode(self):
+        return [json.loads(fragment) for fragment in self.fragments]
+
+
+class MessageEncoder(object):
+    MAX_ENTRIES = 4096
+    KEEP_ENCODES = 16   # entries no request has used for this many encodes are dropped
+
+    def __init__(self, convert):
+        """``convert(msg)`` returns the list of provider items one history message becomes."""
+        self.convert = convert
+        self._cache = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def fragments_for(self, msg):
+        content = msg.get("content")
+        tool_calls = msg.get("tool_calls")
+        entry = self._cache.get(id(msg))
+        if entry is not None and entry[0] is msg and entry[1] is content and entry[2] is tool_calls:
+            self.hits += 1
+            entry[4] = self._generation
+            return entry[3]
+        self.misses += 1
+        fragments = [json.dumps(item).encode("utf-8") for item in self.convert(msg)]
+        # Holding msg keeps id(msg) from being reused while the entry exists
+        self._cache[id(msg)] = [msg, content, tool_calls, fragments, self._generation]
+        return fragments
+
+    def encode(self, messages):
+        self._generation += 1
+        fragments = []
+        for msg in messages:
+            fragments.extend(self.fragments_for(msg))
+        # Messages built per request (system prompts, background jobs) must not pin
+        # their bytes; other conversations' entries survive while they stay in use
+        if self._generation % self.KEEP_ENCODES == 0 or len(self._cache) > self.MAX_ENTRIES:
+            oldest = self._generation - self.KEEP_ENCODES
+            if len(self._cache) > self.MAX_ENTRIES:
+                oldest = self._generation - 1   # over the cap: keep only this request's messages
+            self._cache = {key: entry for key, entry in self._cache.items() if entry[4] > oldest}
+        return EncodedList(fragments)
+
+
+def dumps(payload):
+    """``json.dumps(payload).encode()`` where top-level ``EncodedList`` values are spliced in as-is."""
+    spliced = {}
+    plain = {}
+    for key, value in payload.items():
+        if isinstance(value, EncodedList):
+            marker = f"\x00encoded:{key}\x00"
+            spliced[json.dumps(marker).encode("utf-8")] = value
+            plain[key] = marker
+        else:
+            plain[key] = value
+    body = json.dumps(plain).encode("utf-8")
+    for marker, value in spliced.items():
+        before, after = body.split(marker, 1)
+        body = before + value.to_bytes() + after
+    return body
+
+
+def plain(payload):
+    """``payload`` with encoded values decoded again (for debug logging)."""
+    return {k: v.decode() if isinstance(v, EncodedList) else v for k, v in payload.items()}
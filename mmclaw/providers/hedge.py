@@ -0,0 +1,320 @@
+"""Hedged requests: race a duplicate call when the first byte is late.
+
+Enabled with::
+
+    "hedge": {
+        "enabled": true,
+        "percentile": 95,       # hedge when no first byte after this TTFT percentile...
+        "min_delay": 1.0,       # ...but never sooner than this (seconds)
+        "initial_delay": 4.0,   # used until "min_samples" TTFTs have been seen
+        "min_samples": 10,
+        "window": 200,          # recent TTFTs kept
+        "max_rate": 0.1,        # at most ~10% of calls may be hedged
+        "engine": "deepseek"    # optional secondary engine (default: same engine)
+    }
+
+Each attempt runs in its own thread with a ``CallContext`` that the provider
+updates when the response opens and its first byte arrives. The first attempt
+to produce output wins; the other is cancelled and its socket shut down. In
+the async runtime (``ask_async``) attempts are tasks instead, the provider
+reports body chunks through ``first_byte()``, and the loser's task is
+cancelled, which closes its connection.
+"""
+import asyncio
+import contextvars
+import socket
+import threading
+import time
+from collections import deque
+
+from .retry import CallCancelled
+
+
+_local = threading.local()
+_async_call = contextvars.ContextVar("hedge_call", default=None)
+
+
+def current_call():
+    return getattr(_local, "ctx", None)
+
+
+class CallContext(object):
+    def __init__(self, signal):
+        self.signal = signal
+        self.started = time.monotonic()
+        self.first_byte_at = None
+        self.cancelled = False
+        self.response = None
+        self._lock = threading.Lock()
+
+    def opened(self, response):
+        with self._lock:
+            self.response = response
+            cancelled = self.cancelled
+        if cancelled:
+            raise CallCancelled("hedged call cancelled")
+        # Block until the body starts; this is the time-to-first-token signal
+        response.peek(1)
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+            self.signal.set()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            response = self.response
+        if response is None:
+            return  # still connecting; opened() raises as soon as headers arrive
+        try:
+            response.fp.raw._sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+
+    @property
+    def ttft(self):
+        return None if self.first_byte_at is None else self.first_byte_at - self.started
+
+
+def response_opened(response):
+    """Providers call this right after a blocking response opens."""
+    ctx = current_call()
+    if ctx is not None:
+        ctx.opened(response)
+
+
+def raise_if_cancelled(error):
+    ctx = current_call()
+    if ctx is not None and ctx.cancelled:
+        raise CallCancelled("hedged call cancelled") from error
+
+
+class AsyncCallContext(object):
+    def __init__(self, signal):
+        self.signal = signal
+        self.started = time.monotonic()
+        self.first_byte_at = None
+
+    @property
+    def ttft(self):
+        return None if self.first_byte_at is None else self.first_byte_at - self.started
+
+
+def first_byte():
+    """The async path calls this for each body chunk it reads."""
+    ctx = _async_call.get()
+    if ctx is not None and ctx.first_byte_at is None:
+        ctx.first_byte_at = time.monotonic()
+        ctx.signal.set()
+
+
+class _Attempt(object):
+    def __init__(self, provider, label, signal):
+        self.provider = provider
+        self.label = label
+        self.ctx = CallContext(signal)
+        self.result = None
+        self.error = None
+        self.done = False
+        self.thread = None
+
+    def start(self, messages, tools, retry):
+        self.thread = threading.Thread(target=self._run, args=(messages, tools, retry), daemon=True)
+        self.thread.start()
+
+    def _run(self, messages, tools, retry):
+        _local.ctx = self.ctx
+        try:
+            self.result = self.provider.ask_with_policy(messages, tools=tools, retry=retry)
+        except Exception as e:
+            self.error = e
+        finally:
+            _local.ctx = None
+            self.done = True
+            self.ctx.signal.set()
+
+    @property
+    def leading(self):
+        return self.ctx.first_byte_at is not None or (self.done and self.error is None)
+
+
+class _AsyncAttempt(object):
+    def __init__(self, provider, label, signal):
+        self.provider = provider
+        self.label = label
+        self.ctx = AsyncCallContext(signal)
+        self.result = None
+        self.error = None
+        self.done = False
+        self.task = None
+
+    def start(self, messages, tools, retry):
+        # The task runs in a copy of the current context, so the variable is its own
+        self.task = asyncio.ensure_future(self._run(messages, tools, retry))
+
+    async def _run(self, messages, tools, retry):
+        _async_call.set(self.ctx)
+        try:
+            self.result = await self.provider.ask_with_policy_async(messages, tools=tools, retry=retry)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.ctx.signal.set()
+
+    @property
+    def leading(self):
+        return self.ctx.first_byte_at is not None or (self.done and self.error is None)
+
+
+class Hedger(object):
+    def __init__(self, config, primary, secondary=None):
+        options = config.get("hedge") or {}
+        self.primary = primary
+        self.secondary = secondary or primary
+        self.percentile = float(options.get("percentile", 95))
+        self.min_delay = float(options.get("min_delay", 1.0))
+        self.initial_delay = float(options.get("initial_delay", 4.0))
+        self.min_samples = int(options.get("min_samples", 10))
+        self.max_rate = float(options.get("max_rate", 0.1))
+        self.ttfts = deque(maxlen=int(options.get("window", 200)))
+        self._tokens = 1.0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_won": 0, "budget_denied": 0}
+
+    def hedge_delay(self):
+        with self._lock:
+            samples = sorted(self.ttfts)
+        if len(samples) < self.min_samples:
+            return max(self.min_delay, self.initial_delay)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay, samples[index])
+
+    def _take_budget(self):
+        # Token bucket: each call earns max_rate of a hedge, bursts capped at 3
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["hedged"] += 1
+                return True
+            self.stats["budget_denied"] += 1
+            return False
+
+    def _count_call(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            self._tokens = min(3.0, self._tokens + self.max_rate)
+
+    def _settle(self, leader, attempts):
+        """Record a TTFT sample for the call and whether the hedge won."""
+        primary = attempts[0]
+        if leader is primary:
+            ttft = primary.ctx.ttft
+        else:
+            # Only slow primaries are hedged, and the hedge's own TTFT is that of a race
+            # winner; either would pull the percentile down. The primary had not answered
+            # yet, so its TTFT is at least the time it has been waiting.
+            ttft = primary.ctx.ttft or (time.monotonic() - primary.ctx.started)
+        if ttft is not None:
+            with self._lock:
+                self.ttfts.append(ttft)
+        if leader is not primary:
+            with self._lock:
+                self.stats["hedge_won"] += 1
+            print(f"[*] Hedge: {self.summary()}")
+
+    def ask(self, messages, tools=None, retry=None):
+        self._count_call()
+        signal = threading.Event()
+        delay = self.hedge_delay()
+        attempts = [_Attempt(self.primary, self.primary.engine_type, signal)]
+        attempts[0].start(messages, tools, retry)
+        deadline = time.monotonic() + delay
+
+        leader = None
+        while True:
+            timeout = None if len(attempts) > 1 or deadline is None else max(0.0, deadline - time.monotonic())
+            signal.wait(timeout)
+            signal.clear()
+            leader = next((a for a in attempts if a.leading), None)
+            if leader is not None or all(a.done for a in attempts):
+                break
+            if len(attempts) == 1 and deadline is not None and time.monotonic() >= deadline:
+                if self._take_budget():
+                    print(f"[*] Hedge: no first byte from {self.primary.engine_type} after {delay:.1f}s, "
+                          f"racing {self.secondary.engine_type}")
+                    hedge = _Attempt(self.secondary, self.secondary.engine_type, signal)
+                    attempts.append(hedge)
+                    hedge.start(messages, tools, retry)
+                else:
+                    deadline = None
+
+        if leader is None:
+            # Every attempt failed before producing output
+            first = attempts[0]
+            return first.provider._error_message(first.error)
+
+        for attempt in attempts:
+            if attempt is not leader:
+                attempt.ctx.cancel()
+        self._settle(leader, attempts)
+        leader.thread.join()
+        if leader.error is not None:
+            return leader.provider._error_message(leader.error)
+        return leader.result
+
+    async def ask_async(self, messages, tools=None, retry=None):
+        if not (getattr(self.primary, "supports_async", False) and getattr(self.secondary, "supports_async", False)):
+            # Blocking providers race in threads, as in the threaded runtime
+            from ..aio import run_blocking
+            return await run_blocking(self.ask, messages, tools=tools, retry=retry)
+        self._count_call()
+        signal = asyncio.Event()
+        delay = self.hedge_delay()
+        attempts = [_AsyncAttempt(self.primary, self.primary.engine_type, signal)]
+        attempts[0].start(messages, tools, retry)
+        deadline = time.monotonic() + delay
+
+        leader = None
+        try:
+            while True:
+                timeout = None if len(attempts) > 1 or deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    await asyncio.wait_for(signal.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                signal.clear()
+                leader = next((a for a in attempts if a.leading), None)
+                if leader is not None or all(a.done for a in attempts):
+                    break
+                if len(attempts) == 1 and deadline is not None and time.monotonic() >= deadline:
+                    if self._take_budget():
+                        print(f"[*] Hedge: no first byte from {self.primary.engine_type} after {delay:.1f}s, "
+                              f"racing {self.secondary.engine_type}")
+                        hedge = _AsyncAttempt(self.secondary, self.secondary.engine_type, signal)
+                        attempts.append(hedge)
+                        hedge.start(messages, tools, retry)
+                    else:
+                        deadline = None
+
+            if leader is None:
+                first = attempts[0]
+                return first.provider._error_message(first.error)
+
+            for attempt in attempts:
+                if attempt is not leader:
+                    attempt.task.cancel()
+            self._settle(leader, attempts)
+            await leader.task
+        except asyncio.CancelledError:
+            for attempt in attempts:
+                attempt.task.cancel()
+            raise
+        if leader.error is not None:
+            return leader.provider._error_message(leader.error)
+        return leader.result
+
+    def summary(self):
+        with self._lock:
+            s = dict(self.stats)
+        return (f"{s['hedged']}/{s['calls']} calls hedged, hedge won {s['hedge_won']}, "
+                f"{s['budget_denied']} denied by budget")
@@ -0,0 +1,219 @@
+"""Image preprocessing for vision messages.
+
+    image = images.pipeline().process(image_bytes, sizing, quality)
+    image.data, image.mime, image.size, image.data_url(), image.timings
+
+``sizing`` is a maximum side in pixels, or an object whose ``target(size)``
+returns the output size (see ``vision.VisionBudget``).
+
+Each image goes through timed stages (milliseconds in ``image.timings``):
+
+* ``probe``  - read the header only; a JPEG/PNG/WebP already within the size
+  limits is sent as is, without decoding it at all.
+* ``decode`` - ``Image.draft`` lets libjpeg decode a JPEG directly at 1/2,
+  1/4 or 1/8 scale, so a 12 MP photo is never fully decoded.
+* ``resize`` - finish the downscale from the drafted size.
+* ``encode`` - write JPEG (no ``optimize`` pass: it costs a second Huffman
+  pass for a few percent).
+* ``base64`` - build the data URL, once per image.
+
+Results are cached by content hash, so a photo forwarded twice is processed
+once. ``process_many`` spreads a batch (e.g. a Telegram album) over a small
+process pool; single images are processed inline. Without Pillow, images are
+passed through unchanged.
+"""
+import base64
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+
+MAX_SIDE = 1024
+QUALITY = 80
+# Sent as is when already this small (and no larger than the target size)
+PASSTHROUGH_BYTES = 300 * 1024
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+class ProcessedImage(object):
+    __slots__ = ("data", "mime", "size", "source_size", "timings", "cached", "_data_url", "_origin")
+
+    def __init__(self, data, mime, size, timings, source_size=None):
+        self.data = data
+        self.mime = mime
+        self.size = size                # (width, height), or None if unknown
+        self.source_size = source_size  # before resizing
+        self.timings = timings          # stage -> milliseconds
+        self.cached = False   # True on results returned from the cache
+        self._data_url = None
+        self._origin = None
+
+    def hit(self):
+        """A per-call copy of this cached result, with ``cached`` set; the data URL stays shared."""
+        image = ProcessedImage(self.data, self.mime, self.size, self.timings, self.source_size)
+        image.cached = True
+        image._origin = self
+        return image
+
+    def data_url(self):
+        if self._origin is not None:
+            return self._origin.data_url()
+        if self._data_url is None:
+            started = time.perf_counter()
+            self._data_url = f"data:{self.mime};base64,{base64.b64encode(self.data).decode('ascii')}"
+            self.timings["base64"] = (time.perf_counter() - started) * 1000
+        return self._data_url
+
+
+def _target_size(size, sizing):
+    if not isinstance(sizing, int):
+        return tuple(sizing.target(size))
+    max_side = sizing
+    width, height = size
+    if max(width, height) <= max_side:
+        return size
+    ratio = max_side / float(max(width, height))
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def _process(image_bytes, sizing, quality):
+    """Run the stages on one image; module-level so process pool workers can run it."""
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = (now - started) * 1000
+        started = now
+
+    if PILImage is None:
+        return image_bytes, "image/jpeg", None, timings, None
+    try:
+        img = PILImage.open(io.BytesIO(image_bytes))
+        original = img.size
+        target = _target_size(original, sizing)
+        lap("probe")
+        mime = PASSTHROUGH_FORMATS.get(img.format)
+        if mime and target == original and len(image_bytes) <= PASSTHROUGH_BYTES:
+            return image_bytes, mime, original, timings, original
+
+        if img.format == "JPEG":
+            # Decode at the smallest power-of-two scale that still covers the target
+            img.draft("RGB", target)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.load()
+        lap("decode")
+        if img.size != target:
+            img = img.resize(target, PILImage.LANCZOS, reducing_gap=3.0)
+        lap("resize")
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=quality)
+        lap("encode")
+        return output.getvalue(), "image/jpeg", img.size, timings, original
+    except Exception as e:
+        print(f"[!] Compression Error: {e}")
+        return image_bytes, "image/jpeg", None, timings, None
+
+
+class ImagePipeline(object):
+    MAX_CACHED = 32
+
+    def __init__(self, max_side=MAX_SIDE, quality=QUALITY, workers=None):
+        self.max_side = max_side
+        self.quality = quality
+        self.workers = workers if workers is not None else min(4, os.cpu_count() or 1)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        self.stats = {"images": 0, "cache_hits": 0, "passthrough": 0, "pooled": 0, "ms": {}}
+
+    def _key(self, image_bytes, sizing, quality):
+        return hashlib.sha256(image_bytes).hexdigest(), getattr(sizing, "key", sizing), quality
+
+    def _cached(self, key):
+        with self._lock:
+            image = self._cache.get(key)
+            if image is None:
+                return None
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+        return image.hit()
+
+    def _store(self, key, result):
+        data, mime, size, timings, source_size = result
+        image = ProcessedImage(data, mime, size, timings, source_size)
+        with self._lock:
+            self.stats["images"] += 1
+            if "decode" not in timings:
+                self.stats["passthrough"] += 1
+            for stage, ms in timings.items():
+                self.stats["ms"][stage] = self.stats["ms"].get(stage, 0.0) + ms
+            self._cache[key] = image
+            while len(self._cache) > self.MAX_CACHED:
+                self._cache.popitem(last=False)
+        return image
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs connector threads can deadlock
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def process(self, image_bytes, sizing=None, quality=None):
+        sizing = sizing or self.max_side
+        quality = quality or self.quality
+        key = self._key(image_bytes, sizing, quality)
+        image = self._cached(key)
+        if image is not None:
+            return image
+        return self._store(key, _process(image_bytes, sizing, quality))
+
+    def process_many(self, images, sizing=None, quality=None):
+        """Process a batch, in parallel worker processes when there is more than one miss."""
+        sizing = sizing or self.max_side
+        quality = quality or self.quality
+        keys = [self._key(data, sizing, quality) for data in images]
+        results = [self._cached(key) for key in keys]
+        misses = [i for i, image in enumerate(results) if image is None]
+        if len(misses) > 1 and self.workers > 1 and PILImage is not None:
+            try:
+                futures = [self._executor().submit(_process, images[i], sizing, quality) for i in misses]
+                for i, future in zip(misses, futures):
+                    results[i] = self._store(keys[i], future.result())
+                with self._lock:
+                    self.stats["pooled"] += len(misses)
+            except (BrokenProcessPool, OSError) as e:
+                print(f"[!] Image pool unavailable ({e}); processing inline.")
+                self.workers = 1
+        for i in misses:
+            if results[i] is None:
+                results[i] = self._store(keys[i], _process(images[i], sizing, quality))
+        return results
+
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def pipeline():
+    """Process-wide pipeline shared by every connector."""
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = ImagePipeline()
+        return _PIPELINE
@@ -5,9 +5,12 @@ import urllib.request
 import urllib.error
 import urllib.parse
 import base64
-import io
 import time
 
+from . import images, sse, vision
+from .credentials import CredentialManager
+from .retry import RetryPolicy, breaker_for
+
 
 def _gemini_cli_activity_id() -> str:
     """Generate a short random per-request activity ID, mirroring Gemini CLI behaviour."""
@@ -22,48 +25,17 @@ GEMINI_CLI_HEADERS       = {
     "Client-Metadata": json.dumps({"ideType": "GEMINI_CLI", "platform": "PLATFORM_UNSPECIFIED", "pluginType": "GEMINI"}),
 }
 
-try:
-    from PIL import Image as PILImage
-except ImportError:
-    PILImage = None
-
 def compress_image(image_bytes):
     """Resizes and compresses image to reduce API costs and meet provider limits."""
-    if PILImage is None:
-        return image_bytes
-    
-    try:
-        img = PILImage.open(io.BytesIO(image_bytes))
-        # Convert RGBA to RGB if necessary
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
-        
-        # Max dimension 1024px while maintaining aspect ratio
-        max_size = 1024
-        if max(img.size) > max_size:
-            ratio = max_size / float(max(img.size))
-            new_size = (int(img.size[0] * ratio), int(img.size[1] * ratio))
-            img = img.resize(new_size, PILImage.LANCZOS)
-        
-        output = io.BytesIO()
-        img.save(output, format="JPEG", quality=80, optimize=True)
-        return output.getvalue()
-    except Exception as e:
-        print(f"[!] Compression Error: {e}")
-        return image_bytes
+    return images.pipeline().process(image_bytes).data
 
 def prepare_image_content(image_bytes, text="What is in this image?"):
     """Compresses an image and returns a list of content blocks for OpenAI-compatible APIs."""
-    compressed_file = compress_image(image_bytes)
-    base64_image = base64.b64encode(compressed_file).decode('utf-8')
-    
-    return [
-        {"type": "text", "text": text},
-        {
-            "type": "image_url",
-            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-        }
-    ]
+    return prepare_images_content([image_bytes], text)
+
+def prepare_images_content(image_list, text="What is in these images?"):
+    """Like prepare_image_content for several images (e.g. an album), processed in parallel."""
+    return [{"type": "text", "text": text}] + vision.image_blocks(image_list)
 
 class Engine(object):
     def __init__(self, config):
@@ -85,6 +57,10 @@ class Engine(object):
         elif self.engine_type == "gemini-cli":
             self.base_url = GEMINI_CLI_ENDPOINT
 
+        if self.engine_type in ("codex", "gemini-cli"):
+            # Start background token refresh now rather than on the first request
+            CredentialManager.for_engine(config, self.engine_type)
+
     def _to_gemini_contents(self, messages):
         """Convert OpenAI-style messages to Gemini contents + optional systemInstruction."""
         system_instruction = None
@@ -107,77 +83,17 @@ class Engine(object):
 
     def _refresh_codex_token(self):
         """Refreshes the OAuth token for Codex provider."""
-        try:
-            from ..config import ConfigManager
-            engine_config = self.config["engines"]["codex"]
-            refresh_token = engine_config.get("refresh_token")
-            if not refresh_token:
-                return False
-                
-            print("[*] Codex: Refreshing Access Token...")
-            import urllib.parse
-            data = urllib.parse.urlencode({
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": "app_EMoamEEZ73f0CkXaXp7hrann",
-            }).encode()
-            
-            req = urllib.request.Request(
-                "https://auth.openai.com/oauth/token", 
-                data=data, 
-                method="POST"
-            )
-            req.add_header("Content-Type", "application/x-www-form-urlencoded")
-            
-            with urllib.request.urlopen(req) as resp:
-                token_data = json.loads(resp.read().decode())
-                new_access_token = token_data["access_token"]
-                
-                # Update in memory and save to config
-                self.api_key = new_access_token
-                self.config["engines"]["codex"]["api_key"] = new_access_token
-                if "refresh_token" in token_data:
-                    self.config["engines"]["codex"]["refresh_token"] = token_data["refresh_token"]
-                
-                ConfigManager.save(self.config)
-                print("[✓] Codex: Token refreshed successfully.")
-                return True
-        except Exception as e:
-            print(f"[!] Codex Refresh Error: {e}")
+        if not CredentialManager.for_engine(self.config, "codex").refresh(force=True):
             return False
+        self.api_key = self.config["engines"]["codex"]["api_key"]
+        return True
 
     def _refresh_gemini_cli_token(self):
         """Refreshes the OAuth token for Gemini CLI provider."""
-        try:
-            from ..config import ConfigManager
-            import urllib.parse
-            engine_config = self.config["engines"]["gemini-cli"]
-            refresh_token = engine_config.get("refresh_token")
-            if not refresh_token:
-                return False
-            print("[*] Gemini CLI: Refreshing access token...")
-            data = urllib.parse.urlencode({
-                "grant_type":    "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id":     GEMINI_CLI_CLIENT_ID,
-                "client_secret": GEMINI_CLI_CLIENT_SECRET,
-            }).encode()
-            req = urllib.request.Request("https://oauth2.googleapis.com/token", data=data, method="POST")
-            req.add_header("Content-Type", "application/x-www-form-urlencoded")
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                token_data = json.loads(resp.read().decode())
-                new_token = token_data["access_token"]
-                engine_config["api_key"] = new_token
-                engine_config["expiry_date"] = int((time.time() + token_data.get("expires_in", 3600)) * 1000)
-                if "refresh_token" in token_data:
-                    engine_config["refresh_token"] = token_data["refresh_token"]
-                self.api_key = new_token
-                ConfigManager.save(self.config)
-                print("[✓] Gemini CLI: Token refreshed.")
-                return True
-        except Exception as e:
-            print(f"[!] Gemini CLI Refresh Error: {e}")
+        if not CredentialManager.for_engine(self.config, "gemini-cli").refresh(force=True):
             return False
+        self.api_key = self.config["engines"]["gemini-cli"]["api_key"]
+        return True
 
     def _get_gemini_cli_project_id(self):
         """Discovers and caches the GCP project ID via loadCodeAssist, onboarding free tier if needed."""
@@ -261,7 +177,10 @@ class Engine(object):
         req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
         with urllib.request.urlopen(req, timeout=60) as response:
             res_data = json.loads(response.read().decode("utf-8"))
-            return res_data["choices"][0]["message"]
+            msg = res_data["choices"][0]["message"]
+            if res_data.get("usage"):
+                msg["usage"] = sse.openai_usage(res_data["usage"]).as_dict()
+            return msg
 
     def _ask_stream(self, url, payload):
         payload = {**payload, "stream": True}
@@ -272,38 +191,16 @@ class Engine(object):
         }
         req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
         with urllib.request.urlopen(req, timeout=60) as response:
-            full_content = ""
-            for line in response:
-                line = line.decode("utf-8").strip()
-                if not line.startswith("data: "):
-                    continue
-                data_str = line[6:]
-                if data_str == "[DONE]":
-                    break
-                try:
-                    res_data = json.loads(data_str)
-                    content = res_data["choices"][0]["delta"].get("content")
-                    if content:
-                        full_content += content
-                except:
-                    continue
-            return {"role": "assistant", "content": full_content}
-
-    def ask(self, messages, tools=None, retry=1):
-        last_err = None
-        for attempt in range(retry + 1):
-            try:
-                return self.ask_once(messages, tools=tools)
-            except urllib.error.HTTPError as e:
-                if 400 <= e.code < 500 and e.code != 429:
-                    raise
-                last_err = e
-            except Exception as e:
-                last_err = e
-            if attempt < retry:
-                print(f"[!] Request failed ({last_err}), retrying...")
-                time.sleep(2)
-        raise last_err
+            acc = sse.read_stream(response, sse.openai_chat_events, label=self.engine_type)
+            msg = {"role": "assistant", "content": "".join(acc.text)}
+            if acc.usage is not None:
+                msg["usage"] = acc.usage.as_dict()
+            return msg
+
+    def ask(self, messages, tools=None, retry=None):
+        breaker = breaker_for(f"{self.engine_type}@{urllib.parse.urlsplit(self.base_url).netloc}", self.config)
+        policy = RetryPolicy.from_config(self.config, streaming=bool(self.stream), retry=retry)
+        return policy.call(lambda: self.ask_once(messages, tools=tools), breaker, label=self.engine_type)
 
     def ask_once(self, messages, tools=None):
         if self.engine_type in ["openai", "codex", "google", "deepseek", "openrouter", "kimi_ai", "kimi_cn", "minimax_io", "minimax_cn"] or self.engine_type.startswith("openai_compatible_"):
@@ -358,17 +255,26 @@ class Engine(object):
                     method="POST"
                 )
             
-            def parse_codex_response(res_data):
+            def parse_codex_response(res_data, event_name=None):
                 etype = res_data.get("type")
                 if etype == "response.output_text.delta":
-                    return res_data.get("delta", "")
-                
+                    yield sse.TextDelta(res_data.get("delta", ""))
+                    return
+                if etype == "response.completed":
+                    yield sse.Done(etype)
+                    return
+
                 # Fallback for other content formats
                 msg_obj = res_data.get("message", {})
                 content = msg_obj.get("content", "")
                 if isinstance(content, list):
-                    return "".join([i.get("text", "") for i in content if isinstance(i, dict)])
-                return content if isinstance(content, str) else ""
+                    content = "".join([i.get("text", "") for i in content if isinstance(i, dict)])
+                if content and isinstance(content, str):
+                    yield sse.TextDelta(content)
+
+            def read_codex_stream(response):
+                acc = sse.read_stream(response, parse_codex_response, label="codex")
+                return {"role": "assistant", "content": "".join(acc.text)}
 
             try:
                 if self.debug:
@@ -377,21 +283,7 @@ class Engine(object):
                 if self.engine_type == "codex":
                     req = make_request(self.api_key, payload)
                     with urllib.request.urlopen(req, timeout=60) as response:
-                        full_content = ""
-                        for line in response:
-                            line = line.decode("utf-8").strip()
-                            if not line.startswith("data: "): continue
-
-                            data_str = line[6:]
-                            if data_str == "[DONE]": break
-                            try:
-                                res_data = json.loads(data_str)
-                                if res_data.get("type") == "response.completed": break
-
-                                chunk_text = parse_codex_response(res_data)
-                                if chunk_text: full_content += chunk_text
-                            except: continue
-                        msg = {"role": "assistant", "content": full_content}
+                        msg = read_codex_stream(response)
                 else:
                     msg = self._ask_stream(url, payload) if self.stream else self._ask_blocking(url, payload)
 
@@ -407,21 +299,7 @@ class Engine(object):
                                 # Retry with new token
                                 req = make_request(self.api_key, payload)
                                 with urllib.request.urlopen(req, timeout=60) as response:
-                                    full_content = ""
-                                    for line in response:
-                                        line = line.decode("utf-8").strip()
-                                        if not line.startswith("data: "): continue
-                                        
-                                        data_str = line[6:]
-                                        if data_str == "[DONE]": break
-                                        try:
-                                            res_data = json.loads(data_str)
-                                            if res_data.get("type") == "response.completed": break
-                                            
-                                            chunk_text = parse_codex_response(res_data)
-                                            if chunk_text: full_content += chunk_text
-                                        except: continue
-                                    return {"role": "assistant", "content": full_content}
+                                    return read_codex_stream(response)
                             except Exception as retry_e:
                                 print(f"[!] Retry Error: {retry_e}")
                     
@@ -447,9 +325,8 @@ class Engine(object):
                 return {"role": "assistant", "content": error_msg}
         elif self.engine_type == "gemini-cli":
             engine_config = self.config["engines"]["gemini-cli"]
-            # Proactively refresh if within 5 min of expiry
-            if time.time() * 1000 >= engine_config.get("expiry_date", 0) - 5 * 60 * 1000:
-                self._refresh_gemini_cli_token()
+            # The credential manager refreshes ahead of expiry in the background
+            self.api_key = CredentialManager.for_engine(self.config, "gemini-cli").access_token() or self.api_key
 
             project_id = self._get_gemini_cli_project_id()
 
@@ -481,53 +358,18 @@ class Engine(object):
                     headers=headers, method="POST"
                 )
                 with urllib.request.urlopen(req, timeout=120) as response:
-                    full_content = ""
-                    thought_content = ""
-                    chunk_count = 0
-                    data_line_count = 0
-                    for line in response:
-                        line = line.decode("utf-8").strip()
-                        if not line.startswith("data:"):
-                            continue
-                        data_line_count += 1
-                        data_str = line[5:].strip()
-                        if not data_str:
-                            continue
-                        try:
-                            chunk = json.loads(data_str)
-                            chunk_count += 1
-                            # Cloud Code Assist may wrap in "response" or return candidates directly
-                            candidates = (
-                                chunk.get("candidates")
-                                or chunk.get("response", {}).get("candidates")
-                                or []
-                            )
-                            if not candidates:
-                                if self.debug:
-                                    print(f"[gemini-cli] chunk #{chunk_count} has no candidates, keys={list(chunk.keys())}, raw={json.dumps(chunk)[:200]}")
-                                continue
-                            candidate = candidates[0]
-                            finish_reason = candidate.get("finishReason")
-                            parts = (candidate.get("content") or {}).get("parts") or []
-                            if not parts and finish_reason and self.debug:
-                                print(f"[gemini-cli] chunk #{chunk_count} finishReason={finish_reason}, no parts")
-                            for part in parts:
-                                if "text" not in part:
-                                    continue
-                                if part.get("thought"):
-                                    thought_content += part["text"]
-                                else:
-                                    full_content += part["text"]
-                        except Exception as ex:
-                            if self.debug:
-                                print(f"[gemini-cli] parse error: {ex}, raw={data_str[:200]}")
-                            continue
-                    if self.debug:
-                        print(f"[gemini-cli] stream done: data_lines={data_line_count}, chunks={chunk_count}, content_len={len(full_content)}, thought_len={len(thought_content)}")
-                        if not full_content and not thought_content:
-                            print(f"[gemini-cli] WARNING: empty response!")
-                    # Fall back to thought content if model only returned thinking parts
-                    return {"role": "assistant", "content": full_content or thought_content}
+                    acc = sse.read_stream(response, sse.gemini_events, label="gemini-cli")
+                full_content = "".join(acc.text)
+                thought_content = "".join(acc.thought)
+                if self.debug:
+                    print(f"[gemini-cli] stream done: events={acc.events}, malformed={acc.malformed}, content_len={len(full_content)}, thought_len={len(thought_content)}")
+                    if not full_content and not thought_content:
+                        print(f"[gemini-cli] WARNING: empty response!")
+                # Fall back to thought content if model only returned thinking parts
+                msg = {"role": "assistant", "content": full_content or thought_content}
+                if acc.usage is not None:
+                    msg["usage"] = acc.usage.as_dict()
+                return msg
 
             try:
                 msg = _do_request()
@@ -590,33 +432,12 @@ class Engine(object):
                 method="POST"
             )
             try:
-                full_content = ""
                 with urllib.request.urlopen(req, timeout=120) as response:
                     if self.stream:
-                        for line in response:
-                            line_str = line.decode("utf-8").strip()
-                            if not line_str.startswith("data: "):
-                                continue
-                            data_str = line_str[6:]
-                            if data_str == "[DONE]":
-                                break
-                            try:
-                                chunk = json.loads(data_str)
-                                candidates = chunk.get("candidates") or []
-                                if not candidates:
-                                    continue
-                                parts = (candidates[0].get("content") or {}).get("parts") or []
-                                for part in parts:
-                                    if "text" in part:
-                                        full_content += part["text"]
-                            except Exception:
-                                continue
+                        acc = sse.read_stream(response, sse.gemini_events, label="vertex_ai")
                     else:
-                        res_data = json.loads(response.read().decode("utf-8"))
-                        candidates = res_data.get("candidates") or []
-                        if candidates:
-                            parts = (candidates[0].get("content") or {}).get("parts") or []
-                            full_content = "".join(p.get("text", "") for p in parts)
+                        acc = sse.accumulate(json.loads(response.read().decode("utf-8")), sse.gemini_events)
+                full_content = "".join(acc.text) or "".join(acc.thought)
 
                 if self.debug:
                     print(f"\n[LLM Response (vertex_ai)] len={len(full_content)}\n")
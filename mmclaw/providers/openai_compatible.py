@@ -1,13 +1,12 @@
 import json
-import time
-import urllib.error
-import urllib.request
 
+from . import sse
 from .base import BaseProvider
 
 
 class OpenAICompatibleProvider(BaseProvider):
     supports_native_tools = True
+    supports_async = True
 
     def _headers(self):
         return {
@@ -32,33 +31,35 @@ class OpenAICompatibleProvider(BaseProvider):
             converted_tools.append(self._to_openai_schema(tool))
         return converted_tools
 
+    def _convert_message(self, msg):
+        role = msg.get("role")
+        if role == "assistant":
+            out = {"role": "assistant", "content": msg.get("content") or ""}
+            tool_calls = []
+            for call in msg.get("tool_calls") or []:
+                tool_calls.append({
+                    "id": call.get("id") or call.get("name") or "call_0",
+                    "type": "function",
+                    "function": {
+                        "name": call.get("name", ""),
+                        "arguments": json.dumps(call.get("args", {}) or {}, ensure_ascii=False),
+                    },
+                })
+            if tool_calls:
+                out["tool_calls"] = tool_calls
+            return [out]
+        if role == "tool":
+            return [{
+                "role": "tool",
+                "tool_call_id": msg.get("tool_call_id") or msg.get("id") or msg.get("name", ""),
+                "content": msg.get("content", ""),
+            }]
+        return [msg]
+
     def _to_provider_messages(self, messages):
         provider_messages = []
         for msg in messages:
-            role = msg.get("role")
-            if role == "assistant":
-                out = {"role": "assistant", "content": msg.get("content") or ""}
-                tool_calls = []
-                for call in msg.get("tool_calls") or []:
-                    tool_calls.append({
-                        "id": call.get("id") or call.get("name") or "call_0",
-                        "type": "function",
-                        "function": {
-                            "name": call.get("name", ""),
-                            "arguments": json.dumps(call.get("args", {}) or {}, ensure_ascii=False),
-                        },
-                    })
-                if tool_calls:
-                    out["tool_calls"] = tool_calls
-                provider_messages.append(out)
-            elif role == "tool":
-                provider_messages.append({
-                    "role": "tool",
-                    "tool_call_id": msg.get("tool_call_id") or msg.get("id") or msg.get("name", ""),
-                    "content": msg.get("content", ""),
-                })
-            else:
-                provider_messages.append(msg)
+            provider_messages.extend(self._convert_message(msg))
         return provider_messages
 
     def _normalize_message(self, message):
@@ -81,114 +82,47 @@ class OpenAICompatibleProvider(BaseProvider):
             normalized["tool_calls"] = tool_calls
         return normalized
 
-    def _ask_blocking(self, url, payload):
-        payload = {**payload, "stream": False}
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers=self._headers(),
-            method="POST",
-        )
-        with urllib.request.urlopen(req, timeout=60) as response:
-            data = json.loads(response.read().decode("utf-8"))
-            return self._normalize_message(data["choices"][0]["message"])
-
-    def _ask_stream(self, url, payload):
-        payload = {**payload, "stream": True}
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers=self._headers(),
-            method="POST",
-        )
-        content = ""
-        calls_by_index = {}
-        with urllib.request.urlopen(req, timeout=60) as response:
-            for line in response:
-                line = line.decode("utf-8").strip()
-                if not line.startswith("data: "):
-                    continue
-                data_str = line[6:]
-                if data_str == "[DONE]":
-                    break
-                try:
-                    data = json.loads(data_str)
-                    delta = data["choices"][0].get("delta") or {}
-                    if delta.get("content"):
-                        content += delta["content"]
-                    for call_delta in delta.get("tool_calls") or []:
-                        idx = call_delta.get("index", 0)
-                        current = calls_by_index.setdefault(idx, {
-                            "id": "",
-                            "type": "function",
-                            "function": {"name": "", "arguments": ""},
-                        })
-                        if call_delta.get("id"):
-                            current["id"] += call_delta["id"]
-                        function_delta = call_delta.get("function") or {}
-                        if function_delta.get("name"):
-                            current["function"]["name"] += function_delta["name"]
-                        if function_delta.get("arguments"):
-                            current["function"]["arguments"] += function_delta["arguments"]
-                except Exception:
-                    continue
+    def _parse_response(self, data):
+        msg = self._normalize_message(data["choices"][0]["message"])
+        if data.get("usage"):
+            msg["usage"] = sse.openai_usage(data["usage"]).as_dict()
+        return msg
 
-        message = {"role": "assistant", "content": content}
-        if calls_by_index:
-            message["tool_calls"] = [calls_by_index[i] for i in sorted(calls_by_index)]
-        return self._normalize_message(message)
+    def _stream_reader(self):
+        return sse.StreamReader(sse.openai_chat_events, label=self.engine_type)
 
-    def ask(self, messages, tools=None, retry=1):
-        last_err = None
-        for attempt in range(retry + 1):
-            try:
-                return self.ask_once(messages, tools=tools)
-            except urllib.error.HTTPError as e:
-                if 400 <= e.code < 500 and e.code != 429:
-                    raise
-                last_err = e
-            except Exception as e:
-                last_err = e
-            if attempt < retry:
-                print(f"[!] Request failed ({last_err}), retrying...")
-                time.sleep(2)
-        raise last_err
-
-    def ask_once(self, messages, tools=None):
+    def _build_request(self, messages, tools=None):
         url = f"{self.base_url}/chat/completions"
         payload = {
             "model": self.model,
-            "messages": self._to_provider_messages(messages),
+            "messages": self.encoder.encode(messages),
         }
         if tools:
             payload["tools"] = self._to_openai_tools(tools)
             payload["tool_choice"] = "auto"
         if self.engine_type in ("minimax_io", "minimax_cn"):
             payload["reasoning_split"] = True
-
-        if self.debug:
-            print(f"\n[LLM Request ({self.engine_type})]\n{json.dumps(payload, indent=2)}\n")
-
-        try:
-            msg = self._ask_stream(url, payload) if self.stream else self._ask_blocking(url, payload)
-            if self.debug:
-                print(f"\n[LLM Response]\n{json.dumps(msg, indent=2)}\n")
-            return msg
-        except Exception as e:
-            print(f"[!] Engine Error: {e}")
-            error_msg = f"Engine Error: {e}"
-            if isinstance(e, urllib.error.HTTPError):
-                try:
-                    error_body = e.read().decode("utf-8")
-                    print(f"    Response Body: {error_body}")
-                    if "vision" in error_body.lower() or "image" in error_body.lower():
-                        error_msg = (
-                            f"❌ The current model ({self.model}) does not support images. "
-                            "Please use 'mmclaw config' to choose a vision-capable model like 'gpt-4o-mini' or 'claude-3.5-sonnet'."
-                        )
-                except Exception:
-                    pass
-            return {"role": "assistant", "content": error_msg}
+        if self.temperature is not None:
+            payload["temperature"] = self.temperature
+        if self.max_output_tokens:
+            # OpenAI itself only accepts the newer name; compatible vendors use max_tokens
+            key = "max_completion_tokens" if self.engine_type == "openai" else "max_tokens"
+            payload[key] = int(self.max_output_tokens)
+        if self.reasoning_effort:
+            payload["reasoning_effort"] = self.reasoning_effort
+        payload["stream"] = bool(self.stream)
+        if self.stream and self.config["engines"][self.engine_type].get("stream_usage", True):
+            # Ask for a final usage chunk; set "stream_usage": false for vendors that reject it
+            payload["stream_options"] = {"include_usage": True}
+        return url, payload, bool(self.stream)
+
+    def _http_error_message(self, e, error_body):
+        if "vision" in error_body.lower() or "image" in error_body.lower():
+            return {"role": "assistant", "content": (
+                f"❌ The current model ({self.model}) does not support images. "
+                "Please use 'mmclaw config' to choose a vision-capable model like 'gpt-4o-mini' or 'claude-3.5-sonnet'."
+            )}
+        return {"role": "assistant", "content": f"Engine Error: {e}"}
 
     def tool_result_messages(self, tool_calls, results):
         messages = []
@@ -0,0 +1,257 @@
+"""OpenAI Responses API provider (Codex, or any OpenAI-compatible engine with ``"api": "responses"``).
+
+With ``"chain_responses": true`` in the engine config, responses are stored
+server-side (``store: true``) and each follow-up call sends only the items
+added since the last reply, chained with ``previous_response_id``. The full
+history is replayed instead whenever the local history no longer extends the
+chained one (compaction, a reply from another engine, a restart) or the
+server rejects the id. Chaining is on by default for plain OpenAI engines and
+off for Codex, whose ChatGPT backend only accepts ``store: false``.
+"""
+import json
+import threading
+import urllib.error
+from collections import OrderedDict
+
+from . import sse
+from .base import BaseProvider
+from .encoding import EncodedList
+
+
+class ChainedInput(EncodedList):
+    """The ``input`` delta of a chained call; ``full`` is the replay fallback."""
+    __slots__ = ("full",)
+
+    def __init__(self, fragments, full):
+        super().__init__(fragments)
+        self.full = full
+
+
+class _Chain(object):
+    __slots__ = ("response_id", "sent", "reply")
+
+    def __init__(self, response_id, sent, reply):
+        self.response_id = response_id
+        self.sent = sent      # non-system messages the stored response already contains
+        self.reply = reply    # the assistant message it produced
+
+
+class ResponsesProvider(BaseProvider):
+    supports_native_tools = True
+    supports_async = True
+    chain_default = True
+    MAX_CHAINS = 32
+
+    def __init__(self, config):
+        super().__init__(config)
+        engine_config = config["engines"][self.engine_type]
+        self.chain_responses = bool(engine_config.get("chain_responses", self.chain_default))
+        self._chains = OrderedDict()
+        self._chains_lock = threading.Lock()
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _to_json_schema(self, value):
+        if isinstance(value, dict):
+            converted = {k: self._to_json_schema(v) for k, v in value.items()}
+            if isinstance(converted.get("type"), str):
+                converted["type"] = converted["type"].lower()
+            return converted
+        if isinstance(value, list):
+            return [self._to_json_schema(v) for v in value]
+        return value
+
+    def _to_responses_tools(self, tools):
+        converted = []
+        for tool in tools or []:
+            if tool.get("type") == "function" and "function" in tool:
+                function = tool.get("function") or {}
+                converted.append({
+                    "type": "function",
+                    "name": function.get("name", ""),
+                    "description": function.get("description", ""),
+                    "parameters": self._to_json_schema(function.get("parameters") or {"type": "object", "properties": {}}),
+                })
+            else:
+                converted.append(self._to_json_schema(tool))
+        return converted
+
+    def _to_responses_content(self, content):
+        if isinstance(content, str):
+            return content
+        if not isinstance(content, list):
+            return str(content)
+
+        parts = []
+        for item in content:
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") == "text":
+                parts.append({
+                    "type": "input_text",
+                    "text": item.get("text", ""),
+                })
+            elif item.get("type") == "image_url":
+                image_url = (item.get("image_url") or {}).get("url", "")
+                if image_url:
+                    part = {
+                        "type": "input_image",
+                        "image_url": image_url,
+                    }
+                    if (item.get("image_url") or {}).get("detail"):
+                        part["detail"] = item["image_url"]["detail"]
+                    parts.append(part)
+        return parts
+
+    def _convert_message(self, msg):
+        role = msg.get("role")
+        if role == "system":
+            return []  # sent as "instructions"
+        if role == "tool":
+            return [{
+                "type": "function_call_output",
+                "call_id": msg.get("tool_call_id") or msg.get("id") or msg.get("name", ""),
+                "output": msg.get("content", ""),
+            }]
+        if role == "assistant":
+            items = []
+            content = msg.get("content") or ""
+            if content:
+                items.append({"role": "assistant", "content": content})
+            for call in msg.get("tool_calls") or []:
+                items.append({
+                    "type": "function_call",
+                    "call_id": call.get("id") or call.get("name", ""),
+                    "name": call.get("name", ""),
+                    "arguments": json.dumps(call.get("args", {}) or {}, ensure_ascii=False),
+                })
+            return items
+        return [{
+            "role": role or "user",
+            "content": self._to_responses_content(msg.get("content", "")),
+        }]
+
+    def _to_responses_input(self, messages):
+        input_items = []
+        for msg in messages:
+            input_items.extend(self._convert_message(msg))
+        return input_items
+
+    def _system_instructions(self, messages):
+        return "\n\n".join(
+            msg.get("content", "")
+            for msg in messages
+            if msg.get("role") == "system" and msg.get("content")
+        )
+
+    def _stream_reader(self):
+        return sse.StreamReader(sse.responses_events, label=self.engine_type)
+
+    # ------------------------------------------------------------------
+    # Response chaining
+    # ------------------------------------------------------------------
+
+    def _find_chain(self, turns):
+        """The stored response ``turns`` extends, or None if it must be replayed in full."""
+        last = next((m for m in reversed(turns) if m.get("role") == "assistant"), None)
+        if last is None:
+            return None
+        with self._chains_lock:
+            chain = self._chains.get(id(last))
+        if chain is None or chain.reply is not last:
+            return None
+        n = len(chain.sent)
+        if len(turns) <= n or turns[n] is not last:
+            return None
+        if any(a is not b for a, b in zip(turns, chain.sent)):
+            return None
+        return chain
+
+    def _remember(self, messages, msg):
+        response_id = msg.pop("response_id", None)
+        if not self.chain_responses or not response_id:
+            return
+        turns = [m for m in messages if m.get("role") != "system"]
+        with self._chains_lock:
+            self._chains[id(msg)] = _Chain(response_id, turns, msg)
+            while len(self._chains) > self.MAX_CHAINS:
+                self._chains.popitem(last=False)
+
+    def _unchained(self, payload):
+        payload = {k: v for k, v in payload.items() if k != "previous_response_id"}
+        payload["input"] = payload["input"].full
+        return payload
+
+    def _build_request(self, messages, tools=None):
+        turns = [m for m in messages if m.get("role") != "system"]
+        payload = {
+            "model": self.model,
+            "instructions": self._system_instructions(messages),
+            "input": self.encoder.encode(turns),
+            "store": self.chain_responses,
+            "stream": True,
+        }
+        chain = self._find_chain(turns) if self.chain_responses else None
+        if chain is not None:
+            delta = self.encoder.encode(turns[len(chain.sent) + 1:])
+            if len(delta):
+                payload["previous_response_id"] = chain.response_id
+                payload["input"] = ChainedInput(delta.fragments, payload["input"])
+        if tools:
+            payload["tools"] = self._to_responses_tools(tools)
+            payload["tool_choice"] = "auto"
+            payload["parallel_tool_calls"] = True
+        if self.reasoning_effort:
+            payload["reasoning"] = {"effort": self.reasoning_effort}
+        if self.max_output_tokens:
+            payload["max_output_tokens"] = int(self.max_output_tokens)
+        if self.temperature is not None:
+            payload["temperature"] = self.temperature
+        return f"{self.base_url}/responses", payload, True
+
+    def _chain_rejected(self, e, payload):
+        if "previous_response_id" not in payload or e.code not in (400, 404):
+            return False
+        print(f"[!] {self.engine_type}: previous response not accepted ({e.code}), replaying full history")
+        return True
+
+    def _send(self, url, payload, stream):
+        try:
+            return super()._send(url, payload, stream)
+        except urllib.error.HTTPError as e:
+            if not self._chain_rejected(e, payload):
+                raise
+            return super()._send(url, self._unchained(payload), stream)
+
+    async def _send_async(self, url, payload, stream):
+        try:
+            return await super()._send_async(url, payload, stream)
+        except urllib.error.HTTPError as e:
+            if not self._chain_rejected(e, payload):
+                raise
+            return await super()._send_async(url, self._unchained(payload), stream)
+
+    def ask_with_policy(self, messages, tools=None, retry=None):
+        msg = super().ask_with_policy(messages, tools=tools, retry=retry)
+        self._remember(messages, msg)
+        return msg
+
+    async def ask_with_policy_async(self, messages, tools=None, retry=None):
+        msg = await super().ask_with_policy_async(messages, tools=tools, retry=retry)
+        self._remember(messages, msg)
+        return msg
+
+    def tool_result_messages(self, tool_calls, results):
+        messages = []
+        for call, result in zip(tool_calls, results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call.get("id") or call.get("name", ""),
+                "name": call.get("name", ""),
+                "content": result,
+            })
+        return messages
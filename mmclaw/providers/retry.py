@@ -0,0 +1,230 @@
+"""Retry policies and per-endpoint circuit breakers for provider calls.
+
+Configured under ``config["retry"]``::
+
+    "retry": {
+        "idempotent": {"max_attempts": 3, "base_delay": 1, "max_delay": 20},
+        "streaming":  {"max_attempts": 2, "base_delay": 1, "max_delay": 10},
+        "breaker":    {"failure_threshold": 5, "reset_timeout": 30}
+    }
+
+Streaming calls get the shorter policy: they are long-lived and expensive to
+replay, so they give up sooner and leave further failover to the caller.
+"""
+import asyncio
+import email.utils
+import http.client
+import random
+import re
+import threading
+import time
+import urllib.error
+
+
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while an endpoint's breaker is open."""
+
+    def __init__(self, key, retry_in):
+        super().__init__(f"{key} is unavailable (circuit open, next probe in {retry_in:.0f}s)")
+        self.key = key
+        self.retry_in = retry_in
+
+
+class CallCancelled(Exception):
+    """The call was abandoned on purpose (e.g. it lost a hedged race); never retried."""
+
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_duration(value):
+    """Parse ``Retry-After``/``x-ratelimit-reset-*`` values: seconds, ``1m30s``/``250ms``, or an HTTP date."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def server_delay(error):
+    """Delay requested by the server on an HTTP error, if any."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        return None
+    delay = _parse_duration(headers.get("Retry-After"))
+    if delay is not None:
+        return delay
+    resets = [_parse_duration(headers.get(name)) for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    resets = [d for d in resets if d is not None]
+    return max(resets) if resets else None
+
+
+def is_retryable(error):
+    if isinstance(error, (CircuitOpenError, CallCancelled)):
+        return False
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRYABLE_STATUS
+    # URLError, socket timeouts, resets, truncated bodies
+    return isinstance(error, (OSError, http.client.HTTPException, asyncio.TimeoutError))
+
+
+def is_outage(error):
+    """Failures that count against the circuit breaker (429 is throttling, not an outage)."""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500
+    return is_retryable(error)
+
+
+class RetryPolicy(object):
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=20.0, multiplier=2.0, max_server_delay=60.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.multiplier = float(multiplier)
+        self.max_server_delay = float(max_server_delay)
+
+    @classmethod
+    def from_config(cls, config, streaming=False, retry=None):
+        defaults = {"max_attempts": 2, "max_delay": 10.0} if streaming else {}
+        options = dict(defaults, **((config.get("retry") or {}).get("streaming" if streaming else "idempotent") or {}))
+        if retry is not None:
+            options["max_attempts"] = retry + 1
+        return cls(**options)
+
+    def next_delay(self, attempt, error):
+        """Seconds to wait before attempt ``attempt + 1``, or None to give up."""
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return None
+        delay = server_delay(error)
+        if delay is not None:
+            # A server asking for longer than we are willing to wait is a "no"
+            return delay if delay <= self.max_server_delay else None
+        # Full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** attempt))
+
+    def call(self, func, breaker=None, label="request"):
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = func()
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(e)
+                delay = self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                print(f"[!] {label}: request failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if breaker is not None:
+                breaker.record(None)
+            return result
+
+    async def call_async(self, func, breaker=None, label="request"):
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if breaker is not None:
+                    breaker.record(e)
+                delay = self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+                print(f"[!] {label}: request failed ({e}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if breaker is not None:
+                breaker.record(None)
+            return result
+
+
+class CircuitBreaker(object):
+    """Opens after ``failure_threshold`` consecutive outages; lets one probe through every ``reset_timeout`` seconds."""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, key, failure_threshold=5, reset_timeout=30.0):
+        self.key = key
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0:
+                # One probe per window; a probe that never reports back frees the next window
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                print(f"[*] {self.key}: circuit half-open, probing...")
+                return
+            raise CircuitOpenError(self.key, remaining)
+
+    def record(self, error):
+        with self._lock:
+            if error is None:
+                if self.state != self.CLOSED:
+                    print(f"[*] {self.key}: circuit closed.")
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            if isinstance(error, (CircuitOpenError, CallCancelled)):
+                return
+            if not is_outage(error):
+                # The endpoint answered; a failed probe still counts as alive
+                if self.state == self.HALF_OPEN:
+                    self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"[!] {self.key}: circuit open after {self.failures} failure(s), failing fast for {self.reset_timeout:.0f}s.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.state != self.CLOSED and time.monotonic() < self.opened_at + self.reset_timeout
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(key, config):
+    """Process-wide breaker per endpoint key (shared by every provider instance)."""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            options = (config.get("retry") or {}).get("breaker") or {}
+            breaker = _BREAKERS[key] = CircuitBreaker(key, **options)
+        return breaker
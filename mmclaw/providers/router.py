@@ -0,0 +1,279 @@
+"""Latency-aware routing across several configured engines.
+
+Enabled with::
+
+    "router": {
+        "engines": ["openai", "vertex_ai", "deepseek"],   # preference order
+        "window": 20,             # calls kept per engine for the health profile
+        "max_error_rate": 0.5,    # engines above this are only used as a last resort
+        "latency_slack": 2.0      # skip a preferred engine if it is this much slower than the fastest
+    }
+
+Each call goes to the first healthy engine in preference order (unless it is
+much slower than another healthy one) and fails over to the next engine on
+any error, including 429s. History is normalized before every call so that a
+conversation started on one vendor can continue on another.
+"""
+import threading
+import time
+from collections import deque
+
+
+# Gemini accepts this in place of a real signature for calls it did not produce
+FOREIGN_THOUGHT_SIGNATURE = "skip_thought_signature_validator"
+
+
+class EngineStats(object):
+    def __init__(self, window=20):
+        self.samples = deque(maxlen=window)  # (latency_seconds, ok)
+        self.latency = None                  # EWMA of successful calls
+
+    def record(self, latency, ok):
+        self.samples.append((latency, ok))
+        if ok:
+            self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+
+    @property
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def summary(self):
+        latency = f"{self.latency:.2f}s" if self.latency is not None else "n/a"
+        return f"latency={latency} errors={self.error_rate:.0%} n={len(self.samples)}"
+
+
+class HistoryNormalizer(object):
+    """Normalizes history (see ``normalize_history``), returning the same copy of a message every turn.
+
+    The rewritten ids depend only on the history before a message, which does
+    not change between turns, so each copy is cached per (message, target) and
+    reused while the ids it got still match. Identity matters downstream: the
+    ``MessageEncoder`` fragment cache and the Responses prefix match are keyed
+    on the message objects.
+    """
+    MAX_ENTRIES = 4096
+    KEEP_CALLS = 16   # entries no call has used for this many normalizations are dropped
+
+    def __init__(self):
+        self._cache = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, msg, gemini, ids, build):
+        key = (id(msg), gemini)
+        content = msg.get("content")
+        tool_calls = msg.get("tool_calls")
+        entry = self._cache.get(key)
+        if (entry is not None and entry[0] is msg and entry[1] is content
+                and entry[2] is tool_calls and entry[3] == ids):
+            self.hits += 1
+            entry[5] = self._generation
+            return entry[4]
+        self.misses += 1
+        normalized = build()
+        # Holding msg keeps id(msg) from being reused while the entry exists
+        self._cache[key] = [msg, content, tool_calls, ids, normalized, self._generation]
+        return normalized
+
+    def normalize(self, messages, gemini=False):
+        with self._lock:
+            self._generation += 1
+            seen = set()
+            pending = {}
+            normalized = []
+            for turn, msg in enumerate(messages):
+                role = msg.get("role")
+                if role == "assistant" and msg.get("tool_calls"):
+                    ids = []
+                    for i, call in enumerate(msg["tool_calls"]):
+                        old_id = call.get("id") or call.get("name") or ""
+                        new_id = old_id if old_id and old_id not in seen else f"call_{turn}_{i}"
+                        seen.add(new_id)
+                        pending.setdefault(old_id, deque()).append(new_id)
+                        ids.append(new_id)
+                    msg = self._cached(msg, gemini, tuple(ids),
+                                       lambda msg=msg, ids=ids: self._rewrite_calls(msg, ids, gemini))
+                elif role == "tool":
+                    old_id = msg.get("tool_call_id") or msg.get("id") or msg.get("name", "")
+                    queue = pending.get(old_id)
+                    new_id = queue.popleft() if queue else old_id
+                    msg = self._cached(msg, gemini, new_id,
+                                       lambda msg=msg, new_id=new_id: self._rewrite_result(msg, new_id))
+                normalized.append(msg)
+            # Background job histories are built per run; don't pin their copies
+            if self._generation % self.KEEP_CALLS == 0 or len(self._cache) > self.MAX_ENTRIES:
+                oldest = self._generation - self.KEEP_CALLS
+                if len(self._cache) > self.MAX_ENTRIES:
+                    oldest = self._generation - 1
+                self._cache = {key: entry for key, entry in self._cache.items() if entry[5] > oldest}
+            return normalized
+
+    @staticmethod
+    def _rewrite_calls(msg, ids, gemini):
+        calls = []
+        for call, new_id in zip(msg["tool_calls"], ids):
+            signature = call.get("thoughtSignature") or call.get("thought_signature")
+            call = {k: v for k, v in call.items() if k not in ("thoughtSignature", "thought_signature")}
+            call["id"] = new_id
+            if gemini:
+                call["thoughtSignature"] = signature or FOREIGN_THOUGHT_SIGNATURE
+            calls.append(call)
+        return dict(msg, tool_calls=calls)
+
+    @staticmethod
+    def _rewrite_result(msg, new_id):
+        content = msg.get("content", "")
+        msg = dict(msg, tool_call_id=new_id, content=content)
+        if msg.get("response") is None:
+            msg["response"] = {"result": content}
+        return msg
+
+
+_NORMALIZER = HistoryNormalizer()
+
+
+def normalize_history(messages, gemini=False):
+    """Copy ``messages`` into a form every provider accepts.
+
+    Tool call ids are made unique (Gemini reuses the function name as id),
+    tool results are re-pointed at the rewritten ids, and thought signatures
+    are only sent to Gemini (``gemini=True``). Used by the router and when a
+    job escalates to another vendor; unchanged messages come back as the same
+    objects on every call.
+    """
+    return _NORMALIZER.normalize(messages, gemini)
+
+
+class RouterProvider(object):
+    supports_native_tools = True
+    supports_async = True
+    engine_type = "router"
+
+    def __init__(self, config, make_provider):
+        self.config = config
+        router_config = config.get("router") or {}
+        self.window = int(router_config.get("window", 20))
+        self.max_error_rate = float(router_config.get("max_error_rate", 0.5))
+        self.latency_slack = float(router_config.get("latency_slack", 2.0))
+        self.providers = {}
+        for name in router_config.get("engines") or [config["engine_type"]]:
+            if name not in (config.get("engines") or {}):
+                print(f"[!] Router: engine '{name}' is not configured, skipping.")
+                continue
+            provider = make_provider(config, name)
+            if not hasattr(provider, "ask_with_policy"):
+                print(f"[!] Router: engine '{name}' does not support native tool calling, skipping.")
+                continue
+            self.providers[name] = provider
+        if not self.providers:
+            raise ValueError("Router: no usable engines configured")
+        self.stats = {name: EngineStats(self.window) for name in self.providers}
+        self._lock = threading.Lock()
+        print(f"[*] Router: {' > '.join(self.providers)}")
+
+    # ------------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------------
+
+    def _healthy(self, name):
+        stats = self.stats[name]
+        if self.providers[name].breaker.is_open:
+            return False
+        return len(stats.samples) < 3 or stats.error_rate <= self.max_error_rate
+
+    def candidates(self):
+        """Engines in the order they should be tried for the next call."""
+        with self._lock:
+            names = list(self.providers)
+            healthy = [n for n in names if self._healthy(n)]
+            latencies = [self.stats[n].latency for n in healthy if self.stats[n].latency is not None]
+            if latencies:
+                ceiling = min(latencies) * self.latency_slack
+                fast = [n for n in healthy if self.stats[n].latency is None or self.stats[n].latency <= ceiling]
+                healthy = fast + [n for n in healthy if n not in fast]
+            return healthy + [n for n in names if n not in healthy]
+
+    def _record(self, name, started, ok):
+        with self._lock:
+            self.stats[name].record(time.monotonic() - started, ok)
+
+    # ------------------------------------------------------------------
+    # History translation
+    # ------------------------------------------------------------------
+
+    def normalize_history(self, messages, target):
+        return normalize_history(messages, gemini=self.providers[target].engine_type == "vertex_ai")
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def _retry_for(self, index, order):
+        # Fail over quickly; only the last resort gets its full retry policy
+        return None if index == len(order) - 1 else 0
+
+    def ask(self, messages, tools=None, retry=None):
+        order = self.candidates()
+        last_err = None
+        for index, name in enumerate(order):
+            provider = self.providers[name]
+            started = time.monotonic()
+            try:
+                msg = provider.ask_with_policy(
+                    self.normalize_history(messages, name), tools=tools,
+                    retry=retry if retry is not None else self._retry_for(index, order),
+                )
+            except Exception as e:
+                self._record(name, started, False)
+                last_err = e
+                if index + 1 < len(order):
+                    print(f"[!] Router: {name} failed ({e}), failing over to {order[index + 1]}")
+                continue
+            self._record(name, started, True)
+            return msg
+        return self.providers[order[-1]]._error_message(last_err)
+
+    async def ask_async(self, messages, tools=None, retry=None):
+        from ..aio import run_blocking
+        order = self.candidates()
+        last_err = None
+        for index, name in enumerate(order):
+            provider = self.providers[name]
+            history = self.normalize_history(messages, name)
+            attempt_retry = retry if retry is not None else self._retry_for(index, order)
+            started = time.monotonic()
+            try:
+                if provider.supports_async:
+                    msg = await provider.ask_with_policy_async(history, tools=tools, retry=attempt_retry)
+                else:
+                    msg = await run_blocking(provider.ask_with_policy, history, tools=tools, retry=attempt_retry)
+            except Exception as e:
+                self._record(name, started, False)
+                last_err = e
+                if index + 1 < len(order):
+                    print(f"[!] Router: {name} failed ({e}), failing over to {order[index + 1]}")
+                continue
+            self._record(name, started, True)
+            return msg
+        return self.providers[order[-1]]._error_message(last_err)
+
+    def tool_result_messages(self, tool_calls, results):
+        # Union of the OpenAI/Codex (tool_call_id) and Gemini (name/response) shapes
+        messages = []
+        for call, result in zip(tool_calls, results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call.get("id") or call.get("name", ""),
+                "name": call.get("name", ""),
+                "content": result,
+                "response": {"result": result},
+            })
+        return messages
+
+    def status(self):
+        with self._lock:
+            return {name: self.stats[name].summary() for name in self.providers}
@@ -0,0 +1,431 @@
+"""Shared Server-Sent Events parsing for the streaming providers.
+
+``iter_sse`` turns a response (or any iterable of byte chunks) into
+``SSEEvent`` objects, reading in large buffers and handling multi-line
+``data:`` fields, ``event:`` names and comments. The ``*_events`` decoders map
+one decoded JSON payload to typed deltas, and ``StreamAccumulator`` folds
+those into a normalized assistant message without quadratic string building.
+``StreamReader`` does the same for chunks pushed to it (the async path).
+"""
+import json
+
+
+CHUNK_SIZE = 16384
+
+
+class SSEEvent(object):
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event, data, id=None):
+        self.event = event
+        self.data = data
+        self.id = id
+
+
+class SSEParser(object):
+    """Incremental parser: ``feed()`` bytes, get back the events completed so far."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._reset()
+
+    def _reset(self):
+        self._event = "message"
+        self._data = []
+        self._id = None
+
+    def _dispatch(self):
+        if not self._data:
+            self._reset()
+            return None
+        event = SSEEvent(self._event, "\n".join(self._data), self._id)
+        self._reset()
+        return event
+
+    def _line(self, line):
+        if not line:
+            return self._dispatch()
+        if line[0] == ":":
+            return None
+        field, sep, value = line.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value or "message"
+        elif field == "id":
+            self._id = value
+        return None
+
+    def feed(self, chunk):
+        self._buf += chunk
+        events = []
+        start = 0
+        while True:
+            idx = self._buf.find(b"\n", start)
+            if idx == -1:
+                break
+            end = idx - 1 if idx > start and self._buf[idx - 1] == 13 else idx  # strip \r
+            event = self._line(self._buf[start:end].decode("utf-8", errors="replace"))
+            if event is not None:
+                events.append(event)
+            start = idx + 1
+        if start:
+            del self._buf[:start]
+        return events
+
+    def close(self):
+        """Flush a trailing line/event that was not terminated by a blank line."""
+        events = []
+        if self._buf:
+            event = self._line(bytes(self._buf).rstrip(b"\r").decode("utf-8", errors="replace"))
+            self._buf = bytearray()
+            if event is not None:
+                events.append(event)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield byte chunks from a response without waiting for a full buffer."""
+    read1 = getattr(source, "read1", None)
+    if read1 is None:
+        for chunk in source:
+            yield chunk
+        return
+    while True:
+        chunk = read1(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_sse(source, chunk_size=CHUNK_SIZE):
+    parser = SSEParser()
+    for chunk in iter_chunks(source, chunk_size):
+        for event in parser.feed(chunk):
+            yield event
+    for event in parser.close():
+        yield event
+
+
+# ----------------------------------------------------------------------
+# Typed stream events
+# ----------------------------------------------------------------------
+
+class TextDelta(object):
+    __slots__ = ("text", "thought")
+
+    def __init__(self, text, thought=False):
+        self.text = text
+        self.thought = thought
+
+
+class ToolCallDelta(object):
+    """A fragment of one tool call.
+
+    ``key`` groups fragments of the same call (``None`` starts a new call).
+    ``arguments`` is a JSON text fragment appended to what came before, unless
+    ``replace`` is set; ``args`` carries already-decoded arguments.
+    """
+    __slots__ = ("key", "id", "name", "arguments", "args", "replace", "extra")
+
+    def __init__(self, key=None, id=None, name=None, arguments=None, args=None, replace=False, extra=None):
+        self.key = key
+        self.id = id
+        self.name = name
+        self.arguments = arguments
+        self.args = args
+        self.replace = replace
+        self.extra = extra
+
+
+class Usage(object):
+    """Token counts; ``output_tokens`` includes ``reasoning_tokens``, ``input_tokens`` includes ``cached_tokens``."""
+    __slots__ = ("input_tokens", "output_tokens", "cached_tokens", "reasoning_tokens", "raw")
+
+    def __init__(self, input_tokens=0, output_tokens=0, raw=None, cached_tokens=0, reasoning_tokens=0):
+        self.input_tokens = input_tokens or 0
+        self.output_tokens = output_tokens or 0
+        self.cached_tokens = cached_tokens or 0
+        self.reasoning_tokens = reasoning_tokens or 0
+        self.raw = raw or {}
+
+    def as_dict(self):
+        return {
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+        }
+
+
+class Done(object):
+    __slots__ = ("reason", "response_id")
+
+    def __init__(self, reason=None, response_id=None):
+        self.reason = reason
+        self.response_id = response_id  # Responses API: id to chain the next turn on
+
+
+# ----------------------------------------------------------------------
+# Protocol decoders: (payload, event_name) -> iterable of typed events
+# ----------------------------------------------------------------------
+
+def openai_usage(usage):
+    return Usage(
+        usage.get("prompt_tokens"), usage.get("completion_tokens"), usage,
+        cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        or usage.get("prompt_cache_hit_tokens"),  # DeepSeek
+        reasoning_tokens=(usage.get("completion_tokens_details") or {}).get("reasoning_tokens"),
+    )
+
+
+def responses_usage(usage):
+    return Usage(
+        usage.get("input_tokens"), usage.get("output_tokens"), usage,
+        cached_tokens=(usage.get("input_tokens_details") or {}).get("cached_tokens"),
+        reasoning_tokens=(usage.get("output_tokens_details") or {}).get("reasoning_tokens"),
+    )
+
+
+def gemini_usage(usage):
+    # candidatesTokenCount excludes thinking; fold it in to match the other APIs
+    thoughts = usage.get("thoughtsTokenCount") or 0
+    return Usage(
+        usage.get("promptTokenCount"), (usage.get("candidatesTokenCount") or 0) + thoughts, usage,
+        cached_tokens=usage.get("cachedContentTokenCount"),
+        reasoning_tokens=thoughts,
+    )
+
+
+def openai_chat_events(payload, event_name=None):
+    if payload.get("usage"):
+        yield openai_usage(payload["usage"])
+    choices = payload.get("choices") or []
+    if not choices:
+        return
+    delta = choices[0].get("delta") or {}
+    if delta.get("content"):
+        yield TextDelta(delta["content"])
+    for call_delta in delta.get("tool_calls") or []:
+        function_delta = call_delta.get("function") or {}
+        yield ToolCallDelta(
+            key=call_delta.get("index", 0),
+            id=call_delta.get("id"),
+            name=function_delta.get("name"),
+            arguments=function_delta.get("arguments"),
+        )
+
+
+_RESPONSES_CALL_TYPES = {"function_call", "tool_call"}
+
+
+def _responses_item_call(item, fallback_key=None):
+    call_id = item.get("call_id") or item.get("id")
+    return ToolCallDelta(
+        key=item.get("id") or call_id or fallback_key,
+        id=str(call_id) if call_id else None,
+        name=item.get("name") or None,
+        arguments=item.get("arguments") or "",
+        replace=True,
+    )
+
+
+def responses_events(payload, event_name=None):
+    """Responses API (Codex) stream events."""
+    event_type = payload.get("type") or event_name or ""
+    if event_type == "response.output_text.delta":
+        yield TextDelta(payload.get("delta", ""))
+    elif event_type in ("response.output_item.added", "response.output_item.done"):
+        item = payload.get("item") or payload.get("output_item") or {}
+        if isinstance(item, dict) and item.get("type") in _RESPONSES_CALL_TYPES:
+            yield _responses_item_call(item, payload.get("output_index"))
+    elif "function_call" in event_type or "tool_call" in event_type:
+        key = payload.get("item_id") or payload.get("call_id") or payload.get("output_index") or payload.get("id")
+        if payload.get("name") or payload.get("call_id"):
+            yield ToolCallDelta(key=key, id=payload.get("call_id"), name=payload.get("name"))
+        if payload.get("arguments"):
+            yield ToolCallDelta(key=key, arguments=payload["arguments"], replace=True)
+        elif payload.get("delta"):
+            yield ToolCallDelta(key=key, arguments=payload["delta"])
+    elif event_type in ("response.completed", "response.incomplete", "response.failed"):
+        response = payload.get("response") or {}
+        usage = response.get("usage")
+        if usage:
+            yield responses_usage(usage)
+        yield Done(event_type, response_id=response.get("id") if event_type == "response.completed" else None)
+
+
+def gemini_events(payload, event_name=None):
+    """Gemini streamGenerateContent chunks (Vertex / AI Studio / Cloud Code Assist)."""
+    if "response" in payload and "candidates" not in payload:
+        payload = payload.get("response") or {}
+    usage = payload.get("usageMetadata")
+    if usage:
+        yield gemini_usage(usage)
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return
+    for part in (candidates[0].get("content") or {}).get("parts") or []:
+        if "text" in part:
+            yield TextDelta(part["text"], thought=bool(part.get("thought")))
+        elif "functionCall" in part:
+            call = part["functionCall"] or {}
+            thought_signature = part.get("thoughtSignature") or part.get("thought_signature")
+            yield ToolCallDelta(
+                id=call.get("name", ""),
+                name=call.get("name", ""),
+                args=call.get("args", {}) or {},
+                extra={"thoughtSignature": thought_signature} if thought_signature else None,
+            )
+
+
+# ----------------------------------------------------------------------
+# Accumulation
+# ----------------------------------------------------------------------
+
+class StreamAccumulator(object):
+    def __init__(self):
+        self.text = []
+        self.thought = []
+        self.calls = {}
+        self.usage = None
+        self.done = None
+        self.events = 0
+        self.malformed = 0
+
+    def add(self, item):
+        if isinstance(item, TextDelta):
+            (self.thought if item.thought else self.text).append(item.text)
+        elif isinstance(item, ToolCallDelta):
+            key = item.key if item.key is not None else len(self.calls)
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = {"id": None, "name": None, "arguments": [], "args": None, "extra": {}}
+            if item.id:
+                call["id"] = item.id
+            if item.name:
+                call["name"] = item.name
+            if item.replace:
+                call["arguments"] = [item.arguments] if item.arguments else []
+            elif item.arguments:
+                call["arguments"].append(item.arguments)
+            if item.args is not None:
+                call["args"] = item.args
+            if item.extra:
+                call["extra"].update(item.extra)
+        elif isinstance(item, Usage):
+            self.usage = item
+        elif isinstance(item, Done):
+            self.done = item
+
+    def tool_calls(self):
+        tool_calls = []
+        for call in self.calls.values():
+            if not call["name"]:
+                continue
+            args = call["args"]
+            if args is None:
+                args_raw = "".join(call["arguments"]) or "{}"
+                try:
+                    args = json.loads(args_raw)
+                except ValueError:
+                    args = {"_raw_arguments": args_raw}
+            tool_call = {"id": call["id"] or call["name"], "name": call["name"], "args": args or {}}
+            tool_call.update(call["extra"])
+            tool_calls.append(tool_call)
+        return tool_calls
+
+    def message(self):
+        # Thinking-only responses fall back to the thought text
+        msg = {"role": "assistant", "content": "".join(self.text) or "".join(self.thought)}
+        tool_calls = self.tool_calls()
+        if tool_calls:
+            msg["tool_calls"] = tool_calls
+        if self.usage is not None:
+            msg["usage"] = self.usage.as_dict()
+        if self.done is not None and self.done.response_id:
+            msg["response_id"] = self.done.response_id
+        return msg
+
+
+def _decode_data(data, acc):
+    try:
+        return [json.loads(data)]
+    except ValueError:
+        pass
+    # Some servers omit the blank line between events; try each data line alone
+    payloads = []
+    if "\n" in data:
+        for line in data.split("\n"):
+            try:
+                payloads.append(json.loads(line))
+            except ValueError:
+                acc.malformed += 1
+        return payloads
+    acc.malformed += 1
+    return payloads
+
+
+def accumulate(payload, decode):
+    """Fold a single non-streaming JSON body through ``decode``."""
+    acc = StreamAccumulator()
+    for item in decode(payload):
+        acc.add(item)
+    return acc
+
+
+class StreamReader(object):
+    """Incremental ``read_stream``: ``feed()`` body chunks as they arrive, then ``finish()``."""
+
+    def __init__(self, decode, label="stream"):
+        self.decode = decode
+        self.label = label
+        self.parser = SSEParser()
+        self.acc = StreamAccumulator()
+        self.complete = False
+
+    def _events(self, events):
+        acc = self.acc
+        for event in events:
+            if event.data == "[DONE]":
+                self.complete = True
+                return
+            acc.events += 1
+            for payload in _decode_data(event.data, acc):
+                if not isinstance(payload, dict):
+                    acc.malformed += 1
+                    continue
+                for item in self.decode(payload, event.event):
+                    acc.add(item)
+            if acc.done is not None:
+                self.complete = True
+                return
+
+    def feed(self, chunk):
+        """Parse ``chunk``; returns True once the stream is complete and the rest can be dropped."""
+        if not self.complete:
+            self._events(self.parser.feed(chunk))
+        return self.complete
+
+    def finish(self):
+        """The ``StreamAccumulator`` once the body has ended (or was abandoned after completion)."""
+        if not self.complete:
+            self._events(self.parser.close())
+        acc = self.acc
+        if acc.malformed:
+            print(f"[!] {self.label}: skipped {acc.malformed} malformed SSE event(s) out of {acc.events}")
+        return acc
+
+
+def read_stream(source, decode, label="stream"):
+    """Consume an SSE response with ``decode`` and return the ``StreamAccumulator``."""
+    reader = StreamReader(decode, label)
+    for chunk in iter_chunks(source):
+        if reader.feed(chunk):
+            break
+    return reader.finish()
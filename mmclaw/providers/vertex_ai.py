@@ -1,14 +1,24 @@
-import json
-import time
 import urllib.error
 import urllib.parse
-import urllib.request
 
+from . import sse
 from .base import BaseProvider
+from .context_cache import PREFIX_FIELDS, ContextCache
 
 
 class VertexAIProvider(BaseProvider):
     supports_native_tools = True
+    supports_async = True
+    default_timeouts = {"first_token": 120, "stall": 120}
+    # reasoning_effort -> Gemini thinking budget (tokens)
+    THINKING_BUDGETS = {"none": 0, "minimal": 512, "low": 1024, "medium": 8192, "high": 24576}
+
+    def __init__(self, config):
+        super().__init__(config)
+        options = config["engines"][self.engine_type].get("context_cache") or {}
+        self.context_cache = None
+        if options.get("enabled"):
+            self.context_cache = ContextCache(self.api_key, self.base_url, self.model, options)
 
     def _to_gemini_content_parts(self, content):
         if isinstance(content, str):
@@ -37,51 +47,59 @@ class VertexAIProvider(BaseProvider):
                     parts.append({"fileData": {"fileUri": image_url}})
         return parts
 
-    def _to_gemini_contents(self, messages):
+    def _system_instruction(self, messages):
         system_instruction = None
-        contents = []
         for msg in messages:
-            role = msg.get("role")
-            content = msg.get("content", "")
-
-            if role == "system":
+            if msg.get("role") == "system":
+                content = msg.get("content", "")
                 text = content if isinstance(content, str) else str(content)
                 system_instruction = {"parts": [{"text": text}]}
-                continue
+        return system_instruction
 
-            if role == "tool":
-                name = msg.get("name", "")
-                response = msg.get("response")
-                if response is None:
-                    response = {"result": content}
-                contents.append({
-                    "role": "user",
-                    "parts": [{"functionResponse": {"name": name, "response": response}}],
-                })
-                continue
+    def _convert_message(self, msg):
+        role = msg.get("role")
+        content = msg.get("content", "")
+
+        if role == "system":
+            return []  # sent as "systemInstruction"
 
-            parts = []
-            if content:
-                parts.extend(self._to_gemini_content_parts(content))
+        if role == "tool":
+            name = msg.get("name", "")
+            response = msg.get("response")
+            if response is None:
+                response = {"result": content}
+            return [{
+                "role": "user",
+                "parts": [{"functionResponse": {"name": name, "response": response}}],
+            }]
 
-            for call in msg.get("tool_calls") or []:
-                function_call_part = {
-                    "functionCall": {
-                        "name": call.get("name", ""),
-                        "args": call.get("args", {}) or {},
-                    }
+        parts = []
+        if content:
+            parts.extend(self._to_gemini_content_parts(content))
+
+        for call in msg.get("tool_calls") or []:
+            function_call_part = {
+                "functionCall": {
+                    "name": call.get("name", ""),
+                    "args": call.get("args", {}) or {},
                 }
-                thought_signature = call.get("thoughtSignature") or call.get("thought_signature")
-                if thought_signature:
-                    function_call_part["thoughtSignature"] = thought_signature
-                parts.append(function_call_part)
+            }
+            thought_signature = call.get("thoughtSignature") or call.get("thought_signature")
+            if thought_signature:
+                function_call_part["thoughtSignature"] = thought_signature
+            parts.append(function_call_part)
 
-            if not parts:
-                parts = [{"text": ""}]
+        if not parts:
+            parts = [{"text": ""}]
 
-            gemini_role = "model" if role == "assistant" else "user"
-            contents.append({"role": gemini_role, "parts": parts})
-        return system_instruction, contents
+        gemini_role = "model" if role == "assistant" else "user"
+        return [{"role": gemini_role, "parts": parts}]
+
+    def _to_gemini_contents(self, messages):
+        contents = []
+        for msg in messages:
+            contents.extend(self._convert_message(msg))
+        return self._system_instruction(messages), contents
 
     def _to_gemini_tools(self, tools):
         declarations = []
@@ -106,37 +124,9 @@ class VertexAIProvider(BaseProvider):
             return None
         return [{"functionDeclarations": declarations}]
 
-    def _extract_parts(self, payload):
-        candidates = payload.get("candidates") or []
-        if not candidates:
-            return []
-        return (candidates[0].get("content") or {}).get("parts") or []
-
-    def _parts_to_message(self, parts):
-        content = ""
-        tool_calls = []
-        for part in parts:
-            if "text" in part:
-                content += part["text"]
-            elif "functionCall" in part:
-                call = part["functionCall"] or {}
-                tool_call = {
-                    "id": call.get("name", ""),
-                    "name": call.get("name", ""),
-                    "args": call.get("args", {}) or {},
-                }
-                thought_signature = part.get("thoughtSignature") or part.get("thought_signature")
-                if thought_signature:
-                    tool_call["thoughtSignature"] = thought_signature
-                tool_calls.append(tool_call)
-        msg = {"role": "assistant", "content": content}
-        if tool_calls:
-            msg["tool_calls"] = tool_calls
-        return msg
-
     def _build_body(self, messages, tools=None):
-        system_instruction, contents = self._to_gemini_contents(messages)
-        body = {"contents": contents}
+        system_instruction = self._system_instruction(messages)
+        body = {"contents": self.encoder.encode(messages)}
         if system_instruction:
             body["systemInstruction"] = system_instruction
 
@@ -144,76 +134,73 @@ class VertexAIProvider(BaseProvider):
         if gemini_tools:
             body["tools"] = gemini_tools
             body["toolConfig"] = {"functionCallingConfig": {"mode": "AUTO"}}
+
+        generation_config = {}
+        if self.max_output_tokens:
+            generation_config["maxOutputTokens"] = int(self.max_output_tokens)
+        if self.temperature is not None:
+            generation_config["temperature"] = self.temperature
+        if self.reasoning_effort in self.THINKING_BUDGETS:
+            generation_config["thinkingConfig"] = {"thinkingBudget": self.THINKING_BUDGETS[self.reasoning_effort]}
+        if generation_config:
+            body["generationConfig"] = generation_config
+
+        if self.context_cache is not None:
+            prefix = {k: body[k] for k in PREFIX_FIELDS if k in body}
+            name = self.context_cache.lookup(prefix)
+            if name:
+                # A cached request may not repeat what the cache holds
+                for k in prefix:
+                    del body[k]
+                body["cachedContent"] = name
         return body
 
-    def ask(self, messages, tools=None, retry=1):
-        last_err = None
-        for attempt in range(retry + 1):
-            try:
-                return self.ask_once(messages, tools=tools)
-            except urllib.error.HTTPError as e:
-                if 400 <= e.code < 500 and e.code != 429:
-                    raise
-                last_err = e
-            except Exception as e:
-                last_err = e
-            if attempt < retry:
-                print(f"[!] Request failed ({last_err}), retrying...")
-                time.sleep(2)
-        raise last_err
-
-    def ask_once(self, messages, tools=None):
+    def _build_request(self, messages, tools=None):
         body = self._build_body(messages, tools=tools)
         key_param = urllib.parse.quote(self.api_key, safe="")
-
         if self.stream:
             url = f"{self.base_url}/models/{self.model}:streamGenerateContent?alt=sse&key={key_param}"
         else:
             url = f"{self.base_url}/models/{self.model}:generateContent?key={key_param}"
+        return url, body, bool(self.stream)
 
-        if self.debug:
-            print(f"\n[LLM Request (vertex_ai)] url={url}\n{json.dumps(body, indent=2)}\n")
+    def _stream_reader(self):
+        return sse.StreamReader(sse.gemini_events, label="vertex_ai")
 
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(body).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
+    def _uncached(self, e, payload):
+        """The payload without its cache reference if the cache was rejected, else None."""
+        name = payload.get("cachedContent")
+        if not name or e.code not in (400, 403, 404):
+            return None
+        prefix = self.context_cache.prefix_for(name)
+        if prefix is None:
+            return None
+        print(f"[!] Context cache: {name} rejected ({e.code}), sending the prompt uncached")
+        self.context_cache.invalidate(name)
+        payload = {k: v for k, v in payload.items() if k != "cachedContent"}
+        payload.update(prefix)
+        return payload
+
+    def _send(self, url, payload, stream):
         try:
-            parts = []
-            with urllib.request.urlopen(req, timeout=120) as response:
-                if self.stream:
-                    for line in response:
-                        line_str = line.decode("utf-8").strip()
-                        if not line_str.startswith("data: "):
-                            continue
-                        data_str = line_str[6:]
-                        if data_str == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data_str)
-                            parts.extend(self._extract_parts(chunk))
-                        except Exception:
-                            continue
-                else:
-                    res_data = json.loads(response.read().decode("utf-8"))
-                    parts = self._extract_parts(res_data)
-
-            msg = self._parts_to_message(parts)
-            if self.debug:
-                print(f"\n[LLM Response (vertex_ai)]\n{json.dumps(msg, indent=2)}\n")
-            return msg
+            return super()._send(url, payload, stream)
         except urllib.error.HTTPError as e:
-            error_body = ""
-            try:
-                error_body = e.read().decode("utf-8")
-            except Exception:
-                pass
-            print(f"[!] Engine Error: {e}")
-            if error_body:
-                print(f"    Response Body: {error_body}")
-            return {"role": "assistant", "content": f"Engine Error: {e}"}
+            uncached = self._uncached(e, payload)
+            if uncached is None:
+                raise
+            return super()._send(url, uncached, stream)
+
+    async def _send_async(self, url, payload, stream):
+        try:
+            return await super()._send_async(url, payload, stream)
+        except urllib.error.HTTPError as e:
+            uncached = self._uncached(e, payload)
+            if uncached is None:
+                raise
+            return await super()._send_async(url, uncached, stream)
+
+    def _parse_response(self, data):
+        return sse.accumulate(data, sse.gemini_events).message()
 
     def tool_result_messages(self, tool_calls, results):
         messages = []
@@ -0,0 +1,215 @@
+"""Provider-aware image sizing: spend as few vision tokens as the fidelity allows.
+
+Configured at the top level or per engine::
+
+    "vision": {
+        "fidelity": "standard",   # low | standard | high
+        "preview": false          # send a low-detail preview; the model can ask for the original
+    }                             # (native tool calling only)
+
+Providers bill images differently:
+
+* OpenAI (``openai``, ``codex``, GPT models): ``detail: low`` is a flat 85
+  tokens; ``high`` scales the image into 2048x2048, then its short side to
+  768, and bills 170 per 512 px tile plus 85.
+* Gemini (``vertex_ai``, ``gemini``, ``gemini_cli``): 258 tokens when both
+  sides are <= 384 px, otherwise 258 per 768 px tile.
+* Anything else is estimated at ``width * height / 750``.
+
+So images are scaled to the largest size that fits the fidelity's tile
+budget exactly (a 1030 px wide image costs a whole extra column of tiles
+over a 1024 px one), and never above what the provider would downscale to
+anyway. Each image's estimated cost is logged when it is prepared.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from . import images
+
+
+OPENAI_ENGINES = ("openai", "codex")
+GEMINI_ENGINES = ("vertex_ai", "gemini", "gemini_cli")
+FIDELITIES = ("low", "standard", "high")
+
+# family -> fidelity -> tile budget (None: as many as the provider accepts)
+TILE_BUDGETS = {
+    "openai": {"standard": 4, "high": None},
+    "gemini": {"standard": 2, "high": 6},
+}
+GENERIC_MAX_SIDE = {"low": 512, "standard": 1024, "high": 1568}
+QUALITY = {"low": 70, "standard": 80, "high": 88}
+
+
+def family_for(engine_type, model=""):
+    model = (model or "").lower()
+    if engine_type in GEMINI_ENGINES or model.startswith("gemini"):
+        return "gemini"
+    if engine_type in OPENAI_ENGINES or model.startswith(("gpt-", "o1", "o3", "o4", "chatgpt")):
+        return "openai"
+    return "generic"
+
+
+def _fit(size, max_w, max_h):
+    width, height = size
+    scale = min(1.0, max_w / float(width), max_h / float(height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _openai_scaled(size):
+    """The size OpenAI actually looks at in ``high`` detail."""
+    width, height = _fit(size, 2048, 2048)
+    if min(width, height) > 768:
+        scale = 768.0 / min(width, height)
+        width, height = max(1, int(width * scale)), max(1, int(height * scale))
+    return width, height
+
+
+def _tile_fit(size, tile, budget):
+    """Largest downscale of ``size`` covering at most ``budget`` tiles of ``tile`` px."""
+    best = (1, 1)
+    for cols in range(1, budget + 1):
+        rows = budget // cols
+        candidate = _fit(size, cols * tile, rows * tile)
+        if candidate[0] * candidate[1] > best[0] * best[1]:
+            best = candidate
+    return best
+
+
+class VisionBudget(object):
+    """How images are sized (``target``), labelled (``detail``) and billed (``tokens``) for one engine."""
+
+    def __init__(self, family, fidelity="standard"):
+        if fidelity not in FIDELITIES:
+            print(f"[!] Vision: unknown fidelity {fidelity!r}, using 'standard'.")
+            fidelity = "standard"
+        self.family = family
+        self.fidelity = fidelity
+        self.quality = QUALITY[fidelity]
+        self.key = (family, fidelity)
+
+    @property
+    def detail(self):
+        """OpenAI ``detail`` value, or None for providers without one."""
+        if self.family != "openai":
+            return None
+        return "low" if self.fidelity == "low" else "high"
+
+    def target(self, size):
+        if self.family == "openai":
+            if self.fidelity == "low":
+                return _fit(size, 512, 512)
+            scaled = _openai_scaled(size)
+            budget = TILE_BUDGETS["openai"][self.fidelity]
+            return scaled if budget is None else _tile_fit(scaled, 512, budget)
+        if self.family == "gemini":
+            if self.fidelity == "low":
+                return _fit(size, 384, 384)
+            return _tile_fit(size, 768, TILE_BUDGETS["gemini"][self.fidelity])
+        side = GENERIC_MAX_SIDE[self.fidelity]
+        return _fit(size, side, side)
+
+    def tokens(self, size):
+        """Estimated billed tokens for an image of ``size`` sent under this budget."""
+        width, height = size
+        if self.family == "openai":
+            if self.detail == "low":
+                return 85
+            width, height = _openai_scaled(size)
+            return 85 + 170 * math.ceil(width / 512.0) * math.ceil(height / 512.0)
+        if self.family == "gemini":
+            if width <= 384 and height <= 384:
+                return 258
+            return 258 * math.ceil(width / 768.0) * math.ceil(height / 768.0)
+        return int(math.ceil(width * height / 750.0))
+
+    def image_block(self, image):
+        block = {"type": "image_url", "image_url": {"url": image.data_url()}}
+        if self.detail:
+            block["image_url"]["detail"] = self.detail
+        return block
+
+
+def budget_for(config, engine_type=None, fidelity=None):
+    engine_type = engine_type or config.get("engine_type", "")
+    engine_config = (config.get("engines") or {}).get(engine_type) or {}
+    options = dict(config.get("vision") or {}, **(engine_config.get("vision") or {}))
+    return VisionBudget(family_for(engine_type, engine_config.get("model")),
+                        fidelity or options.get("fidelity", "standard"))
+
+
+# ----------------------------------------------------------------------
+# Process-wide settings (connectors prepare images before any engine is chosen)
+# ----------------------------------------------------------------------
+
+_BUDGET = VisionBudget("generic")
+_PREVIEW = False
+_ORIGINALS = OrderedDict()   # image id -> original bytes, for image_full
+MAX_ORIGINALS = 32
+_LOCK = threading.Lock()
+
+
+def configure(config):
+    """Size images for the main engine of ``config``."""
+    global _BUDGET, _PREVIEW
+    _BUDGET = budget_for(config)
+    engine_config = (config.get("engines") or {}).get(config.get("engine_type")) or {}
+    _PREVIEW = bool(dict(config.get("vision") or {}, **(engine_config.get("vision") or {})).get("preview"))
+    if _PREVIEW and _BUDGET.fidelity == "low":
+        _PREVIEW = False  # the preview would be the image itself
+    if config.get("tool_calling_mode", "native") != "native":
+        _PREVIEW = False  # image_full is a native tool; the JSON protocol cannot ask for the original
+
+
+def preview_enabled():
+    return _PREVIEW
+
+
+def _log(image, budget):
+    if image.size is None:
+        return
+    source = f" (from {image.source_size[0]}x{image.source_size[1]})" if image.source_size != image.size else ""
+    detail = f" detail={budget.detail}" if budget.detail else ""
+    print(f"[*] Vision: {image.size[0]}x{image.size[1]}{detail} ~{budget.tokens(image.size)} tokens{source}")
+
+
+def _remember(image_bytes):
+    image_id = hashlib.sha256(image_bytes).hexdigest()[:10]
+    with _LOCK:
+        _ORIGINALS[image_id] = image_bytes
+        _ORIGINALS.move_to_end(image_id)
+        while len(_ORIGINALS) > MAX_ORIGINALS:
+            _ORIGINALS.popitem(last=False)
+    return image_id
+
+
+def image_blocks(image_list):
+    """Content blocks for ``image_list`` under the configured budget (previews when enabled)."""
+    budget = VisionBudget(_BUDGET.family, "low") if _PREVIEW else _BUDGET
+    processed = images.pipeline().process_many(image_list, budget, budget.quality)
+    blocks = []
+    for data, image in zip(image_list, processed):
+        _log(image, budget)
+        blocks.append(budget.image_block(image))
+        if _PREVIEW:
+            blocks.append({"type": "text", "text": (
+                f"[Image {_remember(data)} is a low-detail preview. If you need to read fine detail, "
+                f"call image_full with this image_id to see it at full resolution.]")})
+    return blocks
+
+
+def has_original(image_id):
+    with _LOCK:
+        return str(image_id).strip() in _ORIGINALS
+
+
+def full_resolution(image_id):
+    """User-message content with the original of a previewed image, or None if it is gone."""
+    with _LOCK:
+        data = _ORIGINALS.get(str(image_id).strip())
+    if data is None:
+        return None
+    image = images.pipeline().process(data, _BUDGET, _BUDGET.quality)
+    _log(image, _BUDGET)
+    return [{"type": "text", "text": f"Full-resolution image {image_id}:"}, _BUDGET.image_block(image)]
@@ -1,11 +1,10 @@
 import base64
 import json
 import time
-import urllib.request
-import urllib.error
 import tempfile
 from pathlib import Path
 import traceback
+from mmclaw import http_pool
 from mmclaw.watcher import notify
 
 import os
@@ -17,9 +16,10 @@ INTERVAL    = 2  # seconds between checks
 
 
 def fetch(path, headers):
-    req = urllib.request.Request(f"{SERVER}{path}", headers=headers)
-    with urllib.request.urlopen(req, timeout=10) as res:
-        return json.loads(res.read())
+    # One kept-alive connection instead of a TLS handshake every poll
+    res = http_pool.session("clawmeets").get(f"{SERVER}{path}", headers=headers, timeout=10)
+    res.raise_for_status()
+    return res.json()
 
 
 def load_contacts():
@@ -104,6 +104,15 @@ def get_native_tool_schemas(config):
             _schema("cron_list", "List cron jobs."),
         ])
 
+    from .providers import vision
+    if vision.preview_enabled():
+        tools.append(_schema(
+            "image_full",
+            "Show the full-resolution original of an image that was sent as a low-detail preview.",
+            {"image_id": {"type": "STRING"}},
+            ["image_id"],
+        ))
+
     if config.get("browser", {}).get("enabled", False):
         tools.extend([
             _schema("browser_start", "Start the browser."),
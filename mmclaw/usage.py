@@ -0,0 +1,131 @@
+"""Token usage ledger.
+
+Every model call that reports usage is appended to ``<workspace>/usage/usage.jsonl``
+as one compact line::
+
+    {"t": 1760000000, "s": "session_...", "j": "chat", "k": "daily-news", "e": "openai",
+     "m": "gpt-4o", "i": 1200, "c": 1024, "o": 80, "r": 0}
+
+(t=time, s=session, j=job class, k=skill, e=engine, m=model, i=input, c=cached,
+o=output, r=reasoning tokens). ``mmclaw usage`` aggregates it. Optional prices,
+in USD per million tokens, add a cost column::
+
+    "usage_pricing": {
+        "gpt-4o": {"input": 2.5, "cached": 1.25, "output": 10}
+    }
+"""
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+
+_SKILL_PREFIX = re.compile(r"^\[(?:WATCHER|HEARTBEAT|HEARTBEAT_DISCOVER|CRON):\s*([^\]]+)\]")
+
+# Report column -> ledger key
+GROUP_KEYS = {"model": "m", "engine": "e", "job": "j", "skill": "k", "session": "s", "day": "t"}
+
+
+def skill_for(user_text):
+    """Skill/job name from a watcher, heartbeat or cron prompt prefix, else None."""
+    if not isinstance(user_text, str):
+        return None
+    match = _SKILL_PREFIX.match(user_text)
+    return match.group(1).strip() if match else None
+
+
+class UsageLedger(object):
+    LEDGER_FILE = Path.home() / ".mmclaw" / "usage" / "usage.jsonl"
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, usage, session=None, job_class=None, skill=None):
+        entry = {
+            "t": int(time.time()),
+            "s": session,
+            "j": job_class,
+            "k": skill,
+            "e": usage.get("engine"),
+            "m": usage.get("model"),
+            "i": usage.get("input_tokens", 0),
+            "c": usage.get("cached_tokens", 0),
+            "o": usage.get("output_tokens", 0),
+            "r": usage.get("reasoning_tokens", 0),
+        }
+        line = json.dumps({k: v for k, v in entry.items() if v is not None}, separators=(",", ":")) + "\n"
+        try:
+            with cls._lock:
+                os.makedirs(cls.LEDGER_FILE.parent, exist_ok=True)
+                with open(cls.LEDGER_FILE, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except Exception as e:
+            print(f"[!] Usage ledger write failed: {e}")
+
+    @classmethod
+    def load(cls, since=None):
+        if not cls.LEDGER_FILE.exists():
+            return []
+        records = []
+        with open(cls.LEDGER_FILE, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or entry.get("t", 0) >= since:
+                    records.append(entry)
+        return records
+
+    @staticmethod
+    def cost(entry, pricing):
+        price = pricing.get(entry.get("m")) or pricing.get(entry.get("e"))
+        if not price:
+            return None
+        cached = entry.get("c", 0)
+        fresh = max(0, entry.get("i", 0) - cached)
+        return (fresh * price.get("input", 0)
+                + cached * price.get("cached", price.get("input", 0))
+                + entry.get("o", 0) * price.get("output", 0)) / 1e6
+
+    @classmethod
+    def aggregate(cls, records, by="model", pricing=None):
+        """Sum records per ``by`` (see ``GROUP_KEYS``); returns {group: totals}."""
+        key = GROUP_KEYS[by]
+        totals = {}
+        for entry in records:
+            if by == "day":
+                group = time.strftime("%Y-%m-%d", time.localtime(entry.get("t", 0)))
+            else:
+                group = entry.get(key) or "-"
+            row = totals.setdefault(group, {"calls": 0, "i": 0, "c": 0, "o": 0, "r": 0, "cost": None})
+            row["calls"] += 1
+            for field in ("i", "c", "o", "r"):
+                row[field] += entry.get(field, 0)
+            cost = cls.cost(entry, pricing or {})
+            if cost is not None:
+                row["cost"] = (row["cost"] or 0) + cost
+        return totals
+
+    @classmethod
+    def report(cls, by="model", days=None, pricing=None):
+        since = time.time() - days * 86400 if days else None
+        records = cls.load(since)
+        if not records:
+            return "(no usage recorded yet)"
+        totals = cls.aggregate(records, by, pricing)
+        rows = sorted(totals.items(), key=lambda item: item[1]["i"] + item[1]["o"], reverse=True)
+        show_cost = any(row["cost"] is not None for _, row in rows)
+        width = max(len(by), *(len(str(group)) for group, _ in rows))
+        header = f"{by:<{width}}  {'calls':>6}  {'input':>10}  {'cached':>10}  {'output':>10}  {'reasoning':>10}"
+        if show_cost:
+            header += f"  {'cost $':>9}"
+        lines = [header, "-" * len(header)]
+        for group, row in rows:
+            line = (f"{group:<{width}}  {row['calls']:>6}  {row['i']:>10,}  {row['c']:>10,}  "
+                    f"{row['o']:>10,}  {row['r']:>10,}")
+            if show_cost:
+                line += f"  {row['cost']:>9.4f}" if row["cost"] is not None else f"  {'-':>9}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,142 @@
+"""Webhook receiver for connectors that can push updates instead of being polled.
+
+Long polling keeps a request open to the platform and adds up to a poll
+round-trip to every message. In webhook mode the platform POSTs each update
+to a small threaded HTTP server instead; it answers 200 at once and hands
+the update on. Configured per connector, e.g. for Telegram::
+
+    "connectors": {"telegram": {..., "webhook": {
+        "enabled": true,
+        "url": "https://bot.example.com/telegram",   # public URL registered with Telegram
+        "listen": "127.0.0.1",                        # bind address (behind a reverse proxy)
+        "port": 8443,
+        "path": "/telegram",
+        "secret": "..."                               # X-Telegram-Bot-Api-Secret-Token
+    }}}
+
+Without a ``url`` nothing is registered with Telegram, and recorded updates
+can be replayed by hand::
+
+    curl -X POST -H "X-Telegram-Bot-Api-Secret-Token: $SECRET" \\
+         -d @update.json http://127.0.0.1:8443/telegram
+
+Platforms resend an update they think was not delivered, so updates are
+deduplicated by id.
+"""
+import hmac
+import json
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+MAX_BODY = 1024 * 1024
+MAX_SEEN = 1024
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class WebhookReceiver(object):
+    """Serves ``POST <path>``; ``on_update(update_dict)`` runs after the 200 is sent."""
+
+    def __init__(self, on_update, path="/", secret=None, secret_header="X-Telegram-Bot-Api-Secret-Token",
+                 id_key="update_id", host="127.0.0.1", port=8443, name="webhook"):
+        self.on_update = on_update
+        self.path = "/" + path.strip("/") if path.strip("/") else "/"
+        self.secret = secret
+        self.secret_header = secret_header
+        self.id_key = id_key
+        self.name = name
+        self.stats = {"received": 0, "duplicates": 0, "rejected": 0, "errors": 0}
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                code, update = receiver._accept(self)
+                self.send_response(code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                if update is not None:
+                    receiver._dispatch(update)
+
+            def do_GET(self):
+                self.send_response(405)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        self.httpd = _HTTPServer((host, port), Handler)
+        self._thread = None
+        self._serving = False
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def start(self):
+        self._serving = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name=f"mmclaw-{self.name}")
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self):
+        self._serving = True
+        self.httpd.serve_forever()
+
+    def stop(self):
+        # shutdown() waits for serve_forever() to exit, so it would hang if that never ran
+        if self._serving:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _reject(self, code):
+        with self._lock:
+            self.stats["rejected"] += 1
+        return code, None
+
+    def _accept(self, request):
+        """(status code, update or None) for one POST."""
+        if request.path.split("?", 1)[0].rstrip("/") != self.path.rstrip("/"):
+            return self._reject(404)
+        if self.secret and not hmac.compare_digest(request.headers.get(self.secret_header, ""), self.secret):
+            return self._reject(403)
+        length = int(request.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            return self._reject(413)
+        try:
+            update = json.loads(request.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return self._reject(400)
+        if not isinstance(update, dict):
+            return self._reject(400)
+        update_id = update.get(self.id_key)
+        with self._lock:
+            if update_id is not None:
+                if update_id in self._seen:
+                    self.stats["duplicates"] += 1
+                    return 200, None  # acknowledged, so the platform stops resending
+                self._seen[update_id] = True
+                while len(self._seen) > MAX_SEEN:
+                    self._seen.popitem(last=False)
+            self.stats["received"] += 1
+        return 200, update
+
+    def _dispatch(self, update):
+        try:
+            self.on_update(update)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"[!] {self.name}: update {update.get(self.id_key)} failed: {e}")